@@ -5,12 +5,16 @@ import sys
 import time
 from argparse import ArgumentParser
 from pathlib import Path
-from typing import Any, List
+from typing import Any, List, Optional
 
 from multiversxetl.app_controller import AppController
 from multiversxetl.checks import check_loaded_data
-from multiversxetl.constants import SECONDS_IN_DAY, SECONDS_IN_ONE_HOUR
+from multiversxetl.clients_provider import ClientsProvider
+from multiversxetl.constants import (SECONDS_IN_DAY, SECONDS_IN_FIVE_MINUTES,
+                                     SECONDS_IN_ONE_HOUR)
 from multiversxetl.errors import CountsMismatchError, KnownError
+from multiversxetl.profiler import SamplingProfiler
+from multiversxetl.supervisor import Supervisor
 
 
 def main(args: List[str]) -> int:
@@ -38,17 +42,65 @@ def _do_main(args: List[str]):
     subparser = subparsers.add_parser("process-append-only-indices", help="Do ETL for append-only indices (continuously).")
     subparser.add_argument("--workspace", required=True, help="Workspace path.")
     subparser.add_argument("--sleep-between-iterations", type=int, default=SECONDS_IN_ONE_HOUR)
+    subparser.add_argument("--tail", action="store_true", default=False, help="Process the indices continuously, in micro-batches (near-real-time).")
+    subparser.add_argument("--micro-batch-interval", type=int, default=SECONDS_IN_FIVE_MINUTES, help="When tailing, the size of the micro-batches (in seconds).")
+    subparser.add_argument("--data-transfer-interval", type=int, default=3 * SECONDS_IN_FIVE_MINUTES, help="When tailing, the minimum time (in seconds) between data transfers.")
+    subparser.add_argument("--profile", action="store_true", default=False, help="Profile the tasks (folded stacks are saved in the workspace, after each iteration).")
     subparser.set_defaults(func=_process_append_only_indices)
 
     subparser = subparsers.add_parser("process-mutable-indices", help="Do ETL for mutable indices (continuously).")
     subparser.add_argument("--workspace", required=True, help="Workspace path.")
     subparser.add_argument("--sleep-between-iterations", type=int, default=SECONDS_IN_DAY)
+    subparser.add_argument("--profile", action="store_true", default=False, help="Profile the tasks (folded stacks are saved in the workspace, after each iteration).")
     subparser.set_defaults(func=_process_mutable_indices)
 
+    subparser = subparsers.add_parser("supervise", help="Do ETL for append-only and mutable indices of several workspaces (continuously), in a single process, on a shared pool of workers.")
+    subparser.add_argument("--workspace", dest="workspaces", action="append", required=True, help="Workspace path (can be repeated).")
+    subparser.add_argument("--num-workers", type=int, default=16, help="Number of tasks running at the same time (all workspaces and flows).")
+    subparser.add_argument("--append-only-sleep-between-iterations", type=int, default=SECONDS_IN_ONE_HOUR)
+    subparser.add_argument("--mutable-sleep-between-iterations", type=int, default=SECONDS_IN_DAY)
+    subparser.set_defaults(func=_do_supervise)
+
+    subparser = subparsers.add_parser("lease-tasks", help="Lease and execute tasks planned by a coordinator (requires a shared tasks coordination backend).")
+    subparser.add_argument("--workspace", required=True, help="Workspace path.")
+    subparser.add_argument("--num-threads", type=int, default=4)
+    subparser.add_argument("--backfill", action="store_true", default=False, help="Lease tasks of backfills (instead of the ones of the continuous flows).")
+    subparser.set_defaults(func=_do_lease_tasks)
+
+    subparser = subparsers.add_parser("backfill", help="Reload (some) append-only indices, within an interval. The checkpoint is not touched.")
+    subparser.add_argument("--workspace", required=True, help="Workspace path.")
+    subparser.add_argument("--from", dest="start", type=int, required=True, help="Start timestamp (inclusive).")
+    subparser.add_argument("--to", dest="end", type=int, required=True, help="End timestamp (exclusive).")
+    subparser.add_argument("--indices", nargs="*", default=[], help="Indices to reload (default: all append-only indices).")
+    subparser.add_argument("--num-threads", type=int, default=None, help="Number of threads (default: as configured for append-only indices).")
+    subparser.set_defaults(func=_do_backfill)
+
+    subparser = subparsers.add_parser("reprocess", help="Transform and load again (some) append-only indices, within an interval, using the extraction cache.")
+    subparser.add_argument("--workspace", required=True, help="Workspace path.")
+    subparser.add_argument("--from", dest="start", type=int, required=True, help="Start timestamp (inclusive).")
+    subparser.add_argument("--to", dest="end", type=int, required=True, help="End timestamp (exclusive).")
+    subparser.add_argument("--indices", nargs="*", default=[], help="Indices to reprocess (default: all append-only indices).")
+    subparser.add_argument("--num-threads", type=int, default=None, help="Number of threads (default: as configured for append-only indices).")
+    subparser.set_defaults(func=_do_reprocess)
+
     subparser = subparsers.add_parser("rewind", help="Rewind to the latest checkpoint.")
     subparser.add_argument("--workspace", required=True, help="Workspace path.")
     subparser.set_defaults(func=_do_rewind_to_checkpoint)
 
+    subparser = subparsers.add_parser("deduplicate", help="Remove duplicated records (by _id) from a table (append-only indices), within an interval.")
+    subparser.add_argument("--workspace", required=True, help="Workspace path.")
+    subparser.add_argument("--table", required=True, help="Table name (e.g. operations).")
+    subparser.add_argument("--start", type=int, required=True, help="Start timestamp (inclusive).")
+    subparser.add_argument("--end", type=int, required=True, help="End timestamp (exclusive).")
+    subparser.set_defaults(func=_do_deduplicate)
+
+    subparser = subparsers.add_parser("repair", help="Reload the hours (of a table of the append-only indices, within an interval) whose counts differ between BQ and Elasticsearch.")
+    subparser.add_argument("--workspace", required=True, help="Workspace path.")
+    subparser.add_argument("--table", required=True, help="Table name (e.g. operations).")
+    subparser.add_argument("--start", type=int, required=True, help="Start timestamp (inclusive).")
+    subparser.add_argument("--end", type=int, required=True, help="End timestamp (exclusive).")
+    subparser.set_defaults(func=_do_repair)
+
     subparser = subparsers.add_parser("find-latest-good-checkpoint", help="Finds the latest good checkpoint (when BQ and Elasticsearch data counts match).")
     subparser.add_argument("--workspace", required=True, help="Workspace path.")
     subparser.add_argument("--search-step", type=int, default=SECONDS_IN_DAY, help="Search step (search precision).")
@@ -74,18 +126,34 @@ def _setup_logging(verbose: bool):
 def _process_append_only_indices(args: Any):
     workspace = Path(args.workspace).expanduser().resolve()
     sleep_between_iterations = args.sleep_between_iterations
+    # Clients are reused across iterations.
+    clients_provider = ClientsProvider()
+    profiler = _create_profiler_if_requested(args)
 
     # Before starting the ETL process, we rewind to the latest checkpoint,
     # to clean up any eventual partial loads from a previous (interrupted) run.
-    AppController(workspace).rewind_to_checkpoint()
+    # If the interrupted bulk can be resumed (see the tasks journal), the cleanup happens when resuming it, instead.
+    AppController(workspace, clients_provider).resume_or_rewind_to_checkpoint()
+
+    if args.tail:
+        # When tailing, the controller (and its clients) is long-lived.
+        controller = AppController(workspace, clients_provider, profiler)
+
+        try:
+            controller.tail_append_only_indices(args.micro_batch_interval, args.data_transfer_interval)
+        finally:
+            _save_profile_if_any(profiler, workspace, "append_only_indices")
+
+        return
 
     for iteration_index in range(0, sys.maxsize):
         logging.info(f"Starting iteration {iteration_index} (_process_append_only_indices)...")
 
         # We create a new controller on each iteration, so that workspace configuration and state is reloaded.
-        controller = AppController(workspace)
+        controller = AppController(workspace, clients_provider, profiler)
         controller.process_append_only_indices()
-        controller.bq_client.trigger_data_transfer(controller.worker_config.append_only_indices.bq_data_transfer_name)
+        controller.publish_append_only_indices()
+        _save_profile_if_any(profiler, workspace, "append_only_indices")
 
         logging.info(f"Iteration {iteration_index} done (_process_append_only_indices). Will sleep {sleep_between_iterations} seconds...")
         time.sleep(sleep_between_iterations)
@@ -94,24 +162,89 @@ def _process_append_only_indices(args: Any):
 def _process_mutable_indices(args: Any):
     workspace = Path(args.workspace).expanduser().resolve()
     sleep_between_iterations = args.sleep_between_iterations
+    # Clients are reused across iterations.
+    clients_provider = ClientsProvider()
+    profiler = _create_profiler_if_requested(args)
 
     for iteration_index in range(0, sys.maxsize):
         logging.info(f"Starting iteration {iteration_index} (_do_main_mutable_indices)...")
 
-        controller = AppController(workspace)
+        # We create a new controller on each iteration, so that workspace configuration and state is reloaded.
+        controller = AppController(workspace, clients_provider, profiler)
         controller.process_mutable_indices()
         controller.bq_client.trigger_data_transfer(controller.worker_config.mutable_indices.bq_data_transfer_name)
+        _save_profile_if_any(profiler, workspace, "mutable_indices")
 
         logging.info(f"Iteration {iteration_index} done (_do_main_mutable_indices). Will sleep {sleep_between_iterations} seconds...")
         time.sleep(sleep_between_iterations)
 
 
+def _create_profiler_if_requested(args: Any) -> Optional[SamplingProfiler]:
+    if not args.profile:
+        return None
+
+    profiler = SamplingProfiler()
+    profiler.start()
+    return profiler
+
+
+def _save_profile_if_any(profiler: Optional[SamplingProfiler], workspace: Path, flow_name: str):
+    if profiler is None:
+        return
+
+    # Samples are accumulated across iterations.
+    profiler.save_folded_stacks(workspace / "profiles" / f"{flow_name}.folded")
+
+
+def _do_supervise(args: Any):
+    workspaces = [Path(workspace).expanduser().resolve() for workspace in args.workspaces]
+
+    supervisor = Supervisor(
+        workspaces=workspaces,
+        num_workers=args.num_workers,
+        sleep_between_append_only_iterations=args.append_only_sleep_between_iterations,
+        sleep_between_mutable_iterations=args.mutable_sleep_between_iterations
+    )
+
+    supervisor.run()
+
+
+def _do_lease_tasks(args: Any):
+    workspace = Path(args.workspace).expanduser().resolve()
+    controller = AppController(workspace)
+    controller.lease_tasks(args.num_threads, args.backfill)
+
+
+def _do_backfill(args: Any):
+    workspace = Path(args.workspace).expanduser().resolve()
+    controller = AppController(workspace)
+    controller.backfill(args.start, args.end, args.indices, args.num_threads)
+
+
+def _do_reprocess(args: Any):
+    workspace = Path(args.workspace).expanduser().resolve()
+    controller = AppController(workspace)
+    controller.reprocess(args.start, args.end, args.indices, args.num_threads)
+
+
 def _do_rewind_to_checkpoint(args: Any):
     workspace = Path(args.workspace).expanduser().resolve()
     controller = AppController(workspace)
     controller.rewind_to_checkpoint()
 
 
+def _do_deduplicate(args: Any):
+    workspace = Path(args.workspace).expanduser().resolve()
+    controller = AppController(workspace)
+    controller.deduplicate(args.table, args.start, args.end)
+
+
+def _do_repair(args: Any):
+    workspace = Path(args.workspace).expanduser().resolve()
+    controller = AppController(workspace)
+    controller.repair(args.table, args.start, args.end)
+
+
 def _do_find_latest_good_checkpoint(args: Any):
     workspace = Path(args.workspace).expanduser().resolve()
     controller = AppController(workspace)
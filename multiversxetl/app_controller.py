@@ -1,29 +1,102 @@
+import contextlib
+import copy
 import datetime
+import functools
 import logging
+import os
 import socket
 import sys
 import threading
+import time
 import traceback
 from pathlib import Path
-from typing import List, Optional
+from typing import (TYPE_CHECKING, ContextManager, Dict, List, Optional,
+                    Protocol, Set, Tuple)
 
-from multiversxetl.bq_client import BqClient
-from multiversxetl.checks import check_loaded_data
-from multiversxetl.constants import END_TIME_DELTA
-from multiversxetl.errors import SomeTasksFailedError, UsageError
+from multiversxetl.checks import check_loaded_data, find_mismatched_intervals
+from multiversxetl.clients_provider import ClientsProvider
+from multiversxetl.concurrency_controller import AimdConcurrencyController
+from multiversxetl.constants import (END_TIME_DELTA,
+                                     POINT_IN_TIME_REFRESH_INTERVAL_IN_SECONDS,
+                                     TAIL_MAX_NUM_MICRO_BATCHES_BEHIND)
+from multiversxetl.errors import (CombinedLoadError, CountsMismatchError,
+                                  SomeTasksFailedError, UsageError)
+from multiversxetl.extraction_cache import (ExtractionCache,
+                                            get_interval_boundaries)
 from multiversxetl.file_storage import FileStorage
-from multiversxetl.indexer import Indexer
-from multiversxetl.logger import CloudLogger
+from multiversxetl.load_staging import LoadStager
+from multiversxetl.loaded_intervals import LoadedIntervalsRegistry
+from multiversxetl.profiler import SamplingProfiler
+from multiversxetl.shared_tasks_dashboard import SharedTasksDashboard
+from multiversxetl.task import Task
 from multiversxetl.tasks_dashboard import TasksDashboard
+from multiversxetl.tasks_history import TasksHistory
+from multiversxetl.tasks_monitor import TasksMonitor
 from multiversxetl.tasks_runner import TasksRunner
-from multiversxetl.worker_config import IndicesConfig, WorkerConfig
-from multiversxetl.worker_state import WorkerState
+from multiversxetl.worker_config import (CountChecksErrata,
+                                         DailyAggregateConfig, IndicesConfig,
+                                         WorkerConfig)
+from multiversxetl.worker_pool import (PRIORITY_APPEND_ONLY_INDICES,
+                                       PrioritizedWorkerPool)
+from multiversxetl.worker_state import PromotionInvalidations, WorkerState
+
+if TYPE_CHECKING:
+    from multiversxetl.bq_client import BqClient
+    from multiversxetl.indexer import Indexer
+    from multiversxetl.logger import CloudLogger
+
+
+class ITasksDashboard(Protocol):
+    def plan_bulk(
+        self,
+        bq_dataset: str,
+        indices: List[str],
+        indices_without_timestamp: List[str],
+        initial_start_timestamp: int,
+        initial_end_timestamp: int,
+        num_intervals_in_bulk: int,
+        interval_size_in_seconds: int,
+        point_in_time_ids: Optional[Dict[str, str]] = None,
+        should_align_intervals_to_partitions: bool = False,
+        num_slices_by_index: Optional[Dict[str, int]] = None,
+        interval_boundaries: Optional[List[int]] = None
+    ) -> Optional[int]: ...
+
+    def pick_and_start_task(self) -> Optional[Task]: ...
+    def has_pending_tasks(self) -> bool: ...
+    def on_task_finished(self, task: Task) -> None: ...
+    def on_task_failed(self, task: Task, error: Exception, formatted_stack_trace: str) -> None: ...
+    def has_resumable_bulk(self, bq_dataset: str, initial_start_timestamp: int) -> bool: ...
+    def get_previously_finished_tasks(self) -> List[Task]: ...
+    def restore_finished_task(self, task: Task) -> None: ...
+    def mark_task_as_replacing_existing_data(self, task: Task) -> None: ...
+    def wait_for_tasks_of_other_workers(self) -> bool: ...
+    def assert_all_existing_tasks_are_finished(self) -> None: ...
+    def get_all_tasks(self) -> List[Task]: ...
+    def get_failed_tasks(self) -> List[Task]: ...
+    def report_tasks(self) -> None: ...
 
 
 class AppController:
-    def __init__(self, workspace: Path) -> None:
+    def __init__(
+        self,
+        workspace: Path,
+        clients_provider: Optional[ClientsProvider] = None,
+        profiler: Optional[SamplingProfiler] = None,
+        worker_pool: Optional[PrioritizedWorkerPool] = None,
+        worker_priority: int = PRIORITY_APPEND_ONLY_INDICES
+    ) -> None:
+        """
+        The controller (re)loads the configuration and the state from the workspace. Clients are obtained from the (long-lived) clients provider, if any.
+        If a profiler is provided, the stages of the tasks are profiled.
+        If a worker pool is provided (shared with other controllers), each consumer holds a slot of the pool (with the given priority) while running a task.
+
+        Clients (and the tasks runner, which depends on them) are only built when first needed, so that commands which don't use them start fast.
+        """
         worker_config_path = workspace / "worker_config.json"
         self.worker_state_path = workspace / "worker_state.json"
+        self.loaded_intervals_path = workspace / "loaded_intervals.jsonl"
+        self.tasks_history_path = workspace / "tasks_history.json"
 
         if not worker_config_path.exists():
             raise UsageError(f"Worker config file not found: {worker_config_path}")
@@ -32,24 +105,90 @@ class AppController:
 
         self.worker_config = WorkerConfig.load_from_file(worker_config_path)
         self.worker_state = WorkerState.load_from_file(self.worker_state_path)
-        worker_id = socket.gethostname()
+        self.promotion_invalidations = PromotionInvalidations(workspace / "promotion_invalidations")
+        self.tasks_history = TasksHistory.load_from_file(self.tasks_history_path)
+        self.worker_id = socket.gethostname()
+        self.workspace = workspace
+        self.clients_provider = clients_provider or ClientsProvider()
+        self.profiler = profiler
+        self.worker_pool = worker_pool
+        self.worker_priority = worker_priority
+
+        self.file_storage = FileStorage(workspace)
+        self.tasks_dashboard = _create_tasks_dashboard(
+            self.worker_config,
+            f"{self.worker_id}:{os.getpid()}",
+            self.file_storage.journals_folder,
+            self.tasks_history
+        )
+        self._concurrency_controllers: Dict[str, AimdConcurrencyController] = {}
+
+        monitoring_config = self.worker_config.tasks_monitoring
+        self.tasks_monitor = TasksMonitor(
+            stall_timeout_in_seconds=monitoring_config.stall_timeout_in_seconds,
+            task_deadline_in_seconds=monitoring_config.task_deadline_in_seconds,
+            should_speculate=monitoring_config.should_speculate,
+            speculation_min_elapsed_in_seconds=monitoring_config.speculation_min_elapsed_in_seconds,
+            speculation_slowness_factor=monitoring_config.speculation_slowness_factor
+        )
 
-        self.bq_client = BqClient(self.worker_config.gcp_project_id)
+    @functools.cached_property
+    def bq_client(self) -> "BqClient":
+        return self.clients_provider.get_bq_client(self.worker_config.gcp_project_id)
 
-        self.indexer = Indexer(
+    @functools.cached_property
+    def indexer(self) -> "Indexer":
+        return self.clients_provider.get_indexer(
             url=self.worker_config.indexer_url,
             username=self.worker_config.indexer_username,
             password=self.worker_config.indexer_password
         )
 
-        self.cloud_logger = CloudLogger(self.worker_config.gcp_project_id, worker_id)
-        self.tasks_dashboard = TasksDashboard()
-        file_storage = FileStorage(workspace)
-        self.tasks_runner = TasksRunner(
+    @functools.cached_property
+    def cloud_logger(self) -> "CloudLogger":
+        return self.clients_provider.get_cloud_logger(self.worker_config.gcp_project_id, self.worker_id)
+
+    @functools.cached_property
+    def tasks_runner(self) -> TasksRunner:
+        return TasksRunner(
             bq_client=self.bq_client,
             indexer=self.indexer,
-            file_storage=file_storage,
-            schema_folder=self.worker_config.schema_folder
+            file_storage=self.file_storage,
+            schema_folder=self.worker_config.schema_folder,
+            loaded_intervals=LoadedIntervalsRegistry(self.loaded_intervals_path),
+            max_num_records_per_coalesced_task=self.worker_config.loads_coalescing.max_num_records_per_task,
+            max_num_tasks_per_combined_load=self.worker_config.loads_coalescing.max_num_tasks_per_load,
+            profiler=self.profiler,
+            extraction_cache=self._create_extraction_cache(self.workspace),
+            clustering_field=self.worker_config.load_output_sorting.clustering_field,
+            clustering_fields_by_table=self.worker_config.load_output_sorting.clustering_fields_by_table,
+            max_num_records_to_sort_in_memory=self.worker_config.load_output_sorting.max_num_records_in_memory,
+            load_stager=self._create_load_stager(),
+            monitor=self.tasks_monitor
+        )
+
+    def _create_extraction_cache(self, workspace: Path) -> Optional[ExtractionCache]:
+        config = self.worker_config.extraction_cache
+        if not config.enabled:
+            return None
+
+        cached_indices_configs = [self.worker_config.append_only_indices]
+        if config.should_cache_mutable_indices:
+            cached_indices_configs.append(self.worker_config.mutable_indices)
+
+        cached_tables = {f"{indices_config.bq_dataset}.{index_name}" for indices_config in cached_indices_configs for index_name in indices_config.indices}
+        return ExtractionCache(workspace / "extraction_cache", config.max_size_in_bytes, cached_tables)
+
+    def _create_load_stager(self) -> Optional[LoadStager]:
+        config = self.worker_config.load_staging
+        if not config.bucket:
+            return None
+
+        return LoadStager(
+            storage=self.clients_provider.get_gcs_staging_storage(self.worker_config.gcp_project_id, config.bucket),
+            min_num_bytes=config.min_num_bytes,
+            shard_size_in_bytes=config.shard_size_in_bytes,
+            num_parallel_uploads=config.num_parallel_uploads
         )
 
     def process_mutable_indices(self):
@@ -67,11 +206,16 @@ class AppController:
             indices_config=indices_config,
             initial_start_timestamp=self.worker_config.genesis_timestamp,
             initial_end_timestamp=now,
-            use_global_counts_for_bq_when_checking_loaded_data=True
+            use_global_counts_for_bq_when_checking_loaded_data=True,
+            # Mutable indices are truncated (and reloaded from scratch) on each iteration, thus nothing can be resumed.
+            should_resume_interrupted_bulk=False
         )
 
+        self._update_daily_aggregates(indices_config, self.worker_config.genesis_timestamp, now)
+
     def process_append_only_indices(self):
         indices_config = self.worker_config.append_only_indices
+        _validate_append_only_indices_config(indices_config)
 
         now = int(_get_now().timestamp())
         is_time_partition_start_at_genesis = indices_config.time_partition_start == self.worker_config.genesis_timestamp
@@ -90,7 +234,8 @@ class AppController:
                 indices_config=indices_config,
                 initial_start_timestamp=(self.worker_state.latest_checkpoint_timestamp or indices_config.time_partition_start),
                 initial_end_timestamp=initial_end_timestamp,
-                use_global_counts_for_bq_when_checking_loaded_data=is_time_partition_start_at_genesis
+                use_global_counts_for_bq_when_checking_loaded_data=is_time_partition_start_at_genesis,
+                should_resume_interrupted_bulk=True
             )
 
             if latest_checkpoint_timestamp is None:
@@ -99,14 +244,251 @@ class AppController:
             self.worker_state.latest_checkpoint_timestamp = latest_checkpoint_timestamp
             self.worker_state.save_to_file(self.worker_state_path)
 
+            self._update_daily_aggregates_up_to_checkpoint()
             self.cloud_logger.log_info(f"Bulk #{bulk_index} done.")
 
+    def tail_append_only_indices(self, micro_batch_interval_in_seconds: int, data_transfer_interval_in_seconds: int):
+        """
+        Continuously processes the append-only indices in small intervals (micro-batches), keeping the checkpoint just behind "END_TIME_DELTA".
+        The checkpoint advances after each (verified) micro-batch. The data is published at most once per "data_transfer_interval_in_seconds".
+        """
+        indices_config = self.worker_config.append_only_indices
+        _validate_append_only_indices_config(indices_config)
+
+        if indices_config.time_partition_end > 0:
+            raise UsageError("Tailing is not possible when 'time_partition_end' is set.")
+
+        latest_data_transfer_timestamp = 0
+
+        while True:
+            watermark = int(_get_now().timestamp()) - END_TIME_DELTA
+            start_timestamp = self.worker_state.latest_checkpoint_timestamp or indices_config.time_partition_start
+            lag = watermark - start_timestamp
+
+            if lag > TAIL_MAX_NUM_MICRO_BATCHES_BEHIND * micro_batch_interval_in_seconds:
+                self.cloud_logger.log_info(f"Checkpoint is {lag} seconds behind, will catch up using regular bulks.")
+                self.process_append_only_indices()
+                continue
+
+            if lag < micro_batch_interval_in_seconds:
+                time.sleep(micro_batch_interval_in_seconds - lag)
+                continue
+
+            latest_checkpoint_timestamp = self._process_micro_batch(indices_config, start_timestamp, watermark)
+            if latest_checkpoint_timestamp is not None:
+                self.worker_state.latest_checkpoint_timestamp = latest_checkpoint_timestamp
+                self.worker_state.save_to_file(self.worker_state_path)
+                logging.info(f"Micro-batch done. Latest checkpoint: {self.worker_state.get_latest_checkpoint_datetime()}.")
+                self._update_daily_aggregates_up_to_checkpoint()
+
+            now_timestamp = int(_get_now().timestamp())
+            if now_timestamp - latest_data_transfer_timestamp >= data_transfer_interval_in_seconds:
+                self.publish_append_only_indices()
+                latest_data_transfer_timestamp = now_timestamp
+
+    def publish_append_only_indices(self):
+        """
+        Makes the data of the append-only indices available in the main dataset. If "bq_main_dataset" is configured,
+        only the data loaded (and verified) since the latest promotion is copied. Otherwise, a data transfer (of the whole staging dataset) is triggered.
+        """
+        indices_config = self.worker_config.append_only_indices
+
+        if not indices_config.bq_main_dataset:
+            self.bq_client.trigger_data_transfer(indices_config.bq_data_transfer_name)
+            return
+
+        start_timestamp = self.worker_state.latest_promoted_timestamp or indices_config.time_partition_start
+        end_timestamp = self.worker_state.latest_checkpoint_timestamp
+
+        # Invalidations (e.g. by backfills) move the start back.
+        invalidations = self.promotion_invalidations.load()
+        start_timestamp = min([start_timestamp, *invalidations.values()])
+
+        if start_timestamp < end_timestamp:
+            for table in indices_config.indices:
+                self.bq_client.promote_interval(indices_config.bq_dataset, indices_config.bq_main_dataset, table, start_timestamp, end_timestamp)
+
+            self.worker_state.latest_promoted_timestamp = end_timestamp
+            self.cloud_logger.log_info(f"Promoted data between {start_timestamp} and {end_timestamp} to {indices_config.bq_main_dataset}.")
+        elif invalidations:
+            # E.g. after a rewind, data beyond the checkpoint has to be promoted again (once reloaded).
+            self.worker_state.latest_promoted_timestamp = start_timestamp
+        else:
+            logging.info("Nothing to promote.")
+            return
+
+        self.worker_state.save_to_file(self.worker_state_path)
+        # Consumed only once the watermark is saved (if interrupted in between, the data is simply promoted again).
+        self.promotion_invalidations.remove(invalidations)
+
+    def _invalidate_promoted_data(self, timestamp: int):
+        """
+        Data in the staging dataset, on or after the given timestamp, has changed. Thus, it has to be promoted again (by the next "publish_append_only_indices()").
+        Should only be called once the data is verified (otherwise, partially loaded data could be promoted).
+        """
+        if not self.worker_config.append_only_indices.bq_main_dataset:
+            return
+
+        self.promotion_invalidations.add(timestamp)
+
+    def _process_micro_batch(self, indices_config: IndicesConfig, start_timestamp: int, end_timestamp: int) -> Optional[int]:
+        micro_batch_config = copy.copy(indices_config)
+        micro_batch_config.indices_without_timestamp = []
+        # The final check only covers the micro-batch.
+        micro_batch_config.time_partition_start = start_timestamp
+        micro_batch_config.interval_size_in_seconds = end_timestamp - start_timestamp
+        micro_batch_config.num_intervals_in_bulk = 1
+        micro_batch_config.target_bulk_duration_in_seconds = 0
+
+        return self._plan_and_consume_bulk(
+            indices_config=micro_batch_config,
+            initial_start_timestamp=start_timestamp,
+            initial_end_timestamp=end_timestamp,
+            use_global_counts_for_bq_when_checking_loaded_data=False,
+            should_resume_interrupted_bulk=True
+        )
+
+    def reprocess(self, start_timestamp: int, end_timestamp: int, indices: List[str], num_threads: Optional[int] = None):
+        """
+        Same as "backfill()", but the records are extracted from the extraction cache (when available), instead of the indexer.
+        The tasks are planned so that their intervals match the cached ones (the tasks of the continuous flow have arbitrary intervals).
+        Useful after changing a transformer or a schema.
+        """
+        extraction_cache = self.tasks_runner.extraction_cache
+        if extraction_cache is None:
+            raise UsageError("Reprocessing requires the extraction cache (see 'extraction_cache' in the worker config).")
+
+        indices_config = self.worker_config.append_only_indices
+        indices = indices or indices_config.indices
+        cached_intervals = [interval for index_name in indices for interval in extraction_cache.get_cached_intervals(indices_config.bq_dataset, index_name)]
+        interval_boundaries = get_interval_boundaries(cached_intervals, start_timestamp, end_timestamp, indices_config.interval_size_in_seconds)
+
+        self.tasks_runner.should_extract_from_cache = True
+        self.backfill(start_timestamp, end_timestamp, indices, num_threads, interval_boundaries)
+
+    def backfill(
+        self,
+        start_timestamp: int,
+        end_timestamp: int,
+        indices: List[str],
+        num_threads: Optional[int] = None,
+        interval_boundaries: Optional[List[int]] = None
+    ):
+        """
+        Reloads the data of (some) append-only indices, in the interval [start_timestamp, end_timestamp).
+        The whole interval is planned as a single bulk (thus, its tasks are consumed with maximal parallelism), and verified at the end.
+        The progress is journaled separately from the one of the continuous flow, so that an interrupted backfill can be resumed.
+        The checkpoint (worker state) is not touched.
+
+        If provided, the "interval_boundaries" (instead of the configured interval size) delimit the planned intervals.
+        """
+        indices_config = self.worker_config.append_only_indices
+        indices = indices or indices_config.indices
+        _validate_append_only_indices_config(indices_config)
+
+        unknown_indices = set(indices) - set(indices_config.indices)
+        if unknown_indices:
+            raise UsageError(f"Unknown (append-only) indices: {', '.join(sorted(unknown_indices))}")
+        if start_timestamp >= end_timestamp:
+            raise UsageError("The start of the backfill interval must be before its end.")
+
+        backfill_config = copy.copy(indices_config)
+        backfill_config.indices = indices
+        backfill_config.indices_without_timestamp = []
+        # Used as the start of the final check.
+        backfill_config.time_partition_start = start_timestamp
+        backfill_config.num_intervals_in_bulk = sys.maxsize
+        backfill_config.target_bulk_duration_in_seconds = 0
+        backfill_config.num_threads = num_threads or indices_config.num_threads
+
+        if interval_boundaries:
+            backfill_config.interval_size_in_seconds = end_timestamp - start_timestamp
+
+        # The continuous flow has its own dashboard (and journal, or database).
+        self._use_backfill_tasks_dashboard()
+
+        if self.tasks_dashboard.has_resumable_bulk(indices_config.bq_dataset, start_timestamp):
+            self.cloud_logger.log_info(f"Resuming backfill, start = {start_timestamp}, end = {end_timestamp}.")
+        else:
+            self.cloud_logger.log_info(f"Starting backfill, start = {start_timestamp}, end = {end_timestamp}, indices = {indices}.")
+
+            for table in indices:
+                self.bq_client.delete_in_interval(indices_config.bq_dataset, table, start_timestamp, end_timestamp)
+
+        self._plan_and_consume_bulk(
+            indices_config=backfill_config,
+            initial_start_timestamp=start_timestamp,
+            initial_end_timestamp=end_timestamp,
+            use_global_counts_for_bq_when_checking_loaded_data=False,
+            should_resume_interrupted_bulk=True,
+            # Data beyond the backfill interval belongs to the continuous flow.
+            should_delete_data_beyond_plan_on_resume=False,
+            interval_boundaries=interval_boundaries
+        )
+
+        # Only now (the interval is verified), the main dataset (and the daily aggregates) can receive the reloaded interval.
+        self._invalidate_promoted_data(start_timestamp)
+        self._update_daily_aggregates(backfill_config, start_timestamp, end_timestamp)
+        self.cloud_logger.log_info(f"Backfill done, start = {start_timestamp}, end = {end_timestamp}.")
+
+    def _use_backfill_tasks_dashboard(self):
+        self.tasks_dashboard = _create_tasks_dashboard(
+            self.worker_config,
+            f"{self.worker_id}:{os.getpid()}",
+            self.file_storage.journals_folder,
+            self.tasks_history,
+            is_for_backfill=True
+        )
+
     def _plan_and_consume_bulk(
         self,
         indices_config: IndicesConfig,
         initial_start_timestamp: int,
         initial_end_timestamp: int,
-        use_global_counts_for_bq_when_checking_loaded_data: bool
+        use_global_counts_for_bq_when_checking_loaded_data: bool,
+        should_resume_interrupted_bulk: bool,
+        should_delete_data_beyond_plan_on_resume: bool = True,
+        interval_boundaries: Optional[List[int]] = None
+    ) -> Optional[int]:
+        # All tasks of a bulk (and the final check) see the same snapshot of each index.
+        point_in_time_ids = self._open_points_in_time(indices_config.indices) if indices_config.use_point_in_time else {}
+        # The points-in-time must outlive the bulk (until the final check): the tasks of an index might be finished long before the ones of another index.
+        event_bulk_is_done = threading.Event()
+        point_in_time_keeper = threading.Thread(
+            name="points-in-time-keeper",
+            target=self._keep_points_in_time_alive,
+            args=[point_in_time_ids, event_bulk_is_done],
+            daemon=True
+        )
+
+        if point_in_time_ids:
+            point_in_time_keeper.start()
+
+        try:
+            return self._do_plan_and_consume_bulk(
+                indices_config=indices_config,
+                initial_start_timestamp=initial_start_timestamp,
+                initial_end_timestamp=initial_end_timestamp,
+                use_global_counts_for_bq_when_checking_loaded_data=use_global_counts_for_bq_when_checking_loaded_data,
+                should_resume_interrupted_bulk=should_resume_interrupted_bulk,
+                should_delete_data_beyond_plan_on_resume=should_delete_data_beyond_plan_on_resume,
+                point_in_time_ids=point_in_time_ids,
+                interval_boundaries=interval_boundaries
+            )
+        finally:
+            event_bulk_is_done.set()
+            self._close_points_in_time(point_in_time_ids)
+
+    def _do_plan_and_consume_bulk(
+        self,
+        indices_config: IndicesConfig,
+        initial_start_timestamp: int,
+        initial_end_timestamp: int,
+        use_global_counts_for_bq_when_checking_loaded_data: bool,
+        should_resume_interrupted_bulk: bool,
+        should_delete_data_beyond_plan_on_resume: bool,
+        point_in_time_ids: Dict[str, str],
+        interval_boundaries: Optional[List[int]]
     ) -> Optional[int]:
         latest_planned_interval_end_time = self.tasks_dashboard.plan_bulk(
             bq_dataset=indices_config.bq_dataset,
@@ -114,20 +496,39 @@ class AppController:
             indices_without_timestamp=indices_config.indices_without_timestamp,
             initial_start_timestamp=initial_start_timestamp,
             initial_end_timestamp=initial_end_timestamp,
-            num_intervals_in_bulk=indices_config.num_intervals_in_bulk,
-            interval_size_in_seconds=indices_config.interval_size_in_seconds
+            num_intervals_in_bulk=self._get_num_intervals_in_bulk(indices_config),
+            interval_size_in_seconds=indices_config.interval_size_in_seconds,
+            point_in_time_ids=point_in_time_ids,
+            should_align_intervals_to_partitions=indices_config.should_align_intervals_to_partitions,
+            num_slices_by_index=indices_config.num_slices_by_index,
+            interval_boundaries=interval_boundaries
         )
 
         if latest_planned_interval_end_time is None:
             logging.warning("No tasks planned, nothing to do.")
             return
 
+        if should_resume_interrupted_bulk:
+            self._resume_interrupted_bulk(indices_config, latest_planned_interval_end_time, should_delete_data_beyond_plan_on_resume)
+
         self.tasks_dashboard.report_tasks()
 
+        concurrency_controller = self._get_concurrency_controller(indices_config)
+
         self._consume_tasks_in_parallel(
             num_threads=indices_config.num_threads,
+            concurrency_controller=concurrency_controller
         )
 
+        # When tasks are shared with other workers, we wait for them (and help with leftovers, e.g. tasks with expired leases).
+        while self.tasks_dashboard.wait_for_tasks_of_other_workers():
+            self._consume_tasks_in_parallel(
+                num_threads=indices_config.num_threads,
+                concurrency_controller=concurrency_controller
+            )
+
+        self.tasks_history.save_to_file(self.tasks_history_path)
+
         failed_tasks = self.tasks_dashboard.get_failed_tasks()
         if failed_tasks:
             for task in failed_tasks:
@@ -138,32 +539,310 @@ class AppController:
 
         self.tasks_dashboard.assert_all_existing_tasks_are_finished()
 
+        self._check_loaded_data_and_repair_if_necessary(
+            indices_config,
+            initial_start_timestamp,
+            latest_planned_interval_end_time,
+            use_global_counts_for_bq_when_checking_loaded_data,
+            point_in_time_ids
+        )
+
+        return latest_planned_interval_end_time
+
+    def _check_loaded_data_and_repair_if_necessary(
+        self,
+        indices_config: IndicesConfig,
+        bulk_start_timestamp: int,
+        bulk_end_timestamp: int,
+        use_global_counts_for_bq: bool,
+        point_in_time_ids: Dict[str, str]
+    ):
+        """
+        If "should_repair_on_counts_mismatch" is set, a mismatch is drilled down (within the bulk) to the hours whose counts differ, which are reloaded.
+        Then, the data is checked again. A table is repaired at most once.
+        """
+        repaired_tables: Set[str] = set()
+
+        while True:
+            try:
+                check_loaded_data(
+                    bq_client=self.bq_client,
+                    bq_dataset=indices_config.bq_dataset,
+                    indexer=self.indexer,
+                    tables=indices_config.indices,
+                    start_timestamp=indices_config.time_partition_start,
+                    end_timestamp=bulk_end_timestamp,
+                    use_global_counts_for_bq=use_global_counts_for_bq,
+                    should_fail_on_counts_mismatch=indices_config.should_fail_on_counts_mismatch,
+                    skip_counts_check_for_indices=indices_config.skip_counts_check_for_indices,
+                    counts_checks_errata=indices_config.counts_checks_errata,
+                    point_in_time_ids=point_in_time_ids,
+                    deduplication_start_timestamp=bulk_start_timestamp if indices_config.should_deduplicate_on_counts_mismatch else None
+                )
+
+                return
+            except CountsMismatchError as error:
+                # Repairing requires counts by interval (not global counts).
+                if not indices_config.should_repair_on_counts_mismatch or use_global_counts_for_bq or error.table in repaired_tables:
+                    raise
+
+                # Data of the bulk has not been promoted yet (it's after the checkpoint), or it's promoted at the end of the backfill.
+                point_in_time_id = point_in_time_ids.get(error.table)
+                if not self._repair_table(indices_config, error.table, bulk_start_timestamp, bulk_end_timestamp, point_in_time_id):
+                    raise
+
+                repaired_tables.add(error.table)
+
+    def repair(self, table: str, start_timestamp: int, end_timestamp: int):
+        """
+        Reloads the hours (of a table of the append-only indices, within the interval) whose counts differ between the indexer and BigQuery.
+        Then, the interval is checked again.
+        """
+        indices_config = self.worker_config.append_only_indices
+
+        if table not in indices_config.indices:
+            raise UsageError(f"Unknown (append-only) index: {table}")
+        if start_timestamp >= end_timestamp:
+            raise UsageError("The start of the repair interval must be before its end.")
+
+        repaired_intervals = self._repair_table(indices_config, table, start_timestamp, end_timestamp, None)
+
+        if not repaired_intervals:
+            logging.info(f"Counts match for '{table}', nothing to repair.")
+            return
+
         check_loaded_data(
             bq_client=self.bq_client,
             bq_dataset=indices_config.bq_dataset,
             indexer=self.indexer,
-            tables=indices_config.indices,
-            start_timestamp=indices_config.time_partition_start,
-            end_timestamp=latest_planned_interval_end_time,
-            use_global_counts_for_bq=use_global_counts_for_bq_when_checking_loaded_data,
-            should_fail_on_counts_mismatch=indices_config.should_fail_on_counts_mismatch,
-            skip_counts_check_for_indices=indices_config.skip_counts_check_for_indices,
-            counts_checks_errata=indices_config.counts_checks_errata
+            tables=[table],
+            start_timestamp=start_timestamp,
+            end_timestamp=end_timestamp,
+            use_global_counts_for_bq=False,
+            should_fail_on_counts_mismatch=True,
+            skip_counts_check_for_indices=[],
+            # Errata apply to the whole table, not to an interval.
+            counts_checks_errata=CountChecksErrata({})
         )
 
-        return latest_planned_interval_end_time
+        self._invalidate_promoted_data(repaired_intervals[0][0])
+
+    def _repair_table(self, indices_config: IndicesConfig, table: str, start_timestamp: int, end_timestamp: int, point_in_time_id: Optional[str]) -> List[Tuple[int, int]]:
+        """
+        Returns the repaired sub-intervals (none if there's nothing to repair, i.e. the counts by hour match, within the interval).
+        """
+        intervals = find_mismatched_intervals(self.bq_client, indices_config.bq_dataset, self.indexer, table, start_timestamp, end_timestamp, point_in_time_id)
+
+        for sub_interval_start, sub_interval_end in intervals:
+            self.cloud_logger.log_info(f"Repairing '{table}', start = {sub_interval_start}, end = {sub_interval_end}.")
+
+            # The data of the sub-interval is deleted, then loaded again.
+            task = Task(indices_config.bq_dataset, table, sub_interval_start, sub_interval_end)
+            task.point_in_time_id = point_in_time_id
+            task.should_replace_existing_data = True
+            self.tasks_runner.run(task)
+
+        return intervals
+
+    def _update_daily_aggregates_up_to_checkpoint(self):
+        """
+        Each daily aggregate (of the append-only indices) has its own watermark, which follows the checkpoint.
+        A failed update is retried (along with the subsequent data) after the next bulk.
+        """
+        indices_config = self.worker_config.append_only_indices
+        end_timestamp = self.worker_state.latest_checkpoint_timestamp
+
+        for aggregate in indices_config.daily_aggregates:
+            start_timestamp = self.worker_state.latest_aggregated_timestamps.get(aggregate.name) or indices_config.time_partition_start
+            if start_timestamp >= end_timestamp:
+                continue
+
+            if self._update_daily_aggregate(indices_config, aggregate, start_timestamp, end_timestamp):
+                self.worker_state.latest_aggregated_timestamps[aggregate.name] = end_timestamp
+                self.worker_state.save_to_file(self.worker_state_path)
+
+    def _update_daily_aggregates(self, indices_config: IndicesConfig, start_timestamp: int, end_timestamp: int):
+        """
+        Once the data of an interval is verified, the daily aggregates are updated for the days touched by the interval.
+        """
+        for aggregate in indices_config.daily_aggregates:
+            self._update_daily_aggregate(indices_config, aggregate, start_timestamp, end_timestamp)
+
+    def _update_daily_aggregate(self, indices_config: IndicesConfig, aggregate: DailyAggregateConfig, start_timestamp: int, end_timestamp: int) -> bool:
+        """
+        Returns whether the aggregate has been updated. Failures (e.g. a bad definition of the aggregate) are logged, instead of halting the ingestion.
+        """
+        if aggregate.table not in indices_config.indices:
+            return False
+
+        try:
+            self.bq_client.update_daily_aggregate(
+                bq_dataset=indices_config.bq_dataset,
+                table=aggregate.table,
+                aggregates_dataset=indices_config.bq_aggregates_dataset,
+                aggregate_name=aggregate.name,
+                measures=aggregate.measures,
+                dimensions=aggregate.dimensions,
+                where=aggregate.where,
+                start_timestamp=start_timestamp,
+                end_timestamp=end_timestamp
+            )
+        except Exception as error:
+            self.cloud_logger.log_error(f"Cannot update daily aggregate '{aggregate.name}', start = {start_timestamp}, end = {end_timestamp}: {error}")
+            return False
+
+        return True
+
+    def _open_points_in_time(self, indices: List[str]) -> Dict[str, str]:
+        point_in_time_ids: Dict[str, str] = {}
+
+        try:
+            for index_name in indices:
+                point_in_time_ids[index_name] = self.indexer.open_point_in_time(index_name)
+        except Exception:
+            self._close_points_in_time(point_in_time_ids)
+            raise
+
+        return point_in_time_ids
+
+    def _keep_points_in_time_alive(self, point_in_time_ids: Dict[str, str], event_bulk_is_done: threading.Event) -> None:
+        while not event_bulk_is_done.wait(POINT_IN_TIME_REFRESH_INTERVAL_IN_SECONDS):
+            for index_name, point_in_time_id in point_in_time_ids.items():
+                try:
+                    self.indexer.refresh_point_in_time(point_in_time_id)
+                except Exception as error:
+                    # Not critical, the counts fallback to the index itself if the point-in-time has expired.
+                    logging.warning(f"Could not refresh point-in-time of index {index_name}: {error}")
+
+    def _close_points_in_time(self, point_in_time_ids: Dict[str, str]) -> None:
+        for index_name, point_in_time_id in point_in_time_ids.items():
+            try:
+                self.indexer.close_point_in_time(point_in_time_id)
+            except Exception as error:
+                # Not critical, the point-in-time will expire, eventually.
+                logging.warning(f"Could not close point-in-time of index {index_name}: {error}")
+
+    def _get_num_intervals_in_bulk(self, indices_config: IndicesConfig) -> int:
+        """
+        If a target duration is configured (and there's enough history), the number of intervals is chosen so that the bulk fits the target.
+        The configured "num_intervals_in_bulk" acts as an upper bound.
+        """
+        max_num_intervals = indices_config.num_intervals_in_bulk
+        target_duration = indices_config.target_bulk_duration_in_seconds
+
+        if not target_duration:
+            return max_num_intervals
+
+        hour = _get_now().hour
+        estimated_interval_duration = 0.0
+
+        for index_name in set(indices_config.indices) - set(indices_config.indices_without_timestamp):
+            task = Task(indices_config.bq_dataset, index_name, 0, indices_config.interval_size_in_seconds)
+            estimated_task_duration = self.tasks_history.estimate_task_duration(task, hour)
+
+            if estimated_task_duration is None:
+                logging.info(f"Not enough history for estimating the duration of tasks (index = {index_name}), will plan {max_num_intervals} intervals.")
+                return max_num_intervals
+
+            estimated_interval_duration += estimated_task_duration
+
+        if not estimated_interval_duration:
+            return max_num_intervals
+
+        num_intervals = int(target_duration * indices_config.num_threads / estimated_interval_duration)
+        num_intervals = max(1, min(num_intervals, max_num_intervals))
+
+        logging.info(f"Estimated duration of an interval (all indices): {int(estimated_interval_duration)} seconds. Will plan {num_intervals} intervals.")
+        return num_intervals
+
+    def _resume_interrupted_bulk(
+        self,
+        indices_config: IndicesConfig,
+        latest_planned_interval_end_time: int,
+        should_delete_data_beyond_plan: bool
+    ):
+        """
+        If the planned bulk was interrupted in a previous run, its finished (and verified) tasks are not executed again.
+        Eventual partial loads (of unfinished tasks) are replaced when the tasks are executed.
+        """
+        previously_finished_tasks = self.tasks_dashboard.get_previously_finished_tasks()
+        if not previously_finished_tasks:
+            return
+
+        self.cloud_logger.log_info(f"Resuming interrupted bulk, {len(previously_finished_tasks)} tasks have been finished by a previous run.")
+
+        for task in previously_finished_tasks:
+            if self._is_task_data_loaded(task):
+                self.tasks_dashboard.restore_finished_task(task)
+            else:
+                logging.warning(f"Task {task} has been finished by a previous run, but its data does not match anymore. Will redo it.")
+
+        all_tasks = self.tasks_dashboard.get_all_tasks()
+        num_restored = len([task for task in all_tasks if task.is_finished()])
+        self.cloud_logger.log_info(f"Restored {num_restored} of {len(all_tasks)} tasks.")
+
+        for task in all_tasks:
+            if task.is_finished() or task.start_timestamp is None or task.end_timestamp is None:
+                continue
+
+            # If their content is unchanged (and completely loaded), the loads will be skipped (see "loaded_intervals").
+            self.tasks_dashboard.mark_task_as_replacing_existing_data(task)
+
+        if not should_delete_data_beyond_plan:
+            return
+
+        # Data beyond the current plan might have been loaded by the interrupted run, as well (e.g. if the bulk size was changed in the meantime).
+        for table in indices_config.indices:
+            self.bq_client.delete_on_or_after_timestamp(indices_config.bq_dataset, table, latest_planned_interval_end_time)
+
+    def _is_task_data_loaded(self, task: Task) -> bool:
+        if task.start_timestamp is None or task.end_timestamp is None:
+            return False
+
+        count_in_indexer = self.indexer.count_records(task.index_name, task.start_timestamp, task.end_timestamp, task.point_in_time_id)
+        count_in_bq = self.bq_client.get_num_records_in_interval(task.bq_dataset, task.index_name, task.start_timestamp, task.end_timestamp)
+        return count_in_indexer == count_in_bq
 
-    def _consume_tasks_in_parallel(self, num_threads: int):
+    def _get_concurrency_controller(self, indices_config: IndicesConfig) -> Optional[AimdConcurrencyController]:
+        config = indices_config.adaptive_concurrency
+        if not config.enabled:
+            return None
+
+        # The controller is kept between bulks, so that the learned limit is not lost.
+        controller = self._concurrency_controllers.get(indices_config.bq_dataset)
+        if controller is None:
+            controller = AimdConcurrencyController(
+                metrics=[self.indexer.metrics, self.bq_client.metrics],
+                latency_thresholds_in_seconds=[config.latency_threshold_in_seconds, config.bq_latency_threshold_in_seconds],
+                min_limit=min(config.min_num_threads, indices_config.num_threads),
+                max_limit=indices_config.num_threads,
+                adjustment_interval_in_seconds=config.adjustment_interval_in_seconds
+            )
+
+            self._concurrency_controllers[indices_config.bq_dataset] = controller
+
+        return controller
+
+    def _consume_tasks_in_parallel(self, num_threads: int, concurrency_controller: Optional[AimdConcurrencyController] = None):
         # If an error happens in any thread, we stop all threads.
         event_has_encountered_an_error: threading.Event = threading.Event()
         threads: List[threading.Thread] = []
 
+        # The lazily-built dependencies of the consumers are built here, before the threads start (so that they are built only once).
+        _ = self.tasks_runner, self.cloud_logger
+
+        event_consumers_are_done = threading.Event()
+        watchdog = threading.Thread(name="tasks-watchdog", target=self._watch_tasks, args=[event_consumers_are_done], daemon=True)
+        watchdog.start()
+
         for thread_index in range(num_threads):
             thread = threading.Thread(
                 name=f"consume-task-{thread_index}",
                 target=self._consume_tasks_thread,
                 args=[
-                    event_has_encountered_an_error
+                    event_has_encountered_an_error,
+                    thread_index,
+                    concurrency_controller
                 ]
             )
 
@@ -174,24 +853,137 @@ class AppController:
             if thread.is_alive():
                 thread.join()
 
-    def _consume_tasks_thread(self, external_or_internal_event_has_encountered_an_error: threading.Event):
+        event_consumers_are_done.set()
+        watchdog.join()
+
+        # Tasks whose loads are still deferred (coalesced) are loaded now (even if an error has happened, in the meantime).
+        try:
+            self._on_tasks_finished(self.tasks_runner.flush_coalesced_loads())
+        except CombinedLoadError as error:
+            logging.error("Error while performing a combined load.")
+            self._on_tasks_failed(error.tasks, error)
+
+    def _consume_tasks_thread(
+        self,
+        external_or_internal_event_has_encountered_an_error: threading.Event,
+        thread_index: int,
+        concurrency_controller: Optional[AimdConcurrencyController]
+    ):
         while True:
             if external_or_internal_event_has_encountered_an_error.is_set():
                 break
 
-            task = self.tasks_dashboard.pick_and_start_task()
+            if concurrency_controller and thread_index >= concurrency_controller.get_limit():
+                # This consumer is (temporarily) inactive.
+                if not self.tasks_dashboard.has_pending_tasks():
+                    break
+
+                time.sleep(1)
+                continue
+
+            # The slot is acquired before picking the task, so that the waiting time isn't accounted to the task.
+            with self._worker_slot():
+                task, is_speculative = self._pick_task()
+
+                if task is not None and not self._run_task(task, is_speculative, external_or_internal_event_has_encountered_an_error):
+                    break
+
             if task is None:
-                break
+                if self.tasks_monitor.may_pick_straggler_later():
+                    time.sleep(1)
+                    continue
 
-            try:
-                self.tasks_runner.run(task)
-                self.tasks_dashboard.on_task_finished(task)
-            except Exception as error:
-                logging.error(f"Error while consuming task {task}.")
-                external_or_internal_event_has_encountered_an_error.set()
-                task.set_failed(error, traceback.format_exc())
                 break
 
+    def _worker_slot(self) -> ContextManager[None]:
+        if self.worker_pool is None:
+            return contextlib.nullcontext()
+        return self.worker_pool.slot(self.worker_priority)
+
+    def _pick_task(self) -> Tuple[Optional[Task], bool]:
+        """
+        Returns the task to run (if any), and whether it should run speculatively.
+        """
+        task = self.tasks_dashboard.pick_and_start_task()
+        if task is not None:
+            return task, False
+
+        # Nothing left to pick (e.g. near the end of the bulk). The consumer can help with a straggling task, if any.
+        return self.tasks_monitor.pick_straggler(), True
+
+    def _run_task(self, task: Task, is_speculative: bool, external_or_internal_event_has_encountered_an_error: threading.Event) -> bool:
+        """
+        Returns False if the task has failed (in which case, all consumers should stop).
+        """
+        try:
+            self._on_tasks_finished(self.tasks_runner.run(task, is_speculative))
+            return True
+        except CombinedLoadError as error:
+            logging.error(f"Error while consuming task {task} (combined load).")
+            external_or_internal_event_has_encountered_an_error.set()
+            self._on_tasks_failed(error.tasks, error)
+            return False
+        except Exception as error:
+            logging.error(f"Error while consuming task {task}.")
+            external_or_internal_event_has_encountered_an_error.set()
+            self.tasks_dashboard.on_task_failed(task, error, traceback.format_exc())
+            return False
+
+    def _watch_tasks(self, event_consumers_are_done: threading.Event):
+        interval = self.worker_config.tasks_monitoring.heartbeat_interval_in_seconds
+
+        while not event_consumers_are_done.wait(interval):
+            self.tasks_monitor.check()
+
+    def _on_tasks_finished(self, tasks: List[Task]):
+        for task in tasks:
+            self.tasks_dashboard.on_task_finished(task)
+
+    def _on_tasks_failed(self, tasks: List[Task], error: Exception):
+        formatted_stack_trace = traceback.format_exc()
+
+        for task in tasks:
+            self.tasks_dashboard.on_task_failed(task, error, formatted_stack_trace)
+
+    def lease_tasks(self, num_threads: int, is_for_backfill: bool = False):
+        """
+        Consumes tasks planned by a coordinator (possibly running on another host), until interrupted.
+        If "is_for_backfill" is set, the tasks are leased from the plans of backfills (instead of the ones of the continuous flows).
+        """
+        coordination_config = self.worker_config.tasks_coordination
+        if not coordination_config.is_shared():
+            raise UsageError("Leasing tasks requires a shared tasks coordination backend (see 'tasks_coordination' in the worker config).")
+
+        if is_for_backfill:
+            self._use_backfill_tasks_dashboard()
+
+        while True:
+            self._consume_tasks_in_parallel(num_threads=num_threads)
+            self.tasks_history.save_to_file(self.tasks_history_path)
+            time.sleep(coordination_config.poll_interval_in_seconds)
+
+    def resume_or_rewind_to_checkpoint(self):
+        """
+        If the bulk starting at the latest checkpoint was interrupted (after finishing some of its tasks), it will be resumed
+        (partial loads are removed at that moment). Otherwise, rewinds to the latest checkpoint.
+        """
+        indices_config = self.worker_config.append_only_indices
+        initial_start_timestamp = self.worker_state.latest_checkpoint_timestamp or indices_config.time_partition_start
+
+        if self.tasks_dashboard.has_resumable_bulk(indices_config.bq_dataset, initial_start_timestamp):
+            logging.info("The bulk starting at the latest checkpoint has been interrupted. Will resume it (instead of rewinding).")
+            return
+
+        self.rewind_to_checkpoint()
+
+    def deduplicate(self, table: str, start_timestamp: int, end_timestamp: int):
+        """
+        For a table corresponding to an append-only index, removes duplicated records within the given interval.
+        """
+        bq_dataset = self.worker_config.append_only_indices.bq_dataset
+        self.bq_client.deduplicate_in_interval(bq_dataset, table, start_timestamp, end_timestamp)
+        self._invalidate_promoted_data(start_timestamp)
+
     def rewind_to_checkpoint(self):
         """
         From the BQ tables corresponding to append-only indices, deletes records newer than the latest checkpoint.
@@ -206,6 +998,8 @@ class AppController:
         for table in indices:
             self.bq_client.delete_on_or_after_timestamp(bq_dataset, table, checkpoint_timestamp)
 
+        self._invalidate_promoted_data(checkpoint_timestamp)
+
         check_loaded_data(
             bq_client=self.bq_client,
             bq_dataset=bq_dataset,
@@ -220,5 +1014,48 @@ class AppController:
         )
 
 
+def _validate_append_only_indices_config(indices_config: IndicesConfig):
+    if indices_config.num_slices_by_index:
+        # Interrupted bulks are resumed (and verified) by interval, which does not play well with slices.
+        raise UsageError("Slicing tasks ('num_slices_by_index') is only supported for mutable indices.")
+
+
+def _create_tasks_dashboard(
+    worker_config: WorkerConfig,
+    worker_id: str,
+    journals_folder: Path,
+    tasks_history: TasksHistory,
+    is_for_backfill: bool = False
+) -> ITasksDashboard:
+    coordination_config = worker_config.tasks_coordination
+
+    if coordination_config.backend == "local":
+        return TasksDashboard(journals_folder / "backfill" if is_for_backfill else journals_folder, tasks_history)
+
+    if coordination_config.backend == "sqlite":
+        return SharedTasksDashboard(
+            database_path=coordination_config.get_backfill_database_path() if is_for_backfill else coordination_config.database_path,
+            worker_id=worker_id,
+            bq_datasets=_get_bq_datasets_for_shared_tasks_dashboard(worker_config),
+            lease_duration_in_seconds=coordination_config.lease_duration_in_seconds,
+            poll_interval_in_seconds=coordination_config.poll_interval_in_seconds,
+            tasks_history=tasks_history
+        )
+
+    raise UsageError(f"Unknown tasks coordination backend: {coordination_config.backend}")
+
+
+def _get_bq_datasets_for_shared_tasks_dashboard(worker_config: WorkerConfig) -> List[str]:
+    """
+    Plans are kept by BigQuery dataset, thus the flows sharing the database must have distinct datasets.
+    """
+    bq_datasets = [worker_config.append_only_indices.bq_dataset, worker_config.mutable_indices.bq_dataset]
+
+    if len(set(bq_datasets)) < len(bq_datasets):
+        raise UsageError("When tasks are coordinated through a shared database, append-only and mutable indices must be loaded into distinct BigQuery datasets.")
+
+    return bq_datasets
+
+
 def _get_now() -> datetime.datetime:
     return datetime.datetime.now(tz=datetime.timezone.utc)
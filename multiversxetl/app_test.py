@@ -0,0 +1,41 @@
+import subprocess
+import sys
+import time
+from typing import List
+
+HEAVY_MODULES = [
+    "google.cloud.bigquery",
+    "google.cloud.bigquery_datatransfer_v1",
+    "google.cloud.logging",
+    "google.cloud.storage",
+    "elasticsearch",
+]
+
+# Generous, so that slow runners do not fail: at the time of writing, importing the app takes about 70 milliseconds (on top of the interpreter startup),
+# while importing the client libraries (eagerly) would add more than 350 milliseconds. A regression of that magnitude is still caught.
+MAX_IMPORT_OVERHEAD_IN_SECONDS = 1.0
+NUM_IMPORT_TIME_MEASUREMENTS = 5
+
+
+def test_importing_app_does_not_import_client_libraries():
+    script = f"import sys; import multiversxetl.app; print(','.join(module for module in {HEAVY_MODULES!r} if module in sys.modules))"
+    output = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, check=True).stdout.strip()
+    assert output == ""
+
+
+def test_import_time_of_app():
+    # The best of several runs, relative to a bare interpreter startup (thus, noise and the speed of the runner matter less).
+    baseline = _measure_best_duration_of_python_command("pass")
+    duration = _measure_best_duration_of_python_command("import multiversxetl.app")
+    assert duration - baseline < MAX_IMPORT_OVERHEAD_IN_SECONDS
+
+
+def _measure_best_duration_of_python_command(command: str) -> float:
+    durations: List[float] = []
+
+    for _ in range(NUM_IMPORT_TIME_MEASUREMENTS):
+        started_at = time.perf_counter()
+        subprocess.run([sys.executable, "-c", command], check=True)
+        durations.append(time.perf_counter() - started_at)
+
+    return min(durations)
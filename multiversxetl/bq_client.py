@@ -3,15 +3,23 @@ import logging
 import time
 from pathlib import Path
 from threading import Lock
-from typing import Any, List, Optional
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple
 
 import requests
 from google.cloud import bigquery
-from google.cloud.bigquery_datatransfer_v1 import (
-    DataTransferServiceClient, StartManualTransferRunsRequest)
+from google.api_core.exceptions import Forbidden, TooManyRequests
 from google.cloud.exceptions import NotFound
 
+from multiversxetl.client_metrics import ClientMetrics
+from multiversxetl.constants import SECONDS_IN_DAY
+
+if TYPE_CHECKING:
+    from google.cloud.bigquery_datatransfer_v1 import \
+        DataTransferServiceClient
+
 WRITE_DISPOSITION_APPEND = "WRITE_APPEND"
+WRITE_DISPOSITION_TRUNCATE = "WRITE_TRUNCATE"
+PARTITIONING_FIELD = "timestamp"
 
 
 class BqClient:
@@ -24,6 +32,8 @@ class BqClient:
 
         self.client = client
         self.throttler = OneEachSecondsThrottler(num_seconds=3)
+        self.metrics = ClientMetrics()
+        self._data_transfer_client: Optional["DataTransferServiceClient"] = None
 
     def truncate_tables(self, bq_dataset: str, tables: List[str]) -> None:
         for table in tables:
@@ -55,6 +65,65 @@ class BqClient:
         query = f"DELETE FROM `{bq_dataset}.{table}` WHERE timestamp >= TIMESTAMP_SECONDS(@timestamp)"
         self.run_query([bigquery.ScalarQueryParameter("timestamp", "INT64", timestamp)], query)
 
+    def delete_in_interval(self, bq_dataset: str, table: str, start_timestamp: int, end_timestamp: int) -> None:
+        if not self._table_exists(bq_dataset, table):
+            logging.info(f"Table {bq_dataset}.{table} does not exist. Skipping delete.")
+            return
+
+        logging.info(f"Deleting records in {bq_dataset}.{table} between {start_timestamp} and {end_timestamp}...")
+
+        query = f"DELETE FROM `{bq_dataset}.{table}` WHERE timestamp >= TIMESTAMP_SECONDS(@start_timestamp) AND timestamp < TIMESTAMP_SECONDS(@end_timestamp)"
+        self.run_query(_create_query_parameters_for_interval(start_timestamp, end_timestamp), query)
+
+    def deduplicate_in_interval(self, bq_dataset: str, table: str, start_timestamp: int, end_timestamp: int) -> None:
+        """
+        Rewrites the records in the interval, keeping a single record for each "_id". Records outside the interval are not touched.
+        """
+        if not self._table_exists(bq_dataset, table):
+            logging.info(f"Table {bq_dataset}.{table} does not exist. Skipping de-duplication.")
+            return
+
+        logging.info(f"De-duplicating records in {bq_dataset}.{table} between {start_timestamp} and {end_timestamp}...")
+
+        query = _create_query_for_deduplicate_in_interval(bq_dataset, table)
+        self.run_query(_create_query_parameters_for_interval(start_timestamp, end_timestamp), query)
+
+    def promote_interval(self, staging_dataset: str, main_dataset: str, table: str, start_timestamp: int, end_timestamp: int) -> None:
+        """
+        Copies the records of the interval from the staging table to the main table (created, if missing).
+        Records on or after "start_timestamp" are first removed from the main table, thus the promotion can be retried.
+        """
+        if not self._table_exists(staging_dataset, table):
+            logging.info(f"Table {staging_dataset}.{table} does not exist. Skipping promotion.")
+            return
+
+        logging.info(f"Promoting records of {staging_dataset}.{table} between {start_timestamp} and {end_timestamp} to {main_dataset}.{table}...")
+
+        query = _create_query_for_promote_interval(staging_dataset, main_dataset, table)
+        self.run_query(_create_query_parameters_for_interval(start_timestamp, end_timestamp), query)
+
+    def update_daily_aggregate(
+        self,
+        bq_dataset: str,
+        table: str,
+        aggregates_dataset: str,
+        aggregate_name: str,
+        measures: str,
+        dimensions: List[str],
+        where: str,
+        start_timestamp: int,
+        end_timestamp: int
+    ) -> None:
+        """
+        Recomputes the rows of a daily aggregate table (created, if missing), for the days touched by the interval [start_timestamp, end_timestamp).
+        """
+        start_of_first_day, end_of_last_day = get_whole_days_interval(start_timestamp, end_timestamp)
+
+        logging.info(f"Updating daily aggregate {aggregates_dataset}.{aggregate_name}, between {start_of_first_day} and {end_of_last_day}...")
+
+        query = _create_query_for_update_daily_aggregate(bq_dataset, table, aggregates_dataset, aggregate_name, measures, dimensions, where)
+        self.run_query(_create_query_parameters_for_interval(start_of_first_day, end_of_last_day), query)
+
     def run_query(
         self,
         query_parameters: List[bigquery.ScalarQueryParameter],
@@ -77,32 +146,87 @@ class BqClient:
             table_name: str,
             schema_path: Path,
             data_path: Path,
+            partition: Optional[str] = None
+    ):
+        """
+        If "partition" is provided (e.g. "20240131"), the daily partition is overwritten (the table must be partitioned by day, on "timestamp").
+        Otherwise, the data is appended to the table.
+        """
+        def start_job(destination: str, job_config: bigquery.LoadJobConfig) -> Any:
+            with open(data_path, "rb") as data_file:
+                return self.client.load_table_from_file(data_file, destination, job_config=job_config)
+
+        self._load(bq_dataset, table_name, schema_path, partition, start_job)
+
+    def load_data_from_uri(
+            self,
+            bq_dataset: str,
+            table_name: str,
+            schema_path: Path,
+            source_uri: str,
+            partition: Optional[str] = None
+    ):
+        """
+        Same as "load_data()", but the data is loaded from GCS. The source URI can contain a wildcard (e.g. "gs://bucket/prefix/*").
+        """
+        def start_job(destination: str, job_config: bigquery.LoadJobConfig) -> Any:
+            return self.client.load_table_from_uri(source_uri, destination, job_config=job_config)
+
+        self._load(bq_dataset, table_name, schema_path, partition, start_job)
+
+    def _load(
+            self,
+            bq_dataset: str,
+            table_name: str,
+            schema_path: Path,
+            partition: Optional[str],
+            start_job: Callable[[str, bigquery.LoadJobConfig], Any]
     ):
         self.throttler.wait_if_necessary()
 
         table_id = f"{bq_dataset}.{table_name}"
-        logging.debug(f"Loading data into {table_id}...")
+        destination = f"{table_id}${partition}" if partition else table_id
+        logging.debug(f"Loading data into {destination}...")
 
         schema = self.client.schema_from_json(schema_path)
 
         job_config = bigquery.LoadJobConfig(
             schema=schema,
             source_format=bigquery.SourceFormat.NEWLINE_DELIMITED_JSON,
-            write_disposition=WRITE_DISPOSITION_APPEND
+            write_disposition=WRITE_DISPOSITION_TRUNCATE if partition else WRITE_DISPOSITION_APPEND
         )
 
-        with open(data_path, "rb") as data_file:
-            job = self.client.load_table_from_file(data_file, table_id, job_config=job_config)
+        if partition:
+            # Applied if the table is created by the load job.
+            job_config.time_partitioning = bigquery.TimePartitioning(type_=bigquery.TimePartitioningType.DAY, field=PARTITIONING_FIELD)
+
+        started_at = time.perf_counter()
+
+        try:
+            job = start_job(destination, job_config)
+
+            # Waits for the job to complete.
+            job.result()
+        except (Forbidden, TooManyRequests):
+            # E.g. quota exceeded, rate limits exceeded.
+            self.metrics.on_throttled()
+            raise
+        except Exception:
+            self.metrics.on_error()
+            raise
 
-        # Waits for the job to complete.
-        job.result()
+        # The duration of the load job (including its upload, if any), which grows when BigQuery is contended.
+        self.metrics.on_request(time.perf_counter() - started_at)
 
         table: Any = self.client.get_table(table_id)
         logging.debug(f"Loaded {table.num_rows} rows and {len(table.schema)} columns to {table_id}")
 
     def trigger_data_transfer(self, transfer_config_name: str):
         # https://cloud.google.com/bigquery/docs/working-with-transfers
-        client = DataTransferServiceClient()
+        from google.cloud.bigquery_datatransfer_v1 import \
+            StartManualTransferRunsRequest
+
+        client = self._get_data_transfer_client()
         now = datetime.datetime.now(datetime.timezone.utc)
 
         request = StartManualTransferRunsRequest(
@@ -115,6 +239,15 @@ class BqClient:
         for run in response.runs:
             logging.info(f"Started manual transfer: time = {run.run_time}, name = {run.name}")
 
+    def _get_data_transfer_client(self) -> "DataTransferServiceClient":
+        # Created once, then reused. The (heavy) module is only imported by the flows which trigger data transfers.
+        if self._data_transfer_client is None:
+            from google.cloud.bigquery_datatransfer_v1 import \
+                DataTransferServiceClient
+
+            self._data_transfer_client = DataTransferServiceClient()
+        return self._data_transfer_client
+
     def get_num_records(self, bq_dataset: str, table_name: str) -> int:
         table_id = f"{bq_dataset}.{table_name}"
         table: Any = self.client.get_table(table_id)
@@ -129,6 +262,18 @@ class BqClient:
         records = self.run_query(query_parameters, query)
         return records[0].count
 
+    def get_num_records_by_hour(self, bq_dataset: str, table: str, start_timestamp: int, end_timestamp: int) -> Dict[int, int]:
+        """
+        Counts the records in the interval, by hour. The keys are the starts of the hours (timestamps); hours without records are omitted.
+        """
+        if not self._table_exists(bq_dataset, table):
+            return {}
+
+        query = _create_query_for_get_num_records_by_hour(bq_dataset, table)
+        query_parameters = _create_query_parameters_for_interval(start_timestamp, end_timestamp)
+        records = self.run_query(query_parameters, query)
+        return {record.hour: record.count for record in records}
+
 
 def _create_query_for_get_num_records_in_interval(dataset: str, table: str):
     return f"""
@@ -138,6 +283,97 @@ def _create_query_for_get_num_records_in_interval(dataset: str, table: str):
     """
 
 
+def _create_query_for_get_num_records_by_hour(dataset: str, table: str):
+    return f"""
+    SELECT UNIX_SECONDS(TIMESTAMP_TRUNC(`timestamp`, HOUR)) AS `hour`, COUNT(*) AS `count`
+    FROM `{dataset}.{table}`
+    WHERE `timestamp` >= TIMESTAMP_SECONDS(@start_timestamp) AND `timestamp` < TIMESTAMP_SECONDS(@end_timestamp)
+    GROUP BY `hour`
+    """
+
+
+def _create_query_for_deduplicate_in_interval(dataset: str, table: str):
+    return f"""
+    BEGIN TRANSACTION;
+
+    CREATE TEMP TABLE `deduplicated` AS
+    SELECT * FROM `{dataset}.{table}`
+    WHERE `timestamp` >= TIMESTAMP_SECONDS(@start_timestamp) AND `timestamp` < TIMESTAMP_SECONDS(@end_timestamp)
+    QUALIFY ROW_NUMBER() OVER (PARTITION BY `_id`) = 1;
+
+    DELETE FROM `{dataset}.{table}`
+    WHERE `timestamp` >= TIMESTAMP_SECONDS(@start_timestamp) AND `timestamp` < TIMESTAMP_SECONDS(@end_timestamp);
+
+    INSERT INTO `{dataset}.{table}`
+    SELECT * FROM `deduplicated`;
+
+    COMMIT TRANSACTION;
+    """
+
+
+def _create_query_for_promote_interval(staging_dataset: str, main_dataset: str, table: str):
+    return f"""
+    CREATE TABLE IF NOT EXISTS `{main_dataset}.{table}` LIKE `{staging_dataset}.{table}`;
+
+    BEGIN TRANSACTION;
+
+    DELETE FROM `{main_dataset}.{table}`
+    WHERE `timestamp` >= TIMESTAMP_SECONDS(@start_timestamp);
+
+    INSERT INTO `{main_dataset}.{table}`
+    SELECT * FROM `{staging_dataset}.{table}`
+    WHERE `timestamp` >= TIMESTAMP_SECONDS(@start_timestamp) AND `timestamp` < TIMESTAMP_SECONDS(@end_timestamp);
+
+    COMMIT TRANSACTION;
+    """
+
+
+def _create_query_for_update_daily_aggregate(
+    dataset: str,
+    table: str,
+    aggregates_dataset: str,
+    aggregate_name: str,
+    measures: str,
+    dimensions: List[str],
+    where: str
+):
+    dimensions_columns = "".join(f", `{dimension}`" for dimension in dimensions)
+    where_condition = f"AND ({where})" if where else ""
+
+    select_query = f"""
+    SELECT DATE(`timestamp`) AS `day`{dimensions_columns}, {measures}
+    FROM `{dataset}.{table}`
+    WHERE `timestamp` >= TIMESTAMP_SECONDS(@start_timestamp) AND `timestamp` < TIMESTAMP_SECONDS(@end_timestamp) {where_condition}
+    GROUP BY `day`{dimensions_columns}
+    """
+
+    return f"""
+    CREATE TABLE IF NOT EXISTS `{aggregates_dataset}.{aggregate_name}` PARTITION BY `day` AS
+    {select_query}
+    LIMIT 0;
+
+    BEGIN TRANSACTION;
+
+    DELETE FROM `{aggregates_dataset}.{aggregate_name}`
+    WHERE `day` >= DATE(TIMESTAMP_SECONDS(@start_timestamp)) AND `day` < DATE(TIMESTAMP_SECONDS(@end_timestamp));
+
+    INSERT INTO `{aggregates_dataset}.{aggregate_name}`
+    {select_query};
+
+    COMMIT TRANSACTION;
+    """
+
+
+def get_whole_days_interval(start_timestamp: int, end_timestamp: int) -> Tuple[int, int]:
+    """
+    Extends the interval [start_timestamp, end_timestamp) to whole days (UTC): from the start of its first day, to the end of its last day.
+    """
+    start_of_first_day = start_timestamp // SECONDS_IN_DAY * SECONDS_IN_DAY
+    # Ceiling division.
+    end_of_last_day = -(-end_timestamp // SECONDS_IN_DAY) * SECONDS_IN_DAY
+    return start_of_first_day, end_of_last_day
+
+
 def _create_query_parameters_for_interval(start_timestamp: int, end_timestamp: int):
     return [
         bigquery.ScalarQueryParameter("start_timestamp", "INT64", start_timestamp),
@@ -3,7 +3,10 @@ from pathlib import Path
 
 import pytest
 
-from multiversxetl.bq_client import BqClient
+from multiversxetl.bq_client import (BqClient,
+                                     _create_query_for_update_daily_aggregate,
+                                     get_whole_days_interval)
+from multiversxetl.constants import SECONDS_IN_DAY
 
 testdata = Path(__file__).parent / "testdata"
 
@@ -21,3 +24,33 @@ def test_delete_on_or_after_timestamp():
     client.delete_on_or_after_timestamp("tests", "bq_client_test", timestamp)
     num_records = client.get_num_records_in_interval("tests", "bq_client_test", timestamp, timestamp_infinity)
     assert num_records == 0
+
+
+def test_get_whole_days_interval():
+    day = 1704067200
+    assert day % SECONDS_IN_DAY == 0
+
+    # Already aligned.
+    assert get_whole_days_interval(day, day + SECONDS_IN_DAY) == (day, day + SECONDS_IN_DAY)
+    # Within a day.
+    assert get_whole_days_interval(day + 1, day + 2) == (day, day + SECONDS_IN_DAY)
+    # Across days.
+    assert get_whole_days_interval(day + 1, day + SECONDS_IN_DAY + 1) == (day, day + 2 * SECONDS_IN_DAY)
+    assert get_whole_days_interval(day - 1, day + SECONDS_IN_DAY) == (day - SECONDS_IN_DAY, day + SECONDS_IN_DAY)
+
+
+def test_create_query_for_update_daily_aggregate():
+    query = _create_query_for_update_daily_aggregate("mainnet", "operations", "mainnet_aggregates", "interactions_by_day", "COUNT(*) AS `num_interactions`", ["receiver"], "`isScCall` = true")
+
+    assert "CREATE TABLE IF NOT EXISTS `mainnet_aggregates.interactions_by_day` PARTITION BY `day`" in query
+    assert "DELETE FROM `mainnet_aggregates.interactions_by_day`" in query
+    assert "SELECT DATE(`timestamp`) AS `day`, `receiver`, COUNT(*) AS `num_interactions`" in query
+    assert "FROM `mainnet.operations`" in query
+    assert "AND (`isScCall` = true)" in query
+    assert "GROUP BY `day`, `receiver`" in query
+
+    query = _create_query_for_update_daily_aggregate("mainnet", "operations", "mainnet_aggregates", "transactions_by_day", "COUNT(*) AS `num_transactions`", [], "")
+
+    assert "SELECT DATE(`timestamp`) AS `day`, COUNT(*) AS `num_transactions`" in query
+    assert "AND (" not in query
+    assert "GROUP BY `day`\n" in query
@@ -1,21 +1,26 @@
 import datetime
 import logging
-from typing import Any, List, Optional, Protocol
-
-from google.cloud import bigquery
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Protocol, Tuple
 
+from multiversxetl.constants import SECONDS_IN_ONE_HOUR
 from multiversxetl.errors import CountsMismatchError
 from multiversxetl.worker_config import CountChecksErrata
 
+if TYPE_CHECKING:
+    from google.cloud import bigquery
+
 
 class IIndexer(Protocol):
-    def count_records(self, index_name: str, start_timestamp: int, end_timestamp: int) -> int: ...
+    def count_records(self, index_name: str, start_timestamp: int, end_timestamp: int, point_in_time_id: Optional[str] = None) -> int: ...
+    def count_records_by_hour(self, index_name: str, start_timestamp: int, end_timestamp: int, point_in_time_id: Optional[str] = None) -> Dict[int, int]: ...
 
 
 class IBqClient(Protocol):
-    def run_query(self, query_parameters: List[bigquery.ScalarQueryParameter], query: str, into_table: Optional[str] = None) -> List[Any]: ...
+    def run_query(self, query_parameters: List["bigquery.ScalarQueryParameter"], query: str, into_table: Optional[str] = None) -> List[Any]: ...
     def get_num_records(self, bq_dataset: str, table_name: str) -> int: ...
     def get_num_records_in_interval(self, bq_dataset: str, table: str, start_timestamp: int, end_timestamp: int) -> int: ...
+    def deduplicate_in_interval(self, bq_dataset: str, table: str, start_timestamp: int, end_timestamp: int) -> None: ...
+    def get_num_records_by_hour(self, bq_dataset: str, table: str, start_timestamp: int, end_timestamp: int) -> Dict[int, int]: ...
 
 
 def check_loaded_data(
@@ -28,8 +33,16 @@ def check_loaded_data(
     use_global_counts_for_bq: bool,
     should_fail_on_counts_mismatch: bool,
     skip_counts_check_for_indices: List[str],
-    counts_checks_errata: CountChecksErrata
+    counts_checks_errata: CountChecksErrata,
+    point_in_time_ids: Optional[Dict[str, str]] = None,
+    deduplication_start_timestamp: Optional[int] = None
 ):
+    """
+    If provided, "point_in_time_ids" (by index) are used for counting the records in the indexer.
+
+    If "deduplication_start_timestamp" is provided, duplicated data (negative delta) is removed from the interval [deduplication_start_timestamp, end_timestamp),
+    then the table is checked again.
+    """
     for table in tables:
         if table in skip_counts_check_for_indices:
             continue
@@ -43,7 +56,9 @@ def check_loaded_data(
             end_timestamp,
             use_global_counts_for_bq,
             should_fail_on_counts_mismatch,
-            counts_checks_errata
+            counts_checks_errata,
+            (point_in_time_ids or {}).get(table),
+            deduplication_start_timestamp
         )
 
 
@@ -56,13 +71,15 @@ def _do_check_loaded_data_for_table(
         end_timestamp: int,
         use_global_counts_for_bq: bool,
         should_fail_on_counts_mismatch: bool,
-        counts_checks_errata: CountChecksErrata
+        counts_checks_errata: CountChecksErrata,
+        point_in_time_id: Optional[str],
+        deduplication_start_timestamp: Optional[int]
 ):
     start_datetime = datetime.datetime.fromtimestamp(start_timestamp, tz=datetime.timezone.utc)
     end_datetime = datetime.datetime.fromtimestamp(end_timestamp, tz=datetime.timezone.utc)
     logging.info(f"Checking table = {table}, start = {start_timestamp} ({start_datetime}), end = {end_timestamp} ({end_datetime})")
 
-    count_in_indexer = indexer.count_records(table, start_timestamp, end_timestamp)
+    count_in_indexer = indexer.count_records(table, start_timestamp, end_timestamp, point_in_time_id)
 
     if use_global_counts_for_bq:
         count_in_bq = bq_client.get_num_records(bq_dataset, table)
@@ -79,15 +96,71 @@ def _do_check_loaded_data_for_table(
     if not should_fail_on_counts_mismatch:
         return
 
+    # Errata are known (permanent) differences, thus they are irrelevant for detecting duplicates (which only depends on the raw counts).
+    has_duplicates = counts_delta < 0
     erratum = counts_checks_errata.get_erratum(table)
     if erratum:
         counts_delta += erratum
         logging.warning(f"Applied counts erratum for table '{table}': {erratum}. New delta = {counts_delta}.")
 
     if counts_delta > 0:
-        raise CountsMismatchError(f"Data is missing in BigQuery for table '{table}'. Delta = {counts_delta}.")
+        raise CountsMismatchError(f"Data is missing in BigQuery for table '{table}'. Delta = {counts_delta}.", table)
+
+    if counts_delta < 0 and has_duplicates and deduplication_start_timestamp is not None:
+        # De-duplication is scoped to the given interval (e.g. the latest bulk), so that its cost is bounded.
+        logging.warning(f"Will de-duplicate '{table}', start = {deduplication_start_timestamp}, end = {end_timestamp}.")
+        bq_client.deduplicate_in_interval(bq_dataset, table, deduplication_start_timestamp, end_timestamp)
+
+        _do_check_loaded_data_for_table(
+            bq_client,
+            bq_dataset,
+            indexer,
+            table,
+            start_timestamp,
+            end_timestamp,
+            use_global_counts_for_bq,
+            should_fail_on_counts_mismatch,
+            counts_checks_errata,
+            point_in_time_id,
+            deduplication_start_timestamp=None
+        )
+
+        return
 
     if counts_delta < 0:
-        # We do not automatically perform de-duplication, because the operation is quite expensive.
+        # Unless configured otherwise, we do not automatically perform de-duplication.
         # Instead, we stop the flow. At restart, duplicated records would be removed (due to the rewind step).
-        raise CountsMismatchError(f"Counts do not match, there may be duplicated data in BigQuery, table '{table}': indexer = {count_in_indexer}, bq = {count_in_bq}, delta = {counts_delta}.")
+        raise CountsMismatchError(f"Counts do not match, there may be duplicated data in BigQuery, table '{table}': indexer = {count_in_indexer}, bq = {count_in_bq}, delta = {counts_delta}.", table)
+
+
+def find_mismatched_intervals(
+    bq_client: IBqClient,
+    bq_dataset: str,
+    indexer: IIndexer,
+    table: str,
+    start_timestamp: int,
+    end_timestamp: int,
+    point_in_time_id: Optional[str] = None
+) -> List[Tuple[int, int]]:
+    """
+    Drills down a counts mismatch: compares the counts by hour (indexer vs. BigQuery), within the interval.
+    Returns the sub-intervals whose counts differ (adjacent hours are merged, the first and the last hour are clipped to the interval).
+    """
+    counts_in_indexer = indexer.count_records_by_hour(table, start_timestamp, end_timestamp, point_in_time_id)
+    counts_in_bq = bq_client.get_num_records_by_hour(bq_dataset, table, start_timestamp, end_timestamp)
+
+    mismatched_hours = sorted(hour for hour in counts_in_indexer.keys() | counts_in_bq.keys() if counts_in_indexer.get(hour, 0) != counts_in_bq.get(hour, 0))
+    intervals: List[Tuple[int, int]] = []
+
+    for hour in mismatched_hours:
+        logging.warning(f"Counts do not match for '{table}', hour = {hour}: indexer = {counts_in_indexer.get(hour, 0)}, bq = {counts_in_bq.get(hour, 0)}.")
+
+        start = max(hour, start_timestamp)
+        end = min(hour + SECONDS_IN_ONE_HOUR, end_timestamp)
+
+        if intervals and intervals[-1][1] == start:
+            intervals[-1] = (intervals[-1][0], end)
+        else:
+            intervals.append((start, end))
+
+    return intervals
@@ -0,0 +1,102 @@
+from typing import Any, Dict, List, Optional, Tuple
+
+import pytest
+
+from multiversxetl.checks import check_loaded_data, find_mismatched_intervals
+from multiversxetl.errors import CountsMismatchError
+from multiversxetl.worker_config import CountChecksErrata
+
+HOUR = 3600
+
+
+class IndexerMock:
+    def __init__(self, counts_by_hour: Dict[int, int]) -> None:
+        self.counts_by_hour = counts_by_hour
+
+    def count_records(self, index_name: str, start_timestamp: int, end_timestamp: int, point_in_time_id: Optional[str] = None) -> int:
+        return sum(self.counts_by_hour.values())
+
+    def count_records_by_hour(self, index_name: str, start_timestamp: int, end_timestamp: int, point_in_time_id: Optional[str] = None) -> Dict[int, int]:
+        return self.counts_by_hour
+
+
+class BqClientMock:
+    def __init__(self, counts_by_hour: Dict[int, int]) -> None:
+        self.counts_by_hour = counts_by_hour
+        self.deduplicated_intervals: List[Tuple[int, int]] = []
+
+    def run_query(self, query_parameters: List[Any], query: str, into_table: Optional[str] = None) -> List[Any]:
+        return []
+
+    def get_num_records(self, bq_dataset: str, table_name: str) -> int:
+        return sum(self.counts_by_hour.values())
+
+    def get_num_records_in_interval(self, bq_dataset: str, table: str, start_timestamp: int, end_timestamp: int) -> int:
+        return sum(self.counts_by_hour.values())
+
+    def deduplicate_in_interval(self, bq_dataset: str, table: str, start_timestamp: int, end_timestamp: int) -> None:
+        self.deduplicated_intervals.append((start_timestamp, end_timestamp))
+        self.counts_by_hour = {hour: 10 for hour in self.counts_by_hour}
+
+    def get_num_records_by_hour(self, bq_dataset: str, table: str, start_timestamp: int, end_timestamp: int) -> Dict[int, int]:
+        return self.counts_by_hour
+
+
+def test_find_mismatched_intervals():
+    indexer = IndexerMock({0: 10, HOUR: 10, 2 * HOUR: 10, 3 * HOUR: 10, 5 * HOUR: 1})
+    # Hour #1 misses a record, hour #2 has a duplicate, hour #5 is missing entirely, hour #6 is not in the indexer.
+    bq_client = BqClientMock({0: 10, HOUR: 9, 2 * HOUR: 11, 3 * HOUR: 10, 6 * HOUR: 1})
+
+    intervals = find_mismatched_intervals(bq_client, "dataset", indexer, "operations", 0, 7 * HOUR)
+    assert intervals == [(HOUR, 3 * HOUR), (5 * HOUR, 7 * HOUR)]
+
+    # Sub-intervals are clipped to the interval.
+    intervals = find_mismatched_intervals(bq_client, "dataset", indexer, "operations", HOUR + 100, 6 * HOUR + 100)
+    assert intervals == [(HOUR + 100, 3 * HOUR), (5 * HOUR, 6 * HOUR + 100)]
+
+
+def test_find_mismatched_intervals_when_counts_match():
+    indexer = IndexerMock({0: 10, HOUR: 10})
+    bq_client = BqClientMock({0: 10, HOUR: 10})
+
+    assert find_mismatched_intervals(bq_client, "dataset", indexer, "operations", 0, 2 * HOUR) == []
+
+
+def test_check_loaded_data_deduplicates_on_negative_delta():
+    indexer = IndexerMock({0: 10, HOUR: 10})
+    bq_client = BqClientMock({0: 10, HOUR: 12})
+
+    _check_loaded_data(bq_client, indexer, CountChecksErrata({}))
+    assert bq_client.deduplicated_intervals == [(HOUR, 2 * HOUR)]
+
+
+def test_check_loaded_data_does_not_deduplicate_due_to_errata():
+    indexer = IndexerMock({0: 10, HOUR: 10})
+    bq_client = BqClientMock({0: 10, HOUR: 10})
+
+    # The delta is negative only because of the erratum (the raw counts match).
+    with pytest.raises(CountsMismatchError):
+        _check_loaded_data(bq_client, indexer, CountChecksErrata({"operations": -3}))
+
+    assert bq_client.deduplicated_intervals == []
+
+    # The raw delta is negative, but it's a known difference (erratum).
+    bq_client = BqClientMock({0: 10, HOUR: 13})
+    _check_loaded_data(bq_client, indexer, CountChecksErrata({"operations": 3}))
+    assert bq_client.deduplicated_intervals == []
+
+
+def _check_loaded_data(bq_client: BqClientMock, indexer: IndexerMock, counts_checks_errata: CountChecksErrata):
+    check_loaded_data(
+        bq_client=bq_client,
+        bq_dataset="dataset",
+        indexer=indexer,
+        tables=["operations"],
+        start_timestamp=0,
+        end_timestamp=2 * HOUR,
+        use_global_counts_for_bq=False,
+        should_fail_on_counts_mismatch=True,
+        skip_counts_check_for_indices=[],
+        counts_checks_errata=counts_checks_errata,
+        deduplication_start_timestamp=HOUR
+    )
@@ -0,0 +1,44 @@
+import threading
+from typing import NamedTuple
+
+
+class ClientMetricsSnapshot(NamedTuple):
+    num_requests: int
+    total_latency: float
+    num_throttled: int
+    num_errors: int
+
+
+class ClientMetrics:
+    """
+    Thread-safe counters, reported by a client (e.g. of Elasticsearch, of BigQuery): requests, their latency, throttled requests and errors.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._num_requests = 0
+        self._total_latency = 0.0
+        self._num_throttled = 0
+        self._num_errors = 0
+
+    def on_request(self, latency: float) -> None:
+        with self._lock:
+            self._num_requests += 1
+            self._total_latency += latency
+
+    def on_throttled(self) -> None:
+        with self._lock:
+            self._num_throttled += 1
+
+    def on_error(self) -> None:
+        with self._lock:
+            self._num_errors += 1
+
+    def get_snapshot(self) -> ClientMetricsSnapshot:
+        with self._lock:
+            return ClientMetricsSnapshot(
+                num_requests=self._num_requests,
+                total_latency=self._total_latency,
+                num_throttled=self._num_throttled,
+                num_errors=self._num_errors
+            )
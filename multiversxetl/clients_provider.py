@@ -0,0 +1,77 @@
+import threading
+from typing import TYPE_CHECKING, Dict, Tuple
+
+if TYPE_CHECKING:
+    from multiversxetl.bq_client import BqClient
+    from multiversxetl.indexer import Indexer
+    from multiversxetl.load_staging import GcsStagingStorage
+    from multiversxetl.logger import CloudLogger
+
+
+class ClientsProvider:
+    """
+    Holds long-lived clients, to be reused across iterations (thus, connection pools, TLS sessions and auth tokens are reused, as well).
+
+    Clients are keyed by the configuration they depend on: when the configuration is reloaded, only the clients whose configuration has changed are (re)built.
+
+    The client libraries (BigQuery, Elasticsearch, Cloud Logging, Cloud Storage) are slow to import, thus they are only imported when a client is first requested.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._bq_clients: Dict[str, "BqClient"] = {}
+        self._indexers: Dict[Tuple[str, str, str], "Indexer"] = {}
+        self._cloud_loggers: Dict[Tuple[str, str], "CloudLogger"] = {}
+        self._gcs_staging_storages: Dict[Tuple[str, str], "GcsStagingStorage"] = {}
+
+    def get_bq_client(self, gcp_project_id: str) -> "BqClient":
+        from multiversxetl.bq_client import BqClient
+
+        with self._lock:
+            client = self._bq_clients.get(gcp_project_id)
+            if client is None:
+                client = BqClient(gcp_project_id)
+                self._bq_clients[gcp_project_id] = client
+
+            return client
+
+    def get_indexer(self, url: str, username: str, password: str) -> "Indexer":
+        from multiversxetl.indexer import Indexer
+
+        key = (url, username, password)
+
+        with self._lock:
+            indexer = self._indexers.get(key)
+            if indexer is None:
+                indexer = Indexer(url=url, username=username, password=password)
+                self._indexers[key] = indexer
+
+            return indexer
+
+    def get_cloud_logger(self, gcp_project_id: str, worker_id: str) -> "CloudLogger":
+        from multiversxetl.logger import CloudLogger
+
+        key = (gcp_project_id, worker_id)
+
+        with self._lock:
+            cloud_logger = self._cloud_loggers.get(key)
+            if cloud_logger is None:
+                cloud_logger = CloudLogger(gcp_project_id, worker_id)
+                self._cloud_loggers[key] = cloud_logger
+
+            return cloud_logger
+
+    def get_gcs_staging_storage(self, gcp_project_id: str, bucket_name: str) -> "GcsStagingStorage":
+        from google.cloud import storage  # type: ignore
+
+        from multiversxetl.load_staging import GcsStagingStorage
+
+        key = (gcp_project_id, bucket_name)
+
+        with self._lock:
+            staging_storage = self._gcs_staging_storages.get(key)
+            if staging_storage is None:
+                staging_storage = GcsStagingStorage(storage.Client(project=gcp_project_id), bucket_name)
+                self._gcs_staging_storages[key] = staging_storage
+
+            return staging_storage
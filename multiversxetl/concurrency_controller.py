@@ -0,0 +1,85 @@
+import logging
+import threading
+import time
+from typing import List
+
+from multiversxetl.client_metrics import ClientMetrics, ClientMetricsSnapshot
+
+
+class AimdConcurrencyController:
+    """
+    Adjusts the number of active consumers, following an "additive increase, multiplicative decrease" policy:
+        - if the clients have been throttled (or have encountered errors) since the previous adjustment, or the mean latency of any client is above its threshold, the limit is halved
+        - otherwise (if there has been any activity), the limit is increased by one
+
+    Each client (e.g. Elasticsearch, BigQuery) has its own latency threshold ("latency_thresholds_in_seconds", in the order of "metrics"),
+    since the durations of their requests are not comparable (e.g. a search request vs. a load job).
+    """
+
+    def __init__(
+            self,
+            metrics: List[ClientMetrics],
+            latency_thresholds_in_seconds: List[float],
+            min_limit: int,
+            max_limit: int,
+            adjustment_interval_in_seconds: float
+    ) -> None:
+        assert 0 < min_limit <= max_limit
+        assert len(metrics) == len(latency_thresholds_in_seconds)
+
+        self.metrics = metrics
+        self.latency_thresholds_in_seconds = latency_thresholds_in_seconds
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.adjustment_interval_in_seconds = adjustment_interval_in_seconds
+
+        self._lock = threading.Lock()
+        self._limit = min_limit
+        self._latest_snapshots = self._get_snapshots()
+        self._latest_adjustment_time = time.monotonic()
+
+    def get_limit(self) -> int:
+        """
+        This can be called concurrently (e.g. by all consumers).
+        """
+        with self._lock:
+            now = time.monotonic()
+
+            if now - self._latest_adjustment_time >= self.adjustment_interval_in_seconds:
+                self._adjust()
+                self._latest_adjustment_time = now
+
+            return self._limit
+
+    def _adjust(self) -> None:
+        snapshots = self._get_snapshots()
+        deltas = [_get_delta(snapshot, latest_snapshot) for snapshot, latest_snapshot in zip(snapshots, self._latest_snapshots)]
+        self._latest_snapshots = snapshots
+
+        num_requests = sum(delta.num_requests for delta in deltas)
+        num_throttled = sum(delta.num_throttled for delta in deltas)
+        num_errors = sum(delta.num_errors for delta in deltas)
+        mean_latencies = [delta.total_latency / delta.num_requests if delta.num_requests else 0 for delta in deltas]
+        is_latency_too_high = any(latency > threshold for latency, threshold in zip(mean_latencies, self.latency_thresholds_in_seconds))
+        previous_limit = self._limit
+
+        if num_throttled or num_errors or is_latency_too_high:
+            self._limit = max(self.min_limit, self._limit // 2)
+        elif num_requests:
+            self._limit = min(self.max_limit, self._limit + 1)
+
+        if self._limit != previous_limit:
+            formatted_latencies = ", ".join(f"{latency:.2f}s" for latency in mean_latencies)
+            logging.info(f"Concurrency limit: {previous_limit} -> {self._limit} (requests = {num_requests}, mean latencies = {formatted_latencies}, throttled = {num_throttled}, errors = {num_errors}).")
+
+    def _get_snapshots(self) -> List[ClientMetricsSnapshot]:
+        return [item.get_snapshot() for item in self.metrics]
+
+
+def _get_delta(snapshot: ClientMetricsSnapshot, previous_snapshot: ClientMetricsSnapshot) -> ClientMetricsSnapshot:
+    return ClientMetricsSnapshot(
+        num_requests=snapshot.num_requests - previous_snapshot.num_requests,
+        total_latency=snapshot.total_latency - previous_snapshot.total_latency,
+        num_throttled=snapshot.num_throttled - previous_snapshot.num_throttled,
+        num_errors=snapshot.num_errors - previous_snapshot.num_errors
+    )
@@ -0,0 +1,51 @@
+from multiversxetl.client_metrics import ClientMetrics
+from multiversxetl.concurrency_controller import AimdConcurrencyController
+
+
+def test_additive_increase_multiplicative_decrease():
+    metrics = ClientMetrics()
+    controller = AimdConcurrencyController([metrics], [10], min_limit=1, max_limit=4, adjustment_interval_in_seconds=0)
+    assert controller.get_limit() == 1
+
+    # No activity, no change.
+    assert controller.get_limit() == 1
+
+    for expected_limit in [2, 3, 4, 4]:
+        metrics.on_request(1)
+        assert controller.get_limit() == expected_limit
+
+    metrics.on_throttled()
+    assert controller.get_limit() == 2
+
+    metrics.on_request(20)
+    assert controller.get_limit() == 1
+
+    metrics.on_request(1)
+    metrics.on_error()
+    assert controller.get_limit() == 1
+
+
+def test_latency_thresholds_are_by_client():
+    es_metrics = ClientMetrics()
+    bq_metrics = ClientMetrics()
+    controller = AimdConcurrencyController([es_metrics, bq_metrics], [1, 100], min_limit=1, max_limit=4, adjustment_interval_in_seconds=0)
+
+    # Load jobs are slower than searches, but within their own threshold.
+    es_metrics.on_request(0.5)
+    bq_metrics.on_request(50)
+    assert controller.get_limit() == 2
+    bq_metrics.on_request(50)
+    assert controller.get_limit() == 3
+
+    # BigQuery is contended.
+    bq_metrics.on_request(200)
+    assert controller.get_limit() == 1
+
+    # Elasticsearch is contended (even if BigQuery is not).
+    for expected_limit in [2, 3]:
+        bq_metrics.on_request(50)
+        assert controller.get_limit() == expected_limit
+
+    es_metrics.on_request(2)
+    bq_metrics.on_request(50)
+    assert controller.get_limit() == 1
@@ -5,6 +5,13 @@ SECONDS_IN_DAY = 24 * SECONDS_IN_ONE_HOUR
 SECONDS_IN_THIRTY_DAYS = 30 * SECONDS_IN_DAY
 SECONDS_IN_ONE_YEAR = 365 * SECONDS_IN_DAY
 END_TIME_DELTA = 1 * SECONDS_IN_MINUTE
+# When tailing, if the checkpoint falls behind by more than this number of micro-batches, regular bulks are used for catching up.
+TAIL_MAX_NUM_MICRO_BATCHES_BEHIND = 12
 ELASTICSEARCH_MAX_RETRIES = 10
+# Bounds each request to Elasticsearch (e.g. each page of a scroll), so that a stuck request cannot block a consumer forever.
+ELASTICSEARCH_REQUEST_TIMEOUT_IN_SECONDS = 120
+SCAN_BATCH_SIZE = 7500
+# Points-in-time of a bulk are kept alive (refreshed) at this interval, since (between their usages) tasks of other indices might run for a long time.
+POINT_IN_TIME_REFRESH_INTERVAL_IN_SECONDS = 10 * SECONDS_IN_MINUTE
 # https://elasticsearch-py.readthedocs.io/en/v7.17.1/#thread-safety
 ELASTICSEARCH_CONNECTIONS_PER_NODE = 64
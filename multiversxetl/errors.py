@@ -1,3 +1,8 @@
+from typing import List
+
+from multiversxetl.task import Task
+
+
 class KnownError(Exception):
     def __init__(self, message: str):
         super().__init__(message)
@@ -9,8 +14,29 @@ class SomeTasksFailedError(KnownError):
 
 
 class CountsMismatchError(KnownError):
-    def __init__(self, message: str):
+    def __init__(self, message: str, table: str = ""):
         super().__init__(message)
+        self.table = table
+
+
+class CombinedLoadError(KnownError):
+    def __init__(self, tasks: List[Task], error: Exception):
+        super().__init__(f"Combined load of {len(tasks)} tasks has failed: {error}")
+        self.tasks = tasks
+
+
+class TaskDeadlineExceededError(KnownError):
+    def __init__(self, task: Task, deadline_in_seconds: int):
+        super().__init__(f"Task {task} has exceeded its deadline ({deadline_in_seconds} seconds).")
+
+
+class TaskAttemptCancelledError(KnownError):
+    """
+    Raised within an attempt of a task, when another attempt of the same task (e.g. a speculative duplicate) has finished first.
+    """
+
+    def __init__(self, task: Task):
+        super().__init__(f"Another attempt of {task} has finished first.")
 
 
 class UsageError(KnownError):
@@ -0,0 +1,68 @@
+import heapq
+import itertools
+import tempfile
+from pathlib import Path
+from typing import Any, Callable, List, TextIO
+
+
+def sort_lines(
+        input_path: Path,
+        output_path: Path,
+        key: Callable[[str], Any],
+        max_num_lines_in_memory: int
+) -> None:
+    """
+    Sorts the lines of a file. If the file has more than "max_num_lines_in_memory" lines, an external merge sort is performed:
+    sorted runs are written to temporary files (next to the output file), then merged.
+    """
+    with open(input_path) as input_file:
+        first_run = _read_sorted_run(input_file, key, max_num_lines_in_memory)
+        second_run = _read_sorted_run(input_file, key, max_num_lines_in_memory)
+
+        if not second_run:
+            with open(output_path, "w") as output_file:
+                output_file.writelines(first_run)
+            return
+
+        with tempfile.TemporaryDirectory(dir=output_path.parent) as temporary_folder:
+            run_paths = [
+                _write_run(first_run, temporary_folder),
+                _write_run(second_run, temporary_folder)
+            ]
+
+            del first_run, second_run
+
+            while True:
+                run = _read_sorted_run(input_file, key, max_num_lines_in_memory)
+                if not run:
+                    break
+
+                run_paths.append(_write_run(run, temporary_folder))
+
+            merge_sorted_files(run_paths, output_path, key)
+
+
+def _read_sorted_run(file: TextIO, key: Callable[[str], Any], max_num_lines: int) -> List[str]:
+    lines = list(itertools.islice(file, max_num_lines))
+    lines.sort(key=key)
+    return lines
+
+
+def _write_run(lines: List[str], folder: str) -> Path:
+    with tempfile.NamedTemporaryFile("w", dir=folder, suffix=".run", delete=False) as file:
+        file.writelines(lines)
+        return Path(file.name)
+
+
+def merge_sorted_files(input_paths: List[Path], output_path: Path, key: Callable[[str], Any]) -> None:
+    """
+    Merges files whose lines are already sorted (by "key") into a single sorted file.
+    """
+    input_files = [open(path) for path in input_paths]
+
+    try:
+        with open(output_path, "w") as output_file:
+            output_file.writelines(heapq.merge(*input_files, key=key))
+    finally:
+        for file in input_files:
+            file.close()
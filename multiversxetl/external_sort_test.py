@@ -0,0 +1,27 @@
+import json
+import random
+from pathlib import Path
+
+from multiversxetl.external_sort import sort_lines
+
+
+def test_sort_lines(tmp_path: Path):
+    timestamps = list(range(1000))
+    random.shuffle(timestamps)
+
+    input_path = tmp_path / "input.json"
+    input_path.write_text("".join(f'{json.dumps({"timestamp": timestamp})}\n' for timestamp in timestamps))
+
+    def get_key(line: str) -> int:
+        return json.loads(line)["timestamp"]
+
+    # In memory.
+    sort_lines(input_path, tmp_path / "sorted_in_memory.json", get_key, 1000)
+    # External merge sort.
+    sort_lines(input_path, tmp_path / "sorted_externally.json", get_key, 64)
+
+    for path in [tmp_path / "sorted_in_memory.json", tmp_path / "sorted_externally.json"]:
+        lines = path.read_text().splitlines()
+        assert [get_key(line) for line in lines] == list(range(1000))
+
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["input.json", "sorted_externally.json", "sorted_in_memory.json"]
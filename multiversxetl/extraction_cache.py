@@ -0,0 +1,168 @@
+import gzip
+import logging
+import os
+import re
+import shutil
+import threading
+from pathlib import Path
+from typing import Iterable, List, Optional, Set, Tuple
+
+from multiversxetl.task import Task
+
+GZIP_COMPRESSION_LEVEL = 5
+ENTRY_SUFFIX = ".jsonl.gz"
+# Entries of (unsliced) tasks with an interval, e.g. "1700000000_1700003600.jsonl.gz".
+INTERVAL_ENTRY_PATTERN = re.compile(r"^(\d+)_(\d+)\.jsonl\.gz$")
+# Eviction frees some room below the maximum size, so that it does not run again on each of the subsequent stores.
+EVICTION_TARGET_RATIO = 0.9
+
+
+class ExtractionCache:
+    """
+    Compressed (gzip) cache of extracted records, in the workspace. Entries are addressed by (bq dataset, index, interval, slice),
+    which fully determines the query against the indexer. They are laid out as "{bq dataset}/{index}/{start}_{end}.jsonl.gz",
+    so that the cached intervals of an index can be listed (see "get_cached_intervals").
+
+    Only the tasks of "cached_tables" ("{bq dataset}.{index}") are stored. When the total size of the cache exceeds "max_size_in_bytes",
+    the least recently used entries are evicted.
+
+    The total size is tracked as entries are stored, so that the cache folder is only scanned once, then on eviction (which also accounts
+    for the entries stored or removed by other processes, in the meantime).
+    """
+
+    def __init__(self, folder: Path, max_size_in_bytes: int, cached_tables: Set[str]) -> None:
+        self.folder = folder
+        self.max_size_in_bytes = max_size_in_bytes
+        self.cached_tables = cached_tables
+        self._lock = threading.Lock()
+        self._total_size_in_bytes: Optional[int] = None
+
+        self.folder.mkdir(parents=True, exist_ok=True)
+
+    def store(self, task: Task, extracted_path: Path) -> None:
+        if f"{task.bq_dataset}.{task.index_name}" not in self.cached_tables:
+            return
+
+        entry_path = self._get_entry_path(task)
+        entry_path.parent.mkdir(parents=True, exist_ok=True)
+        temporary_path = entry_path.with_name(f"{entry_path.name}.{threading.get_ident()}.tmp")
+        previous_size = _get_size_or_zero(entry_path)
+
+        with open(extracted_path, "rb") as input_file:
+            with gzip.open(temporary_path, "wb", compresslevel=GZIP_COMPRESSION_LEVEL) as output_file:
+                shutil.copyfileobj(input_file, output_file)
+
+        # Readers never see partially written entries.
+        os.replace(temporary_path, entry_path)
+        self._on_entry_stored(_get_size_or_zero(entry_path) - previous_size)
+
+    def restore(self, task: Task, extracted_path: Path) -> Optional[Tuple[int, int]]:
+        """
+        Decompresses the cached records of the task into "extracted_path". Returns the number of records and the number of bytes,
+        or None, if the task is not cached.
+        """
+        entry_path = self._get_entry_path(task)
+        num_records = 0
+        num_bytes = 0
+
+        try:
+            with gzip.open(entry_path, "rt") as input_file:
+                with open(extracted_path, "w") as output_file:
+                    for line in input_file:
+                        num_bytes += output_file.write(line)
+                        num_records += 1
+        except FileNotFoundError:
+            return None
+
+        try:
+            # Marks the entry as recently used (unless evicted in the meantime, which does not affect the restored records).
+            os.utime(entry_path)
+        except FileNotFoundError:
+            pass
+
+        return num_records, num_bytes
+
+    def get_cached_intervals(self, bq_dataset: str, index_name: str) -> List[Tuple[int, int]]:
+        """
+        Returns the (sorted) intervals of the cached entries of an index (entries of slices are not considered).
+        """
+        folder = self.folder / bq_dataset / index_name
+        if not folder.exists():
+            return []
+
+        matches = [INTERVAL_ENTRY_PATTERN.match(path.name) for path in folder.iterdir()]
+        return sorted((int(match.group(1)), int(match.group(2))) for match in matches if match)
+
+    def _get_entry_path(self, task: Task) -> Path:
+        name = "all" if task.start_timestamp is None else f"{task.start_timestamp}_{task.end_timestamp}"
+        if task.is_sliced():
+            name += f"_slice_{task.slice_id}_of_{task.num_slices}"
+
+        return self.folder / task.bq_dataset / task.index_name / f"{name}{ENTRY_SUFFIX}"
+
+    def _on_entry_stored(self, size_delta: int) -> None:
+        with self._lock:
+            if self._total_size_in_bytes is None:
+                # The first scan already accounts for the stored entry.
+                self._total_size_in_bytes = sum(size for _, size, _ in self._scan_entries())
+            else:
+                self._total_size_in_bytes += size_delta
+
+            if self._total_size_in_bytes > self.max_size_in_bytes:
+                self._evict()
+
+    def _evict(self) -> None:
+        entries = self._scan_entries()
+        total_size = sum(size for _, size, _ in entries)
+        target_size = int(self.max_size_in_bytes * EVICTION_TARGET_RATIO)
+
+        for _, size, path in sorted(entries):
+            if total_size <= target_size:
+                break
+
+            logging.debug(f"Evicting {path} from the extraction cache.")
+            path.unlink(missing_ok=True)
+            total_size -= size
+
+        self._total_size_in_bytes = total_size
+
+    def _scan_entries(self) -> List[Tuple[float, int, Path]]:
+        entries: List[Tuple[float, int, Path]] = []
+
+        for path in self.folder.rglob(f"*{ENTRY_SUFFIX}"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        return entries
+
+
+def _get_size_or_zero(path: Path) -> int:
+    try:
+        return path.stat().st_size
+    except FileNotFoundError:
+        return 0
+
+
+def get_interval_boundaries(cached_intervals: Iterable[Tuple[int, int]], start_timestamp: int, end_timestamp: int, interval_size_in_seconds: int) -> List[int]:
+    """
+    Returns the boundaries for planning the interval [start_timestamp, end_timestamp) so that the tasks match the cached intervals (those within the interval).
+    The gaps between the cached intervals are split in intervals of (at most) "interval_size_in_seconds".
+    """
+    cached_intervals = sorted((start, end) for start, end in cached_intervals if start_timestamp <= start and end <= end_timestamp)
+    boundaries: Set[int] = set()
+    position = start_timestamp
+
+    for start, end in [*cached_intervals, (end_timestamp, end_timestamp)]:
+        # The gap (if any) before the cached interval.
+        while position + interval_size_in_seconds < start:
+            position += interval_size_in_seconds
+            boundaries.add(position)
+
+        boundaries.update([start, end])
+        position = max(position, end)
+
+    return sorted(boundaries)
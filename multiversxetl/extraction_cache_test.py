@@ -0,0 +1,141 @@
+import os
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+from multiversxetl.extraction_cache import (ExtractionCache,
+                                            get_interval_boundaries)
+from multiversxetl.task import Task
+
+
+def test_store_and_restore(tmp_path: Path):
+    cache = ExtractionCache(tmp_path / "cache", 1024 ** 2, {"dataset.blocks"})
+    task = Task("dataset", "blocks", 0, 100)
+
+    extracted_path = tmp_path / "extracted.json"
+    extracted_path.write_text('{"_id": "a"}\n{"_id": "b"}\n')
+
+    assert cache.restore(task, tmp_path / "restored.json") is None
+    assert cache.restore(Task("dataset", "blocks", 0, 200), tmp_path / "restored.json") is None
+
+    cache.store(task, extracted_path)
+    assert cache.restore(task, tmp_path / "restored.json") == (2, 26)
+    assert (tmp_path / "restored.json").read_text() == extracted_path.read_text()
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path: Path):
+    extracted_path = tmp_path / "extracted.json"
+    extracted_path.write_text(os.urandom(1000).hex())
+
+    cache = ExtractionCache(tmp_path / "cache", 1024 ** 2, {"dataset.blocks"})
+    first, second, third = [Task("dataset", "blocks", start, start + 100) for start in [0, 100, 200]]
+
+    cache.store(first, extracted_path)
+    cache.store(second, extracted_path)
+
+    # Room for two entries (only).
+    entry_size = cache._get_entry_path(first).stat().st_size
+    cache.max_size_in_bytes = int(2.5 * entry_size)
+    os.utime(cache._get_entry_path(first), (0, 0))
+    os.utime(cache._get_entry_path(second), (1, 1))
+
+    # The first entry is used again, thus the second one is the least recently used.
+    assert cache.restore(first, tmp_path / "restored.json")
+
+    cache.store(third, extracted_path)
+    assert cache.restore(first, tmp_path / "restored.json")
+    assert cache.restore(second, tmp_path / "restored.json") is None
+    assert cache.restore(third, tmp_path / "restored.json")
+
+
+def test_cache_folder_is_scanned_only_when_necessary(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    extracted_path = tmp_path / "extracted.json"
+    extracted_path.write_text(os.urandom(1000).hex())
+
+    cache = ExtractionCache(tmp_path / "cache", 1024 ** 2, {"dataset.blocks"})
+    scan_entries = cache._scan_entries
+    num_scans = 0
+
+    def scan_entries_and_count() -> Any:
+        nonlocal num_scans
+        num_scans += 1
+        return scan_entries()
+
+    monkeypatch.setattr(cache, "_scan_entries", scan_entries_and_count)
+
+    tasks = [Task("dataset", "blocks", start, start + 100) for start in range(0, 1000, 100)]
+    for task in tasks:
+        cache.store(task, extracted_path)
+
+    # Once, in order to initialize the total size.
+    assert num_scans == 1
+
+    # Replacing an entry does not change the total size.
+    cache.store(tasks[0], extracted_path)
+    assert num_scans == 1
+
+    entry_size = cache._get_entry_path(tasks[0]).stat().st_size
+    cache.max_size_in_bytes = 10 * entry_size + entry_size // 2
+    cache.store(Task("dataset", "blocks", 1000, 1100), extracted_path)
+    assert num_scans == 2
+    # Room is freed below the maximum size.
+    assert cache._total_size_in_bytes is not None and cache._total_size_in_bytes <= 0.9 * cache.max_size_in_bytes
+
+
+def test_only_cached_tables_are_stored(tmp_path: Path):
+    cache = ExtractionCache(tmp_path / "cache", 1024 ** 2, {"dataset.blocks"})
+    task = Task("dataset", "accounts", 0, 100)
+
+    extracted_path = tmp_path / "extracted.json"
+    extracted_path.write_text('{"_id": "a"}\n')
+
+    cache.store(task, extracted_path)
+    assert cache.restore(task, tmp_path / "restored.json") is None
+
+
+def test_restore_when_entry_is_evicted_concurrently(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    cache = ExtractionCache(tmp_path / "cache", 1024 ** 2, {"dataset.blocks"})
+    task = Task("dataset", "blocks", 0, 100)
+
+    extracted_path = tmp_path / "extracted.json"
+    extracted_path.write_text('{"_id": "a"}\n')
+    cache.store(task, extracted_path)
+
+    # The entry is evicted (by another thread) right after being read.
+    original_utime = os.utime
+
+    def evict_then_utime(path: Path, *args: Any) -> None:
+        Path(path).unlink()
+        original_utime(path, *args)
+
+    monkeypatch.setattr(os, "utime", evict_then_utime)
+    assert cache.restore(task, tmp_path / "restored.json") == (1, 13)
+
+    # The entry is not recreated (as an empty one).
+    monkeypatch.undo()
+    assert not cache._get_entry_path(task).exists()
+    assert cache.restore(task, tmp_path / "restored.json") is None
+
+
+def test_get_cached_intervals(tmp_path: Path):
+    cache = ExtractionCache(tmp_path / "cache", 1024 ** 2, {"dataset.blocks"})
+    extracted_path = tmp_path / "extracted.json"
+    extracted_path.write_text('{"_id": "a"}\n')
+
+    sliced_task = Task("dataset", "blocks", 0, 100)
+    sliced_task.slice_id = 0
+    sliced_task.num_slices = 2
+
+    for task in [Task("dataset", "blocks", 300, 400), Task("dataset", "blocks", 17, 300), sliced_task]:
+        cache.store(task, extracted_path)
+
+    assert cache.get_cached_intervals("dataset", "blocks") == [(17, 300), (300, 400)]
+    assert cache.get_cached_intervals("dataset", "rounds") == []
+
+
+def test_get_interval_boundaries():
+    # Cached intervals outside of the interval are ignored; the gaps are split in intervals of (at most) 100 seconds.
+    cached_intervals = [(17, 90), (90, 150), (400, 450), (950, 1050)]
+    assert get_interval_boundaries(cached_intervals, 0, 1000, 100) == [17, 90, 150, 250, 350, 400, 450, 550, 650, 750, 850, 950, 1000]
+    assert get_interval_boundaries([], 0, 250, 100) == [100, 200, 250]
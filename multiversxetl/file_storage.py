@@ -5,9 +5,11 @@ class FileStorage:
     def __init__(self, base_folder: Path) -> None:
         self.extracted_folder = base_folder / "extracted"
         self.transformed_folder = base_folder / "transformed"
+        self.journals_folder = base_folder / "journals"
 
         self.extracted_folder.mkdir(parents=True, exist_ok=True)
         self.transformed_folder.mkdir(parents=True, exist_ok=True)
+        self.journals_folder.mkdir(parents=True, exist_ok=True)
 
     def get_extracted_path(self, task_pretty_name: str) -> Path:
         return self.extracted_folder / f"{task_pretty_name}_extracted.json"
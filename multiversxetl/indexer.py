@@ -1,39 +1,134 @@
-from typing import Any, Dict, Iterable, Optional
+import itertools
+import logging
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Type
 
 import elasticsearch.helpers
-from elasticsearch import Elasticsearch
+from elastic_transport import Urllib3HttpNode
+from elasticsearch import Elasticsearch, NotFoundError
 
+from multiversxetl.client_metrics import ClientMetrics
 from multiversxetl.constants import (ELASTICSEARCH_CONNECTIONS_PER_NODE,
-                                     ELASTICSEARCH_MAX_RETRIES)
+                                     ELASTICSEARCH_MAX_RETRIES,
+                                     ELASTICSEARCH_REQUEST_TIMEOUT_IN_SECONDS,
+                                     SCAN_BATCH_SIZE)
 
 SCROLL_CONSISTENCY_TIME = "10m"
-SCAN_BATCH_SIZE = 7500
+# A point-in-time is shared by all tasks of a bulk (and by the final counts check), thus it should outlive the gaps between its usages.
+# Additionally, it's refreshed periodically, during the bulk (see "refresh_point_in_time").
+POINT_IN_TIME_KEEP_ALIVE = "1h"
+# Responses with these statuses are retried by the client (they signal that the cluster is overloaded).
+THROTTLING_STATUSES = (429, 502, 503, 504)
 
 
 class Indexer:
+    """
+    Elasticsearch might return a new identifier of a point-in-time with any search response. Callers keep using the identifier returned
+    at opening, while the indexer resolves it to the latest one (for searching, refreshing and closing the point-in-time).
+    """
+
     def __init__(self, url: str, username: str = "", password: str = ""):
         basic_auth = (username, password) if username and password else None
 
+        self._lock = threading.Lock()
+        # Latest identifiers of the open points-in-time, by the identifiers returned at opening.
+        self._latest_point_in_time_ids: Dict[str, str] = {}
+
+        self.metrics = ClientMetrics()
         self.elastic_search_client = Elasticsearch(
             url,
             max_retries=ELASTICSEARCH_MAX_RETRIES,
+            request_timeout=ELASTICSEARCH_REQUEST_TIMEOUT_IN_SECONDS,
             retry_on_timeout=True,
             connections_per_node=ELASTICSEARCH_CONNECTIONS_PER_NODE,
-            basic_auth=basic_auth
+            basic_auth=basic_auth,
+            node_class=_create_metered_node_class(self.metrics)
         )
 
-    def count_records(self, index_name: str, start_timestamp: int, end_timestamp: int) -> int:
+    def open_point_in_time(self, index_name: str) -> str:
+        response = self.elastic_search_client.open_point_in_time(index=index_name, keep_alive=POINT_IN_TIME_KEEP_ALIVE)
+        return response["id"]
+
+    def close_point_in_time(self, point_in_time_id: str) -> None:
+        with self._lock:
+            latest_point_in_time_id = self._latest_point_in_time_ids.pop(point_in_time_id, point_in_time_id)
+
+        self.elastic_search_client.close_point_in_time(id=latest_point_in_time_id)
+
+    def refresh_point_in_time(self, point_in_time_id: str) -> None:
+        """
+        Extends the keep-alive of the point-in-time (by means of an empty search).
+        """
+        self._search_in_point_in_time(point_in_time_id, size=0, track_total_hits=False)
+
+    def _search_in_point_in_time(self, point_in_time_id: str, **kwargs: Any) -> Any:
+        with self._lock:
+            latest_point_in_time_id = self._latest_point_in_time_ids.get(point_in_time_id, point_in_time_id)
+
+        response = self.elastic_search_client.search(pit=self._get_point_in_time_object(latest_point_in_time_id), **kwargs)
+        new_point_in_time_id = response.get("pit_id")
+
+        if new_point_in_time_id and new_point_in_time_id != latest_point_in_time_id:
+            with self._lock:
+                self._latest_point_in_time_ids[point_in_time_id] = new_point_in_time_id
+
+        return response
+
+    def count_records(self, index_name: str, start_timestamp: int, end_timestamp: int, point_in_time_id: Optional[str] = None) -> int:
+        query = self._get_query_object(start_timestamp, end_timestamp)
+
+        if point_in_time_id is None:
+            return self.elastic_search_client.count(index=index_name, query=query["query"])["count"]
+
+        response = self._search_for_count(index_name, point_in_time_id, query=query["query"], size=0, track_total_hits=True)
+        return response["hits"]["total"]["value"]
+
+    def count_records_by_hour(self, index_name: str, start_timestamp: int, end_timestamp: int, point_in_time_id: Optional[str] = None) -> Dict[int, int]:
+        """
+        Counts the records in the interval, by hour. The keys are the starts of the hours (timestamps); hours without records are omitted.
+        """
         query = self._get_query_object(start_timestamp, end_timestamp)
-        return self.elastic_search_client.count(index=index_name, query=query["query"])["count"]
+        aggregations = {
+            "by_hour": {
+                "date_histogram": {
+                    "field": "timestamp",
+                    "fixed_interval": "1h"
+                }
+            }
+        }
+
+        response = self._search_for_count(index_name, point_in_time_id, query=query["query"], size=0, aggregations=aggregations, track_total_hits=False)
+        buckets: List[Dict[str, Any]] = response["aggregations"]["by_hour"]["buckets"]
+        # Keys of the buckets are in milliseconds.
+        return {bucket["key"] // 1000: bucket["doc_count"] for bucket in buckets if bucket["doc_count"]}
+
+    def _search_for_count(self, index_name: str, point_in_time_id: Optional[str], **kwargs: Any) -> Any:
+        """
+        Searches within the point-in-time, if provided. If the point-in-time has expired in the meantime (e.g. a long bulk), the index itself is searched.
+        For append-only indices, counts within closed intervals are the same, anyway.
+        """
+        if point_in_time_id is not None:
+            try:
+                return self._search_in_point_in_time(point_in_time_id, **kwargs)
+            except NotFoundError as error:
+                logging.warning(f"Point-in-time of index {index_name} not found (expired?): {error}. Will count on the index itself.")
+
+        return self.elastic_search_client.search(index=index_name, **kwargs)
 
     def get_records(
             self,
             index_name: str,
             start_timestamp: Optional[int] = None,
-            end_timestamp: Optional[int] = None
+            end_timestamp: Optional[int] = None,
+            slice_id: Optional[int] = None,
+            num_slices: Optional[int] = None
     ) -> Iterable[Dict[str, Any]]:
         query = self._get_query_object(start_timestamp, end_timestamp)
 
+        if slice_id is not None and num_slices is not None:
+            query["slice"] = self._get_slice_object(slice_id, num_slices)
+
         records = elasticsearch.helpers.scan(
             client=self.elastic_search_client,
             index=index_name,
@@ -42,13 +137,89 @@ class Indexer:
             raise_on_error=True,
             preserve_order=False,
             size=SCAN_BATCH_SIZE,
-            request_timeout=None,
+            request_timeout=ELASTICSEARCH_REQUEST_TIMEOUT_IN_SECONDS,
             scroll_kwargs=None,
             clear_scroll=True
         )
 
         return records
 
+    def get_records_batches(
+            self,
+            index_name: str,
+            start_timestamp: Optional[int] = None,
+            end_timestamp: Optional[int] = None,
+            point_in_time_id: Optional[str] = None,
+            slice_id: Optional[int] = None,
+            num_slices: Optional[int] = None
+    ) -> Iterable[List[Dict[str, Any]]]:
+        """
+        Yields the records in batches (of SCAN_BATCH_SIZE records, same as the size of the pages).
+        If a point-in-time is provided, the records are paginated using "search_after" (instead of scrolling).
+        If a slice is provided, only the records of that slice are fetched (sliced scroll or sliced point-in-time search).
+        """
+        if point_in_time_id is not None:
+            yield from self._get_records_batches_in_point_in_time(point_in_time_id, start_timestamp, end_timestamp, slice_id, num_slices)
+            return
+
+        records = iter(self.get_records(index_name, start_timestamp, end_timestamp, slice_id, num_slices))
+
+        while True:
+            batch = list(itertools.islice(records, SCAN_BATCH_SIZE))
+            if not batch:
+                break
+
+            yield batch
+
+    def _get_records_batches_in_point_in_time(
+            self,
+            point_in_time_id: str,
+            start_timestamp: Optional[int],
+            end_timestamp: Optional[int],
+            slice_id: Optional[int],
+            num_slices: Optional[int]
+    ) -> Iterable[List[Dict[str, Any]]]:
+        query = self._get_query_object(start_timestamp, end_timestamp)
+        search_after: Optional[List[Any]] = None
+        slice_object = self._get_slice_object(slice_id, num_slices) if slice_id is not None and num_slices is not None else None
+
+        while True:
+            response = self._search_in_point_in_time(
+                point_in_time_id,
+                query=query["query"],
+                size=SCAN_BATCH_SIZE,
+                # "_shard_doc" is the most efficient sort order, when paginating within a point-in-time.
+                sort=["_shard_doc"],
+                search_after=search_after,
+                slice=slice_object,
+                track_total_hits=False
+            )
+
+            hits: List[Dict[str, Any]] = response["hits"]["hits"]
+            if not hits:
+                break
+
+            yield hits
+
+            if len(hits) < SCAN_BATCH_SIZE:
+                break
+
+            search_after = hits[-1]["sort"]
+
+    @staticmethod
+    def _get_point_in_time_object(point_in_time_id: str) -> Dict[str, Any]:
+        return {
+            "id": point_in_time_id,
+            "keep_alive": POINT_IN_TIME_KEEP_ALIVE
+        }
+
+    @staticmethod
+    def _get_slice_object(slice_id: int, num_slices: int) -> Dict[str, Any]:
+        return {
+            "id": slice_id,
+            "max": num_slices
+        }
+
     @staticmethod
     def _get_query_object(start_timestamp: Optional[int], end_timestamp: Optional[int]) -> Dict[str, Any]:
         if start_timestamp is None and end_timestamp is None:
@@ -68,3 +239,27 @@ class Indexer:
                 }
             }
         }
+
+
+def _create_metered_node_class(metrics: ClientMetrics) -> Type[Urllib3HttpNode]:
+    """
+    Each attempt of a request (including the ones retried by the client) is reported to the metrics.
+    """
+    class MeteredHttpNode(Urllib3HttpNode):
+        def perform_request(self, *args: Any, **kwargs: Any) -> Any:
+            started_at = time.perf_counter()
+
+            try:
+                response = super().perform_request(*args, **kwargs)
+            except Exception:
+                metrics.on_error()
+                raise
+
+            metrics.on_request(time.perf_counter() - started_at)
+
+            if response.meta.status in THROTTLING_STATUSES:
+                metrics.on_throttled()
+
+            return response
+
+    return MeteredHttpNode
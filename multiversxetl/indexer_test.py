@@ -1,8 +1,10 @@
 
 import datetime
-from typing import Tuple
+from typing import Any, Dict, List, Tuple
 
 import pytest
+from elastic_transport import ApiResponseMeta, HttpHeaders, NodeConfig
+from elasticsearch import NotFoundError
 
 from multiversxetl.indexer import Indexer
 
@@ -39,6 +41,104 @@ def test_get_records():
     assert any(records)
 
 
+@pytest.mark.integration
+def test_get_records_batches_in_point_in_time():
+    indexer = Indexer("https://devnet-index.multiversx.com")
+    start_timestamp, end_timestamp = _make_recent_time_slice(60 * 60)
+    point_in_time_id = indexer.open_point_in_time("operations")
+
+    try:
+        count = indexer.count_records("operations", start_timestamp, end_timestamp, point_in_time_id)
+        batches = indexer.get_records_batches("operations", start_timestamp, end_timestamp, point_in_time_id)
+        assert sum(len(batch) for batch in batches) == count
+    finally:
+        indexer.close_point_in_time(point_in_time_id)
+
+
+def test_count_records_when_point_in_time_has_expired():
+    indexer = Indexer("http://localhost:9200")
+    client = ElasticsearchClientWithExpiredPointsInTime()
+    indexer.elastic_search_client = client  # type: ignore
+
+    # Counts fallback to the index itself.
+    assert indexer.count_records("operations", 0, 3600, "expired") == 42
+    assert indexer.count_records_by_hour("operations", 0, 7200, "expired") == {0: 40, 3600: 2}
+    assert [search.get("pit", {}).get("id") or search["index"] for search in client.searches] == ["expired", "operations", "expired", "operations"]
+
+
+def test_latest_point_in_time_id_is_used():
+    indexer = Indexer("http://localhost:9200")
+    client = ElasticsearchClientWithChangingPointsInTime()
+    indexer.elastic_search_client = client  # type: ignore
+
+    # The identifier returned at opening is "pit-0".
+    indexer.refresh_point_in_time("pit-0")
+    indexer.refresh_point_in_time("pit-0")
+    assert indexer.count_records("operations", 0, 3600, "pit-0") == 42
+    indexer.close_point_in_time("pit-0")
+
+    assert [search["pit"]["id"] for search in client.searches] == ["pit-0", "pit-1", "pit-2"]
+    assert client.closed_ids == ["pit-3"]
+
+
+class ElasticsearchClientWithChangingPointsInTime:
+    def __init__(self) -> None:
+        self.searches: List[Dict[str, Any]] = []
+        self.closed_ids: List[str] = []
+
+    def search(self, **kwargs: Any) -> Dict[str, Any]:
+        self.searches.append(kwargs)
+        return {"pit_id": f"pit-{len(self.searches)}", "hits": {"total": {"value": 42}}}
+
+    def close_point_in_time(self, id: str) -> None:
+        self.closed_ids.append(id)
+
+
+class ElasticsearchClientWithExpiredPointsInTime:
+    def __init__(self) -> None:
+        self.searches: List[Dict[str, Any]] = []
+
+    def search(self, **kwargs: Any) -> Dict[str, Any]:
+        self.searches.append(kwargs)
+
+        if "pit" in kwargs:
+            meta = ApiResponseMeta(404, "1.1", HttpHeaders(), 0, NodeConfig("http", "localhost", 9200))
+            raise NotFoundError("search_context_missing_exception", meta, {})
+
+        return {
+            "hits": {"total": {"value": 42}},
+            "aggregations": {"by_hour": {"buckets": [{"key": 0, "doc_count": 40}, {"key": 3600_000, "doc_count": 2}]}}
+        }
+
+
+@pytest.mark.integration
+def test_get_records_batches_in_slices():
+    indexer = Indexer("https://devnet-index.multiversx.com")
+    start_timestamp, end_timestamp = _make_recent_time_slice(60 * 60)
+    num_slices = 3
+
+    count = indexer.count_records("operations", start_timestamp, end_timestamp)
+    count_in_slices = 0
+
+    for slice_id in range(num_slices):
+        batches = indexer.get_records_batches("operations", start_timestamp, end_timestamp, slice_id=slice_id, num_slices=num_slices)
+        count_in_slices += sum(len(batch) for batch in batches)
+
+    assert count_in_slices == count
+
+
+@pytest.mark.integration
+def test_count_records_by_hour():
+    indexer = Indexer("https://devnet-index.multiversx.com")
+    start_timestamp, end_timestamp = _make_recent_time_slice(6 * 60 * 60)
+
+    count = indexer.count_records("operations", start_timestamp, end_timestamp)
+    counts_by_hour = indexer.count_records_by_hour("operations", start_timestamp, end_timestamp)
+
+    assert sum(counts_by_hour.values()) == count
+    assert all(hour % 3600 == 0 for hour in counts_by_hour)
+
+
 def _make_recent_time_slice(duration_in_seconds: int) -> Tuple[int, int]:
     now = datetime.datetime.now(tz=datetime.timezone.utc)
     now_timestamp = int(now.timestamp())
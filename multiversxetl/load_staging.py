@@ -0,0 +1,143 @@
+import logging
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, List, Protocol
+
+MAX_NUM_UPLOAD_ATTEMPTS = 3
+# Size of the chunks of the (resumable) uploads to GCS: on a network hiccup, only the current chunk is sent again.
+GCS_UPLOAD_CHUNK_SIZE = 16 * 1024 * 1024
+
+
+class IStagingStorage(Protocol):
+    def upload_file(self, local_path: Path, object_name: str) -> None: ...
+    def delete_objects(self, prefix: str) -> None: ...
+    def get_uri(self, object_name: str) -> str: ...
+
+
+class GcsStagingStorage:
+    """
+    The client ("google.cloud.storage.Client") is provided by "ClientsProvider", thus it's reused across iterations.
+    """
+
+    def __init__(self, client: Any, bucket_name: str) -> None:
+        self.client = client
+        self.bucket = self.client.bucket(bucket_name)
+        self.bucket_name = bucket_name
+
+    def upload_file(self, local_path: Path, object_name: str) -> None:
+        blob = self.bucket.blob(object_name, chunk_size=GCS_UPLOAD_CHUNK_SIZE)
+        blob.upload_from_filename(str(local_path))
+
+    def delete_objects(self, prefix: str) -> None:
+        for blob in self.client.list_blobs(self.bucket_name, prefix=prefix):
+            blob.delete()
+
+    def get_uri(self, object_name: str) -> str:
+        return f"gs://{self.bucket_name}/{object_name}"
+
+
+class LocalStagingStorage:
+    """
+    Stand-in for a bucket, backed by a local folder (e.g. for tests).
+    """
+
+    def __init__(self, folder: Path) -> None:
+        self.folder = folder
+        self.folder.mkdir(parents=True, exist_ok=True)
+
+    def upload_file(self, local_path: Path, object_name: str) -> None:
+        destination = self.folder / object_name
+        destination.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(local_path, destination)
+
+    def delete_objects(self, prefix: str) -> None:
+        for path in self.folder.rglob("*"):
+            if path.is_file() and str(path.relative_to(self.folder)).startswith(prefix):
+                path.unlink()
+
+    def get_uri(self, object_name: str) -> str:
+        return str(self.folder / object_name)
+
+
+class LoadStager:
+    """
+    Stages (large) files for loading into BigQuery: each file is split into shards (at line boundaries, since the data is newline-delimited JSON),
+    which are uploaded in parallel. A failed upload is retried for the affected shard only.
+    """
+
+    def __init__(
+            self,
+            storage: IStagingStorage,
+            min_num_bytes: int,
+            shard_size_in_bytes: int,
+            num_parallel_uploads: int
+    ) -> None:
+        self.storage = storage
+        self.min_num_bytes = min_num_bytes
+        self.shard_size_in_bytes = shard_size_in_bytes
+        self.num_parallel_uploads = num_parallel_uploads
+
+    def should_stage(self, data_path: Path) -> bool:
+        return data_path.stat().st_size >= self.min_num_bytes
+
+    def stage(self, data_path: Path, prefix: str) -> str:
+        """
+        Uploads the shards of the file under "prefix". Returns the wildcard URI of the shards (to be used as the source of a load job).
+        """
+        # Shards left by a previous (interrupted) attempt must not be loaded.
+        self.storage.delete_objects(f"{prefix}/")
+
+        with tempfile.TemporaryDirectory(dir=data_path.parent) as temporary_folder:
+            shard_paths = _split_into_shards(data_path, Path(temporary_folder), self.shard_size_in_bytes)
+            logging.debug(f"Uploading {len(shard_paths)} shards of {data_path} to {prefix}...")
+
+            with ThreadPoolExecutor(max_workers=self.num_parallel_uploads) as executor:
+                futures = [executor.submit(self._upload_shard, path, f"{prefix}/{path.name}") for path in shard_paths]
+
+                for future in futures:
+                    future.result()
+
+        return self.storage.get_uri(f"{prefix}/*")
+
+    def unstage(self, prefix: str) -> None:
+        self.storage.delete_objects(f"{prefix}/")
+
+    def _upload_shard(self, path: Path, object_name: str) -> None:
+        for attempt in range(1, MAX_NUM_UPLOAD_ATTEMPTS + 1):
+            try:
+                self.storage.upload_file(path, object_name)
+                return
+            except Exception as error:
+                if attempt == MAX_NUM_UPLOAD_ATTEMPTS:
+                    raise
+
+                logging.warning(f"Upload of {object_name} has failed (attempt {attempt}): {error}. Retrying...")
+                time.sleep(attempt)
+
+
+def _split_into_shards(data_path: Path, folder: Path, shard_size_in_bytes: int) -> List[Path]:
+    shard_paths: List[Path] = []
+    shard_file = None
+    shard_size = 0
+
+    try:
+        with open(data_path, "rb") as input_file:
+            for line in input_file:
+                if shard_file is None or shard_size >= shard_size_in_bytes:
+                    if shard_file is not None:
+                        shard_file.close()
+
+                    shard_path = folder / f"shard_{len(shard_paths):05}.jsonl"
+                    shard_paths.append(shard_path)
+                    shard_file = open(shard_path, "wb")
+                    shard_size = 0
+
+                shard_size += shard_file.write(line)
+    finally:
+        if shard_file is not None:
+            shard_file.close()
+
+    return shard_paths
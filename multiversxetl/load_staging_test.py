@@ -0,0 +1,77 @@
+from pathlib import Path
+
+import pytest
+
+from multiversxetl.load_staging import LoadStager, LocalStagingStorage
+
+
+class FlakyStagingStorage(LocalStagingStorage):
+    def __init__(self, folder: Path, num_failures: int) -> None:
+        super().__init__(folder)
+        self.num_failures = num_failures
+        self.num_attempts = 0
+
+    def upload_file(self, local_path: Path, object_name: str) -> None:
+        self.num_attempts += 1
+
+        if self.num_failures > 0:
+            self.num_failures -= 1
+            raise ConnectionError("network hiccup")
+
+        super().upload_file(local_path, object_name)
+
+
+def test_stage_splits_file_at_line_boundaries(tmp_path: Path):
+    lines = [f'{{"_id": "{i}", "value": "{"x" * (i % 50)}"}}\n' for i in range(1000)]
+    data_path = tmp_path / "data.json"
+    data_path.write_text("".join(lines))
+
+    storage = LocalStagingStorage(tmp_path / "bucket")
+    stager = LoadStager(storage, min_num_bytes=0, shard_size_in_bytes=2000, num_parallel_uploads=4)
+    uri = stager.stage(data_path, "dataset/task")
+
+    assert uri == str(tmp_path / "bucket" / "dataset" / "task" / "*")
+
+    shards = sorted((tmp_path / "bucket" / "dataset" / "task").iterdir())
+    assert len(shards) > 1
+    assert "".join(shard.read_text() for shard in shards) == "".join(lines)
+
+    # Shard files are not left in the local folder.
+    assert list(tmp_path.glob("tmp*")) == []
+
+    stager.unstage("dataset/task")
+    assert list((tmp_path / "bucket" / "dataset" / "task").iterdir()) == []
+
+
+def test_stage_removes_shards_of_previous_attempts(tmp_path: Path):
+    storage = LocalStagingStorage(tmp_path / "bucket")
+    stager = LoadStager(storage, min_num_bytes=0, shard_size_in_bytes=10, num_parallel_uploads=2)
+
+    data_path = tmp_path / "data.json"
+    data_path.write_text("".join(f"{i:020}\n" for i in range(10)))
+    stager.stage(data_path, "dataset/task")
+
+    data_path.write_text("".join(f"{i:020}\n" for i in range(3)))
+    stager.stage(data_path, "dataset/task")
+
+    assert len(list((tmp_path / "bucket" / "dataset" / "task").iterdir())) == 3
+
+
+def test_stage_retries_failed_uploads(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr("multiversxetl.load_staging.time.sleep", lambda _: None)
+
+    data_path = tmp_path / "data.json"
+    data_path.write_text("".join(f"{i:020}\n" for i in range(4)))
+
+    storage = FlakyStagingStorage(tmp_path / "bucket", num_failures=2)
+    stager = LoadStager(storage, min_num_bytes=0, shard_size_in_bytes=10, num_parallel_uploads=1)
+    stager.stage(data_path, "dataset/task")
+
+    assert storage.num_attempts == 6
+    assert len(list((tmp_path / "bucket" / "dataset" / "task").iterdir())) == 4
+
+    storage = FlakyStagingStorage(tmp_path / "bucket", num_failures=10)
+    stager = LoadStager(storage, min_num_bytes=0, shard_size_in_bytes=10, num_parallel_uploads=1)
+
+    with pytest.raises(ConnectionError):
+        stager.stage(data_path, "dataset/task")
@@ -0,0 +1,133 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from multiversxetl.constants import SECONDS_IN_THIRTY_DAYS
+from multiversxetl.task import Task
+
+DIGEST_MODULUS = 2 ** 256
+# Entries ending before (the latest entry of the table) minus this retention are pruned. Older intervals are rarely reloaded.
+RETENTION_IN_SECONDS = SECONDS_IN_THIRTY_DAYS
+
+
+class ContentDigest:
+    """
+    Order-independent digest of a stream of records: the sum of their SHA-256 hashes, modulo 2^256.
+    Records are extracted in arbitrary order, thus the digest should not depend on it.
+    """
+
+    def __init__(self) -> None:
+        self._value = 0
+
+    def add(self, record_json: str) -> None:
+        record_hash = hashlib.sha256(record_json.encode()).digest()
+        self._value = (self._value + int.from_bytes(record_hash, "big")) % DIGEST_MODULUS
+
+    def hexdigest(self) -> str:
+        return f"{self._value:064x}"
+
+
+class LoadedIntervalsRegistry:
+    """
+    Records (as JSON lines, in the workspace) each loaded (table, interval), along with its number of records and the digest of its content.
+
+    The file is append-only while in use. On load, it's compacted: only the latest entry of each interval is kept, and old intervals are pruned (see "RETENTION_IN_SECONDS").
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries: Dict[Tuple[str, int, int], Dict[str, Any]] = {}
+
+        if path.exists():
+            self._load()
+
+    def _load(self) -> None:
+        num_lines = 0
+
+        for line in self.path.read_text().splitlines():
+            num_lines += 1
+
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                # The latest line might be incomplete (e.g. the process was killed while writing it).
+                continue
+
+            self._entries[(entry["table"], entry["start"], entry["end"])] = entry
+
+        self._prune()
+
+        if len(self._entries) < num_lines:
+            self._compact(num_lines)
+
+    def _prune(self) -> None:
+        latest_end_by_table: Dict[str, int] = {}
+
+        for table, _, end_timestamp in self._entries:
+            latest_end_by_table[table] = max(end_timestamp, latest_end_by_table.get(table, end_timestamp))
+
+        for key in list(self._entries):
+            table, _, end_timestamp = key
+
+            if end_timestamp < latest_end_by_table[table] - RETENTION_IN_SECONDS:
+                del self._entries[key]
+
+    def _compact(self, num_lines: int) -> None:
+        # Rewritten atomically. Note: entries appended by another process in the meantime (if any) are lost; loads of their intervals simply won't be skipped.
+        temporary_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        temporary_path.write_text("".join(_format_entry(entry) for entry in self._entries.values()))
+        os.replace(temporary_path, self.path)
+
+        logging.debug(f"Compacted {self.path}: {num_lines} lines, {len(self._entries)} entries kept.")
+
+    def record(self, task: Task) -> None:
+        key = _get_key(task)
+        if key is None or task.content_digest is None:
+            return
+
+        table, start_timestamp, end_timestamp = key
+        entry = {
+            "table": table,
+            "start": start_timestamp,
+            "end": end_timestamp,
+            "records": task.num_records,
+            "digest": task.content_digest
+        }
+
+        with self._lock:
+            self._entries[key] = entry
+
+            with open(self.path, "a") as file:
+                file.write(_format_entry(entry))
+
+    def has_same_content(self, task: Task) -> bool:
+        """
+        Whether the (extracted and transformed) content of the task is the same as the one previously loaded for its interval.
+        """
+        key = _get_key(task)
+        if key is None or task.content_digest is None:
+            return False
+
+        with self._lock:
+            entry: Optional[Dict[str, Any]] = self._entries.get(key)
+
+        if entry is None:
+            return False
+
+        return entry["records"] == task.num_records and entry["digest"] == task.content_digest
+
+
+def _format_entry(entry: Dict[str, Any]) -> str:
+    return json.dumps(entry, separators=(",", ":")) + "\n"
+
+
+def _get_key(task: Task) -> Optional[Tuple[str, int, int]]:
+    # Intervals are tracked as a whole, thus slices of intervals are not tracked.
+    if task.start_timestamp is None or task.end_timestamp is None or task.is_sliced():
+        return None
+    return (f"{task.bq_dataset}.{task.index_name}", task.start_timestamp, task.end_timestamp)
@@ -0,0 +1,73 @@
+from pathlib import Path
+
+from multiversxetl.loaded_intervals import (RETENTION_IN_SECONDS,
+                                            ContentDigest,
+                                            LoadedIntervalsRegistry)
+from multiversxetl.task import Task
+
+
+def test_content_digest_is_order_independent():
+    first = ContentDigest()
+    first.add('{"_id": "a"}')
+    first.add('{"_id": "b"}')
+
+    second = ContentDigest()
+    second.add('{"_id": "b"}')
+    second.add('{"_id": "a"}')
+
+    third = ContentDigest()
+    third.add('{"_id": "a"}')
+
+    assert first.hexdigest() == second.hexdigest()
+    assert first.hexdigest() != third.hexdigest()
+
+
+def test_has_same_content(tmp_path: Path):
+    registry = LoadedIntervalsRegistry(tmp_path / "loaded_intervals.jsonl")
+    task = _make_task(num_records=2, content_digest="abba")
+    assert not registry.has_same_content(task)
+
+    registry.record(task)
+    assert registry.has_same_content(task)
+
+    # Reload from file.
+    registry = LoadedIntervalsRegistry(tmp_path / "loaded_intervals.jsonl")
+    assert registry.has_same_content(_make_task(num_records=2, content_digest="abba"))
+    assert not registry.has_same_content(_make_task(num_records=3, content_digest="abba"))
+    assert not registry.has_same_content(_make_task(num_records=2, content_digest="beef"))
+
+
+def test_compaction_on_load(tmp_path: Path):
+    path = tmp_path / "loaded_intervals.jsonl"
+    registry = LoadedIntervalsRegistry(path)
+
+    registry.record(_make_task(num_records=2, content_digest="abba"))
+    registry.record(_make_task(num_records=3, content_digest="beef"))
+    registry.record(_make_task(num_records=4, content_digest="cafe", start_timestamp=RETENTION_IN_SECONDS - 50))
+    assert len(path.read_text().splitlines()) == 3
+
+    # Only the latest entry of an interval is kept.
+    registry = LoadedIntervalsRegistry(path)
+    assert len(path.read_text().splitlines()) == 2
+    assert registry.has_same_content(_make_task(num_records=3, content_digest="beef"))
+    assert not registry.has_same_content(_make_task(num_records=2, content_digest="abba"))
+
+    # Intervals older than the retention (with respect to the latest interval of the table) are pruned.
+    registry.record(_make_task(num_records=5, content_digest="f00d", start_timestamp=RETENTION_IN_SECONDS + 200))
+    registry = LoadedIntervalsRegistry(path)
+    assert len(path.read_text().splitlines()) == 2
+    assert not registry.has_same_content(_make_task(num_records=3, content_digest="beef"))
+    assert registry.has_same_content(_make_task(num_records=4, content_digest="cafe", start_timestamp=RETENTION_IN_SECONDS - 50))
+
+    # Nothing to compact, thus the file is not rewritten.
+    modified_on = path.stat().st_mtime_ns
+    LoadedIntervalsRegistry(path)
+    assert path.stat().st_mtime_ns == modified_on
+    assert [item.name for item in tmp_path.iterdir()] == ["loaded_intervals.jsonl"]
+
+
+def _make_task(num_records: int, content_digest: str, start_timestamp: int = 0) -> Task:
+    task = Task("dataset", "blocks", start_timestamp, start_timestamp + 100)
+    task.num_records = num_records
+    task.content_digest = content_digest
+    return task
@@ -0,0 +1,99 @@
+import collections
+import contextlib
+import logging
+import sys
+import threading
+from pathlib import Path
+from types import FrameType
+from typing import Counter, Dict, Iterator, List, Optional
+
+from multiversxetl.task import Task
+
+DEFAULT_SAMPLING_INTERVAL_IN_SECONDS = 0.01
+
+
+class SamplingProfiler:
+    """
+    Periodically samples the stacks of the threads which are running tasks (see "stage()"), aggregating the samples by index and stage.
+
+    The output is in the "folded stacks" format (one line per distinct stack, the frames separated by ";", followed by the number of samples),
+    which can be rendered as a flame graph (e.g. using "flamegraph.pl" or "speedscope").
+    """
+
+    def __init__(self, interval_in_seconds: float = DEFAULT_SAMPLING_INTERVAL_IN_SECONDS) -> None:
+        self.interval_in_seconds = interval_in_seconds
+
+        self._lock = threading.Lock()
+        self._stages_by_thread: Dict[int, str] = {}
+        self._counts: Counter[str] = collections.Counter()
+        self._stop_event = threading.Event()
+        self._sampler: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._sampler is not None:
+            return
+
+        self._stop_event.clear()
+        self._sampler = threading.Thread(name="profiler", target=self._sample_until_stopped, daemon=True)
+        self._sampler.start()
+
+    def stop(self) -> None:
+        if self._sampler is None:
+            return
+
+        self._stop_event.set()
+        self._sampler.join()
+        self._sampler = None
+
+    @contextlib.contextmanager
+    def stage(self, task: Task, stage_name: str) -> Iterator[None]:
+        """
+        While in this context, the samples of the current thread are attributed to the index of the task, and to the given stage.
+        """
+        thread_id = threading.get_ident()
+
+        with self._lock:
+            previous = self._stages_by_thread.get(thread_id)
+            self._stages_by_thread[thread_id] = f"{task.index_name};{stage_name}"
+
+        try:
+            yield
+        finally:
+            with self._lock:
+                if previous is None:
+                    self._stages_by_thread.pop(thread_id, None)
+                else:
+                    self._stages_by_thread[thread_id] = previous
+
+    def _sample_until_stopped(self) -> None:
+        while not self._stop_event.wait(self.interval_in_seconds):
+            self._sample()
+
+    def _sample(self) -> None:
+        frames = sys._current_frames()
+
+        with self._lock:
+            for thread_id, prefix in self._stages_by_thread.items():
+                frame = frames.get(thread_id)
+                if frame is not None:
+                    self._counts[f"{prefix};{_fold_stack(frame)}"] += 1
+
+    def save_folded_stacks(self, path: Path) -> None:
+        with self._lock:
+            lines = [f"{stack} {count}\n" for stack, count in self._counts.most_common()]
+            num_samples = sum(self._counts.values())
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text("".join(lines))
+        logging.info(f"Saved profile ({num_samples} samples) to {path}.")
+
+
+def _fold_stack(frame: Optional[FrameType]) -> str:
+    names: List[str] = []
+
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{Path(code.co_filename).stem}:{code.co_name}")
+        frame = frame.f_back
+
+    return ";".join(reversed(names))
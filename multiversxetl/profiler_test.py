@@ -0,0 +1,31 @@
+import time
+from pathlib import Path
+
+from multiversxetl.profiler import SamplingProfiler
+from multiversxetl.task import Task
+
+
+def test_samples_are_aggregated_by_index_and_stage(tmp_path: Path):
+    profiler = SamplingProfiler(interval_in_seconds=0.001)
+    profiler.start()
+
+    with profiler.stage(Task("dataset", "blocks", 0, 100), "transform"):
+        _spin(0.2)
+
+    # Outside of a stage, no samples are taken.
+    _spin(0.1)
+    profiler.stop()
+
+    path = tmp_path / "profiles" / "profile.folded"
+    profiler.save_folded_stacks(path)
+
+    lines = path.read_text().splitlines()
+    assert lines
+    assert all(line.startswith("blocks;transform;") for line in lines)
+    assert any("profiler_test:_spin" in line for line in lines)
+
+
+def _spin(duration_in_seconds: float):
+    deadline = time.perf_counter() + duration_in_seconds
+    while time.perf_counter() < deadline:
+        pass
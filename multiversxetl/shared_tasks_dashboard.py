@@ -0,0 +1,424 @@
+import datetime
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set
+
+from multiversxetl.task import Task, TaskStatus
+from multiversxetl.tasks_dashboard import TasksDashboard
+from multiversxetl.tasks_history import TasksHistory
+
+# Should be incremented on each change of the schema. The tasks table only holds the plans in progress, thus, on upgrade, it's simply recreated.
+SCHEMA_VERSION = 2
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    key TEXT PRIMARY KEY,
+    bq_dataset TEXT NOT NULL,
+    index_name TEXT NOT NULL,
+    start_timestamp INTEGER,
+    end_timestamp INTEGER,
+    point_in_time_id TEXT,
+    should_replace_existing_data INTEGER NOT NULL DEFAULT 0,
+    bq_partition TEXT,
+    slice_id INTEGER,
+    num_slices INTEGER,
+    position INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    worker TEXT,
+    lease_expires_on REAL,
+    started_on REAL,
+    finished_on REAL,
+    error TEXT,
+    error_stack_trace TEXT
+)
+"""
+
+TASK_COLUMNS = "key, bq_dataset, index_name, start_timestamp, end_timestamp, status, worker, started_on, finished_on, error, error_stack_trace, point_in_time_id, should_replace_existing_data, bq_partition, slice_id, num_slices"
+
+
+class SharedTasksDashboard:
+    """
+    A tasks dashboard backed by a SQLite database, which can be placed on a volume shared by several hosts.
+
+    A coordinator plans the bulk (and waits for it to complete), while all workers (the coordinator included) lease tasks from the plan.
+    Leases are renewed in the background while the tasks are running. If a worker dies, its leases expire and the tasks can be picked by other workers.
+    Only the coordinator advances the checkpoint (in the worker state).
+
+    Several flows (e.g. append-only and mutable indices, or several networks) can share the database, as long as their BigQuery datasets differ:
+    plans are kept by BigQuery dataset. A worker only leases tasks of the "bq_datasets" it serves; once it has planned a bulk (i.e. the coordinator),
+    only tasks of that bulk.
+    """
+
+    def __init__(
+            self,
+            database_path: Path,
+            worker_id: str,
+            bq_datasets: List[str],
+            lease_duration_in_seconds: int,
+            poll_interval_in_seconds: int,
+            tasks_history: Optional[TasksHistory] = None
+    ) -> None:
+        self.database_path = database_path
+        self.worker_id = worker_id
+        self.bq_datasets = bq_datasets
+        self.lease_duration_in_seconds = lease_duration_in_seconds
+        self.poll_interval_in_seconds = poll_interval_in_seconds
+        self.tasks_history = tasks_history
+
+        self._lock = threading.Lock()
+        self._leased_keys: Set[str] = set()
+        self._lease_keeper: Optional[threading.Thread] = None
+        self._planned_bq_dataset: Optional[str] = None
+        self._previously_finished_task_keys: Set[str] = set()
+
+        self.database_path.parent.mkdir(parents=True, exist_ok=True)
+
+        self._create_or_upgrade_schema()
+
+    def _create_or_upgrade_schema(self) -> None:
+        with self._connect() as connection:
+            # Acquire the write lock upfront, so that workers starting at the same time do not upgrade the schema twice.
+            connection.execute("BEGIN IMMEDIATE")
+
+            schema_version = connection.execute("PRAGMA user_version").fetchone()[0]
+            if schema_version == SCHEMA_VERSION:
+                return
+
+            if schema_version:
+                logging.warning(f"Schema of {self.database_path} has changed (version {schema_version} -> {SCHEMA_VERSION}). Plans in progress are dropped.")
+
+            # Databases created before versioning (version 0) might hold an outdated table, as well.
+            connection.execute("DROP TABLE IF EXISTS tasks")
+            connection.execute(SCHEMA)
+            connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def plan_bulk(
+            self,
+            bq_dataset: str,
+            indices: List[str],
+            indices_without_timestamp: List[str],
+            initial_start_timestamp: int,
+            initial_end_timestamp: int,
+            num_intervals_in_bulk: int,
+            interval_size_in_seconds: int,
+            point_in_time_ids: Optional[Dict[str, str]] = None,
+            should_align_intervals_to_partitions: bool = False,
+            num_slices_by_index: Optional[Dict[str, int]] = None,
+            interval_boundaries: Optional[List[int]] = None
+    ) -> Optional[int]:
+        """
+        Should only be called by the coordinator. Replaces the previous plan (for the same BigQuery dataset).
+
+        Returns the end time of the latest interval for the planned tasks.
+        """
+        # We reuse the planning logic of the in-process dashboard.
+        local_dashboard = TasksDashboard(tasks_history=self.tasks_history)
+        end_timestamp_of_latest_interval = local_dashboard.plan_bulk(
+            bq_dataset=bq_dataset,
+            indices=indices,
+            indices_without_timestamp=indices_without_timestamp,
+            initial_start_timestamp=initial_start_timestamp,
+            initial_end_timestamp=initial_end_timestamp,
+            num_intervals_in_bulk=num_intervals_in_bulk,
+            interval_size_in_seconds=interval_size_in_seconds,
+            point_in_time_ids=point_in_time_ids,
+            should_align_intervals_to_partitions=should_align_intervals_to_partitions,
+            num_slices_by_index=num_slices_by_index,
+            interval_boundaries=interval_boundaries
+        )
+
+        tasks = local_dashboard.get_all_tasks()
+
+        with self._connect() as connection:
+            rows = connection.execute("SELECT key FROM tasks WHERE bq_dataset = ? AND status = ?", (bq_dataset, TaskStatus.FINISHED.value)).fetchall()
+            self._previously_finished_task_keys = {row[0] for row in rows}
+
+            connection.execute("DELETE FROM tasks WHERE bq_dataset = ?", (bq_dataset,))
+            connection.executemany(
+                "INSERT INTO tasks (key, bq_dataset, index_name, start_timestamp, end_timestamp, point_in_time_id, bq_partition, slice_id, num_slices, position, status) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (_get_task_key(task), task.bq_dataset, task.index_name, task.start_timestamp, task.end_timestamp, task.point_in_time_id, task.bq_partition, task.slice_id, task.num_slices, position, TaskStatus.PENDING.value)
+                    for position, task in enumerate(tasks)
+                ]
+            )
+
+        self._planned_bq_dataset = bq_dataset
+        return end_timestamp_of_latest_interval
+
+    def has_resumable_bulk(self, bq_dataset: str, initial_start_timestamp: int) -> bool:
+        """
+        Whether a bulk starting at "initial_start_timestamp" was interrupted, after finishing some of its tasks.
+        """
+        with self._connect() as connection:
+            row = connection.execute(
+                "SELECT MIN(start_timestamp), SUM(status = ?) FROM tasks WHERE bq_dataset = ?",
+                (TaskStatus.FINISHED.value, bq_dataset)
+            ).fetchone()
+
+        min_start_timestamp, num_finished = row
+        return min_start_timestamp == initial_start_timestamp and (num_finished or 0) > 0
+
+    def get_previously_finished_tasks(self) -> List[Task]:
+        """
+        Among the planned tasks, returns the ones which were finished within the previous plan of the same bulk.
+        """
+        return [task for task in self.get_all_tasks() if _get_task_key(task) in self._previously_finished_task_keys]
+
+    def mark_task_as_replacing_existing_data(self, task: Task) -> None:
+        task.should_replace_existing_data = True
+
+        with self._connect() as connection:
+            connection.execute("UPDATE tasks SET should_replace_existing_data = 1 WHERE key = ?", (_get_task_key(task),))
+
+    def restore_finished_task(self, task: Task) -> None:
+        now = self._get_now()
+        task.set_started(now)
+        task.set_finished(now)
+
+        with self._connect() as connection:
+            connection.execute(
+                "UPDATE tasks SET status = ?, worker = ?, started_on = ?, finished_on = ? WHERE key = ?",
+                (TaskStatus.FINISHED.value, self.worker_id, now.timestamp(), now.timestamp(), _get_task_key(task))
+            )
+
+    def pick_and_start_task(self) -> Optional[Task]:
+        """
+        Leases a pending task (or a task whose lease has expired), from the plans of the served BigQuery datasets.
+        """
+        now = self._get_now_timestamp()
+        bq_datasets = self._get_leasable_bq_datasets()
+
+        with self._connect() as connection:
+            # Acquire the write lock upfront, so that two workers cannot lease the same task.
+            connection.execute("BEGIN IMMEDIATE")
+
+            row = connection.execute(
+                f"""
+                SELECT {TASK_COLUMNS} FROM tasks
+                WHERE bq_dataset IN ({_get_placeholders(bq_datasets)}) AND (status = ? OR (status = ? AND lease_expires_on < ?))
+                ORDER BY position LIMIT 1
+                """,
+                (*bq_datasets, TaskStatus.PENDING.value, TaskStatus.STARTED.value, now)
+            ).fetchone()
+
+            if row is None:
+                return None
+
+            task = _task_from_row(row)
+
+            if task.is_started():
+                logging.warning(f"Lease of {task} (held by {row[6]}) has expired. Will take it over.")
+
+            connection.execute(
+                "UPDATE tasks SET status = ?, worker = ?, lease_expires_on = ?, started_on = ? WHERE key = ?",
+                (TaskStatus.STARTED.value, self.worker_id, now + self.lease_duration_in_seconds, now, row[0])
+            )
+
+        task.status = TaskStatus.STARTED
+        task.started_on = self._get_now()
+
+        with self._lock:
+            self._leased_keys.add(row[0])
+            self._start_lease_keeper_if_necessary()
+
+        return task
+
+    def has_pending_tasks(self) -> bool:
+        """
+        Whether there are tasks to be leased (from the plans of the served BigQuery datasets).
+        """
+        bq_datasets = self._get_leasable_bq_datasets()
+
+        with self._connect() as connection:
+            row = connection.execute(
+                f"SELECT COUNT(*) FROM tasks WHERE bq_dataset IN ({_get_placeholders(bq_datasets)}) AND (status = ? OR (status = ? AND lease_expires_on < ?))",
+                (*bq_datasets, TaskStatus.PENDING.value, TaskStatus.STARTED.value, self._get_now_timestamp())
+            ).fetchone()
+
+            return row[0] > 0
+
+    def _get_leasable_bq_datasets(self) -> List[str]:
+        # The coordinator only helps with its own bulk (thus, it does not wait for the tasks of other flows).
+        return [self._planned_bq_dataset] if self._planned_bq_dataset else self.bq_datasets
+
+    def on_task_finished(self, task: Task) -> None:
+        task.set_finished(self._get_now())
+
+        if not self._update_leased_task(task, "status = ?, finished_on = ?", (TaskStatus.FINISHED.value, self._get_now_timestamp())):
+            logging.warning(f"Task {task} finished, but its lease was lost in the meantime. Its data might have been loaded twice.")
+            return
+
+        if self.tasks_history:
+            self.tasks_history.record(task)
+
+        logging.info(f"Task {task} finished. Took {task.get_duration()} seconds.")
+
+    def on_task_failed(self, task: Task, error: Exception, formatted_stack_trace: str) -> None:
+        task.set_failed(error, formatted_stack_trace)
+        self._update_leased_task(task, "status = ?, error = ?, error_stack_trace = ?", (TaskStatus.FAILED.value, str(error), formatted_stack_trace))
+
+    def _update_leased_task(self, task: Task, assignments: str, values: Any) -> bool:
+        key = _get_task_key(task)
+
+        with self._lock:
+            self._leased_keys.discard(key)
+
+        with self._connect() as connection:
+            cursor = connection.execute(
+                f"UPDATE tasks SET {assignments} WHERE key = ? AND worker = ? AND status = ?",
+                (*values, key, self.worker_id, TaskStatus.STARTED.value)
+            )
+
+            return cursor.rowcount > 0
+
+    def wait_for_tasks_of_other_workers(self) -> bool:
+        """
+        Should only be called by the coordinator. Waits until the tasks leased by other workers are done (or have failed).
+
+        Returns whether there are (again) tasks to be picked (e.g. leases have expired).
+        """
+        while True:
+            counts = self._count_tasks_by_status()
+            num_started = counts.get(TaskStatus.STARTED.value, 0)
+            num_failed = counts.get(TaskStatus.FAILED.value, 0)
+
+            if num_failed:
+                return False
+            if self._has_tasks_to_pick():
+                return True
+            if not num_started:
+                return False
+
+            logging.info(f"Waiting for {num_started} tasks leased by other workers...")
+            time.sleep(self.poll_interval_in_seconds)
+
+    def _has_tasks_to_pick(self) -> bool:
+        with self._connect() as connection:
+            row = connection.execute(
+                "SELECT COUNT(*) FROM tasks WHERE bq_dataset = ? AND (status = ? OR (status = ? AND lease_expires_on < ?))",
+                (self._planned_bq_dataset, TaskStatus.PENDING.value, TaskStatus.STARTED.value, self._get_now_timestamp())
+            ).fetchone()
+
+            return row[0] > 0
+
+    def assert_all_existing_tasks_are_finished(self) -> None:
+        for task in self.get_all_tasks():
+            assert task.is_finished(), f"Task {task} is not finished."
+
+    def get_failed_tasks(self) -> List[Task]:
+        return [task for task in self.get_all_tasks() if task.is_failed()]
+
+    def report_tasks(self) -> None:
+        for task in self.get_all_tasks():
+            logging.info(f"{task}: {task.status}")
+
+    def get_all_tasks(self) -> List[Task]:
+        with self._connect() as connection:
+            rows = connection.execute(
+                f"SELECT {TASK_COLUMNS} FROM tasks WHERE bq_dataset = ? ORDER BY position",
+                (self._planned_bq_dataset,)
+            ).fetchall()
+
+        return [_task_from_row(row) for row in rows]
+
+    def _count_tasks_by_status(self) -> Dict[str, int]:
+        with self._connect() as connection:
+            rows = connection.execute(
+                "SELECT status, COUNT(*) FROM tasks WHERE bq_dataset = ? GROUP BY status",
+                (self._planned_bq_dataset,)
+            ).fetchall()
+
+        return dict(rows)
+
+    def _start_lease_keeper_if_necessary(self) -> None:
+        if self._lease_keeper is not None:
+            return
+
+        self._lease_keeper = threading.Thread(name="lease-keeper", target=self._keep_leases, daemon=True)
+        self._lease_keeper.start()
+
+    def _keep_leases(self) -> None:
+        while True:
+            time.sleep(max(1, self.lease_duration_in_seconds // 3))
+
+            with self._lock:
+                keys = list(self._leased_keys)
+
+            if not keys:
+                continue
+
+            try:
+                self._renew_leases(keys)
+            except sqlite3.Error as error:
+                logging.warning(f"Could not renew leases: {error}")
+
+    def _renew_leases(self, keys: List[str]) -> None:
+        lease_expires_on = self._get_now_timestamp() + self.lease_duration_in_seconds
+
+        with self._connect() as connection:
+            connection.executemany(
+                "UPDATE tasks SET lease_expires_on = ? WHERE key = ? AND worker = ? AND status = ?",
+                [(lease_expires_on, key, self.worker_id, TaskStatus.STARTED.value) for key in keys]
+            )
+
+    def _connect(self) -> "_ClosingConnection":
+        # Connections are not shared between threads; "isolation_level=None" allows explicit transactions (e.g. "BEGIN IMMEDIATE").
+        connection = sqlite3.connect(self.database_path, timeout=60, isolation_level=None)
+        return _ClosingConnection(connection)
+
+    @staticmethod
+    def _get_now() -> datetime.datetime:
+        return datetime.datetime.now(tz=datetime.timezone.utc)
+
+    @classmethod
+    def _get_now_timestamp(cls) -> float:
+        return cls._get_now().timestamp()
+
+
+class _ClosingConnection:
+    """
+    Unlike "sqlite3.Connection", closes the connection (and commits any explicit transaction) when leaving the "with" block.
+    """
+
+    def __init__(self, connection: sqlite3.Connection) -> None:
+        self.connection = connection
+
+    def __enter__(self) -> sqlite3.Connection:
+        return self.connection
+
+    def __exit__(self, exc_type: Any, exc_value: Any, traceback: Any) -> None:
+        try:
+            if self.connection.in_transaction:
+                if exc_type is None:
+                    self.connection.execute("COMMIT")
+                else:
+                    self.connection.execute("ROLLBACK")
+        finally:
+            self.connection.close()
+
+
+def _get_task_key(task: Task) -> str:
+    return f"{task.bq_dataset}.{task.get_filename_friendly_description()}"
+
+
+def _get_placeholders(values: List[str]) -> str:
+    return ", ".join("?" for _ in values)
+
+
+def _task_from_row(row: Any) -> Task:
+    _, bq_dataset, index_name, start_timestamp, end_timestamp, status, _, started_on, finished_on, error, error_stack_trace, point_in_time_id, should_replace_existing_data, bq_partition, slice_id, num_slices = row
+
+    task = Task(bq_dataset, index_name, start_timestamp, end_timestamp)
+    task.status = TaskStatus(status)
+    task.started_on = datetime.datetime.fromtimestamp(started_on, tz=datetime.timezone.utc) if started_on else None
+    task.finished_on = datetime.datetime.fromtimestamp(finished_on, tz=datetime.timezone.utc) if finished_on else None
+    task.error = Exception(error) if error else None
+    task.error_stack_trace = error_stack_trace or ""
+    task.point_in_time_id = point_in_time_id
+    task.should_replace_existing_data = bool(should_replace_existing_data)
+    task.bq_partition = bq_partition
+    task.slice_id = slice_id
+    task.num_slices = num_slices
+    return task
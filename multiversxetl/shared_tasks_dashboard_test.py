@@ -0,0 +1,104 @@
+import sqlite3
+from pathlib import Path
+
+from multiversxetl.shared_tasks_dashboard import SharedTasksDashboard
+
+
+def test_workers_lease_distinct_tasks(tmp_path: Path):
+    coordinator = SharedTasksDashboard(tmp_path / "tasks.sqlite", "coordinator", ["dataset"], 600, 1)
+    worker = SharedTasksDashboard(tmp_path / "tasks.sqlite", "worker", ["dataset"], 600, 1)
+
+    end_timestamp = coordinator.plan_bulk("dataset", ["blocks"], [], 0, 300, 3, 100)
+    assert end_timestamp == 300
+
+    first = coordinator.pick_and_start_task()
+    second = worker.pick_and_start_task()
+    third = worker.pick_and_start_task()
+    assert first and second and third
+    assert worker.pick_and_start_task() is None
+
+    descriptions = {task.get_filename_friendly_description() for task in [first, second, third]}
+    assert len(descriptions) == 3
+
+    coordinator.on_task_finished(first)
+    worker.on_task_finished(second)
+    worker.on_task_finished(third)
+
+    assert coordinator.wait_for_tasks_of_other_workers() is False
+    coordinator.assert_all_existing_tasks_are_finished()
+
+
+def test_expired_lease_is_taken_over(tmp_path: Path):
+    coordinator = SharedTasksDashboard(tmp_path / "tasks.sqlite", "coordinator", ["dataset"], 600, 1)
+    crashed_worker = SharedTasksDashboard(tmp_path / "tasks.sqlite", "crashed", ["dataset"], -1, 1)
+
+    coordinator.plan_bulk("dataset", ["blocks"], [], 0, 100, 1, 100)
+
+    task = crashed_worker.pick_and_start_task()
+    assert task
+
+    # The lease has expired, thus the coordinator can pick the task again.
+    assert coordinator.wait_for_tasks_of_other_workers() is True
+    task_taken_over = coordinator.pick_and_start_task()
+    assert task_taken_over
+    assert task_taken_over.get_filename_friendly_description() == task.get_filename_friendly_description()
+
+    coordinator.on_task_finished(task_taken_over)
+    coordinator.assert_all_existing_tasks_are_finished()
+
+
+def test_failed_tasks_are_visible_to_coordinator(tmp_path: Path):
+    coordinator = SharedTasksDashboard(tmp_path / "tasks.sqlite", "coordinator", ["dataset"], 600, 1)
+    worker = SharedTasksDashboard(tmp_path / "tasks.sqlite", "worker", ["dataset"], 600, 1)
+
+    coordinator.plan_bulk("dataset", ["blocks"], [], 0, 100, 1, 100)
+
+    task = worker.pick_and_start_task()
+    assert task
+    worker.on_task_failed(task, Exception("foobar"), "")
+
+    assert coordinator.wait_for_tasks_of_other_workers() is False
+    failed_tasks = coordinator.get_failed_tasks()
+    assert len(failed_tasks) == 1
+    assert str(failed_tasks[0].error) == "foobar"
+
+
+def test_workers_lease_tasks_of_their_datasets_only(tmp_path: Path):
+    mainnet_coordinator = SharedTasksDashboard(tmp_path / "tasks.sqlite", "mainnet-coordinator", ["mainnet"], 600, 1)
+    devnet_coordinator = SharedTasksDashboard(tmp_path / "tasks.sqlite", "devnet-coordinator", ["devnet"], 600, 1)
+    devnet_worker = SharedTasksDashboard(tmp_path / "tasks.sqlite", "devnet-worker", ["devnet"], 600, 1)
+
+    mainnet_coordinator.plan_bulk("mainnet", ["blocks"], [], 0, 100, 1, 100)
+    assert devnet_worker.has_pending_tasks() is False
+    assert devnet_worker.pick_and_start_task() is None
+
+    devnet_coordinator.plan_bulk("devnet", ["blocks"], [], 0, 100, 1, 100)
+    devnet_task = devnet_worker.pick_and_start_task()
+    assert devnet_task and devnet_task.bq_dataset == "devnet"
+    assert devnet_worker.pick_and_start_task() is None
+
+    # The coordinators only pick tasks of their own bulks.
+    assert devnet_coordinator.pick_and_start_task() is None
+    mainnet_task = mainnet_coordinator.pick_and_start_task()
+    assert mainnet_task and mainnet_task.bq_dataset == "mainnet"
+
+
+def test_outdated_schema_is_recreated(tmp_path: Path):
+    database_path = tmp_path / "tasks.sqlite"
+
+    # E.g. created by a previous version, without some of the columns.
+    connection = sqlite3.connect(database_path)
+    connection.execute("CREATE TABLE tasks (key TEXT PRIMARY KEY, bq_dataset TEXT NOT NULL, index_name TEXT NOT NULL, position INTEGER NOT NULL, status TEXT NOT NULL)")
+    connection.commit()
+    connection.close()
+
+    coordinator = SharedTasksDashboard(database_path, "coordinator", ["dataset"], 600, 1)
+    coordinator.plan_bulk("dataset", ["blocks"], [], 0, 100, 1, 100)
+    task = coordinator.pick_and_start_task()
+    assert task
+
+    # Once up to date, the schema (thus, the plan in progress) is kept.
+    SharedTasksDashboard(database_path, "worker", ["dataset"], 600, 1)
+    coordinator.on_task_finished(task)
+    assert len(coordinator.get_all_tasks()) == 1
+    coordinator.assert_all_existing_tasks_are_finished()
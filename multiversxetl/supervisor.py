@@ -0,0 +1,131 @@
+import logging
+import threading
+from pathlib import Path
+from typing import List
+
+from multiversxetl.app_controller import AppController
+from multiversxetl.clients_provider import ClientsProvider
+from multiversxetl.errors import KnownError
+from multiversxetl.worker_pool import (PRIORITY_APPEND_ONLY_INDICES,
+                                       PRIORITY_MUTABLE_INDICES,
+                                       PrioritizedWorkerPool)
+
+FLOW_APPEND_ONLY_INDICES = "append_only_indices"
+FLOW_MUTABLE_INDICES = "mutable_indices"
+# After a failure, a flow is retried (from a clean state) after this delay; it's abandoned after a number of consecutive failures (and the process exits).
+FLOW_RETRY_DELAY_IN_SECONDS = 300
+MAX_NUM_CONSECUTIVE_FAILURES_PER_FLOW = 3
+
+
+class Flow:
+    def __init__(self, workspace: Path, kind: str, sleep_between_iterations: int) -> None:
+        self.workspace = workspace
+        self.kind = kind
+        self.sleep_between_iterations = sleep_between_iterations
+
+    def get_priority(self) -> int:
+        return PRIORITY_APPEND_ONLY_INDICES if self.kind == FLOW_APPEND_ONLY_INDICES else PRIORITY_MUTABLE_INDICES
+
+    def __str__(self) -> str:
+        return f"{self.workspace.name}:{self.kind}"
+
+
+class Supervisor:
+    """
+    Runs the flows (append-only and mutable indices) of several workspaces (e.g. networks), in a single process.
+
+    The flows share the clients (thus, the connection pools) and a pool of worker slots. When the slots are contended,
+    tasks of the append-only flows (freshness) are served before the tasks of the mutable flows (reloads).
+    """
+
+    def __init__(
+            self,
+            workspaces: List[Path],
+            num_workers: int,
+            sleep_between_append_only_iterations: int,
+            sleep_between_mutable_iterations: int
+    ) -> None:
+        self.clients_provider = ClientsProvider()
+        self.worker_pool = PrioritizedWorkerPool(num_workers)
+        self.flows: List[Flow] = []
+        self.abandoned_flows: List[Flow] = []
+        self._stop_event = threading.Event()
+
+        for workspace in workspaces:
+            self.flows.append(Flow(workspace, FLOW_APPEND_ONLY_INDICES, sleep_between_append_only_iterations))
+            self.flows.append(Flow(workspace, FLOW_MUTABLE_INDICES, sleep_between_mutable_iterations))
+
+    def run(self) -> None:
+        threads: List[threading.Thread] = []
+
+        for flow in self.flows:
+            thread = threading.Thread(name=f"flow-{flow}", target=self._run_flow, args=[flow], daemon=True)
+            thread.start()
+            threads.append(thread)
+
+        try:
+            # Flows run until one of them is abandoned. Then, the process exits (with an error), so that it's restarted (e.g. by the container runtime).
+            # The other flows are not waited for: partial loads of interrupted iterations are cleaned up at restart (see "_recover").
+            self._stop_event.wait()
+        finally:
+            self._stop_event.set()
+
+        if self.abandoned_flows:
+            raise KnownError(f"Flows have been abandoned: {', '.join(str(flow) for flow in self.abandoned_flows)}.")
+
+    def _run_flow(self, flow: Flow) -> None:
+        num_consecutive_failures = 0
+        should_recover = True
+
+        while not self._stop_event.is_set():
+            try:
+                if should_recover:
+                    self._recover(flow)
+                    should_recover = False
+
+                self._run_iteration(flow)
+                num_consecutive_failures = 0
+                sleep_duration = flow.sleep_between_iterations
+            except Exception as error:
+                num_consecutive_failures += 1
+                logging.exception(f"Flow {flow} has failed ({num_consecutive_failures} consecutive failures): {error}")
+
+                if num_consecutive_failures >= MAX_NUM_CONSECUTIVE_FAILURES_PER_FLOW:
+                    logging.error(f"Flow {flow} is abandoned.")
+                    self.abandoned_flows.append(flow)
+                    self._stop_event.set()
+                    return
+
+                should_recover = True
+                sleep_duration = FLOW_RETRY_DELAY_IN_SECONDS
+
+            logging.info(f"Flow {flow}: will sleep {sleep_duration} seconds...")
+            self._stop_event.wait(sleep_duration)
+
+    def _recover(self, flow: Flow) -> None:
+        # Same as when starting (or restarting) the append-only flow on its own: partial loads of an interrupted run are cleaned up.
+        if flow.kind == FLOW_APPEND_ONLY_INDICES:
+            self._create_controller(flow).resume_or_rewind_to_checkpoint()
+
+    def _run_iteration(self, flow: Flow) -> None:
+        logging.info(f"Starting iteration of flow {flow}...")
+
+        # A new controller on each iteration, so that workspace configuration and state is reloaded.
+        controller = self._create_controller(flow)
+
+        if flow.kind == FLOW_APPEND_ONLY_INDICES:
+            controller.process_append_only_indices()
+            controller.publish_append_only_indices()
+        else:
+            controller.process_mutable_indices()
+            controller.bq_client.trigger_data_transfer(controller.worker_config.mutable_indices.bq_data_transfer_name)
+
+        logging.info(f"Iteration of flow {flow} done.")
+
+    def _create_controller(self, flow: Flow) -> AppController:
+        return AppController(
+            flow.workspace,
+            clients_provider=self.clients_provider,
+            worker_pool=self.worker_pool,
+            worker_priority=flow.get_priority()
+        )
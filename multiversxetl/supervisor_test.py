@@ -0,0 +1,36 @@
+from pathlib import Path
+from typing import List
+
+import pytest
+
+import multiversxetl.supervisor
+from multiversxetl.errors import KnownError
+from multiversxetl.supervisor import (FLOW_MUTABLE_INDICES,
+                                      MAX_NUM_CONSECUTIVE_FAILURES_PER_FLOW,
+                                      Flow, Supervisor)
+
+
+class SupervisorWithFailingMutableFlows(Supervisor):
+    def __init__(self, workspaces: List[Path]) -> None:
+        super().__init__(workspaces, num_workers=1, sleep_between_append_only_iterations=3600, sleep_between_mutable_iterations=3600)
+        self.num_iterations_by_flow = {str(flow): 0 for flow in self.flows}
+
+    def _recover(self, flow: Flow) -> None:
+        pass
+
+    def _run_iteration(self, flow: Flow) -> None:
+        self.num_iterations_by_flow[str(flow)] += 1
+
+        if flow.kind == FLOW_MUTABLE_INDICES:
+            raise Exception("Iteration has failed.")
+
+
+def test_run_exits_when_a_flow_is_abandoned(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(multiversxetl.supervisor, "FLOW_RETRY_DELAY_IN_SECONDS", 0)
+    supervisor = SupervisorWithFailingMutableFlows([tmp_path / "mainnet"])
+
+    # The healthy (append-only) flow never returns on its own; still, the supervisor exits (with an error).
+    with pytest.raises(KnownError, match="mainnet:mutable_indices"):
+        supervisor.run()
+
+    assert supervisor.num_iterations_by_flow["mainnet:mutable_indices"] == MAX_NUM_CONSECUTIVE_FAILURES_PER_FLOW
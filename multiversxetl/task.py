@@ -35,6 +35,21 @@ class Task:
         self.error_stack_trace: str = ""
         self.started_on: Optional[datetime.datetime] = None
         self.finished_on: Optional[datetime.datetime] = None
+        self.num_records = 0
+        self.num_bytes = 0
+        # If set, the records are extracted from this (Elasticsearch) point-in-time.
+        self.point_in_time_id: Optional[str] = None
+        # Set if the interval of the task might already hold (possibly partial) data in BigQuery.
+        self.should_replace_existing_data = False
+        self.content_digest: Optional[str] = None
+        # If set (e.g. "20240131"), the interval of the task covers exactly one (daily) partition of the BigQuery table,
+        # and the data is loaded by overwriting that partition.
+        self.bq_partition: Optional[str] = None
+        # If set, the task only handles one slice (of "num_slices") of the records (useful for splitting large indices without timestamp).
+        self.slice_id: Optional[int] = None
+        self.num_slices: Optional[int] = None
+        # Set on the (transient) duplicates of straggling tasks, which run speculatively, alongside the original attempts.
+        self.is_speculative_duplicate = False
 
         if start_timestamp is not None and end_timestamp is not None:
             assert start_timestamp < end_timestamp
@@ -67,14 +82,27 @@ class Task:
         self.error = error
         self.error_stack_trace = formatted_stack_trace
 
+    def is_sliced(self) -> bool:
+        return self.slice_id is not None and self.num_slices is not None
+
     def __str__(self) -> str:
         start_time = datetime.datetime.fromtimestamp(self.start_timestamp, tz=datetime.timezone.utc) if self.start_timestamp else None
         end_time = datetime.datetime.fromtimestamp(self.end_timestamp, tz=datetime.timezone.utc) if self.end_timestamp else None
 
+        if self.is_sliced():
+            return f"({self.index_name}, {start_time} <> {end_time}, slice {self.slice_id} of {self.num_slices})"
+
         return f"({self.index_name}, {start_time} <> {end_time})"
 
     def get_filename_friendly_description(self) -> str:
-        return f"{self.index_name}_{self.start_timestamp}_{self.end_timestamp}"
+        description = f"{self.index_name}_{self.start_timestamp}_{self.end_timestamp}"
+
+        if self.is_sliced():
+            description += f"_slice_{self.slice_id}_of_{self.num_slices}"
+        if self.is_speculative_duplicate:
+            description += "_speculative"
+
+        return description
 
     def to_plain_dictionary(self) -> Dict[str, Any]:
         return {
@@ -82,9 +110,13 @@ class Task:
             "index_name": self.index_name,
             "start_timestamp": self.start_timestamp,
             "end_timestamp": self.end_timestamp,
+            "slice_id": self.slice_id,
+            "num_slices": self.num_slices,
             "status": self.status.value,
             "error": str(self.error) if self.error else None,
-            "error_stack_trace": self.error_stack_trace
+            "error_stack_trace": self.error_stack_trace,
+            "num_records": self.num_records,
+            "num_bytes": self.num_bytes
         }
 
     def get_duration(self) -> Optional[float]:
@@ -1,16 +1,25 @@
+import bisect
 import datetime
 import logging
 import random
 import threading
-from typing import List, Optional
+from pathlib import Path
+from typing import Dict, List, Optional, Set
 
+from multiversxetl.constants import SECONDS_IN_DAY
 from multiversxetl.task import Task
+from multiversxetl.tasks_history import TasksHistory
+from multiversxetl.tasks_journal import TasksJournal
 
 
 class TasksDashboard:
-    def __init__(self) -> None:
+    def __init__(self, journals_folder: Optional[Path] = None, tasks_history: Optional[TasksHistory] = None) -> None:
         self._lock = threading.Lock()
         self._tasks: List[Task] = []
+        self._journals_folder = journals_folder
+        self._tasks_history = tasks_history
+        self._journal: Optional[TasksJournal] = None
+        self._previously_finished_task_keys: Set[str] = set()
 
     def plan_bulk(
             self,
@@ -21,10 +30,23 @@ class TasksDashboard:
             initial_end_timestamp: int,
             num_intervals_in_bulk: int,
             interval_size_in_seconds: int,
+            point_in_time_ids: Optional[Dict[str, str]] = None,
+            should_align_intervals_to_partitions: bool = False,
+            num_slices_by_index: Optional[Dict[str, int]] = None,
+            interval_boundaries: Optional[List[int]] = None
     ) -> Optional[int]:
         """
         This should not be called concurrently with other methods.
 
+        If provided, "point_in_time_ids" (by index) are assigned to the tasks.
+
+        If "should_align_intervals_to_partitions" is set, intervals do not cross day boundaries (UTC), and the tasks covering whole days
+        are assigned the corresponding (daily) BigQuery partition.
+
+        If provided, "num_slices_by_index" tells in how many slices (tasks that can run in parallel) each interval of an index is split.
+
+        If provided, intervals do not cross the "interval_boundaries" (sorted timestamps), e.g. so that they match the intervals held by the extraction cache.
+
         Returns the end time of the latest interval for the planned tasks.
         """
         self.assert_all_existing_tasks_are_finished()
@@ -32,28 +54,90 @@ class TasksDashboard:
 
         end_timestamp_of_latest_interval: Optional[int] = None
 
-        for interval_index in range(num_intervals_in_bulk):
-            start_timestamp = initial_start_timestamp + interval_index * interval_size_in_seconds
-            end_timestamp = min(start_timestamp + interval_size_in_seconds, initial_end_timestamp)
+        start_timestamp = initial_start_timestamp
 
+        for _ in range(num_intervals_in_bulk):
             if start_timestamp >= initial_end_timestamp:
                 break
 
+            end_timestamp = min(start_timestamp + interval_size_in_seconds, initial_end_timestamp)
+
+            if should_align_intervals_to_partitions:
+                end_timestamp = min(end_timestamp, _get_next_day_boundary(start_timestamp))
+
+            next_boundary = _get_next_boundary(interval_boundaries or [], start_timestamp)
+            if next_boundary is not None:
+                end_timestamp = min(end_timestamp, next_boundary)
+
             end_timestamp_of_latest_interval = end_timestamp
 
             for index_name in set(indices) - set(indices_without_timestamp):
                 task = Task(bq_dataset, index_name, start_timestamp, end_timestamp)
+
+                if should_align_intervals_to_partitions:
+                    task.bq_partition = get_day_partition(start_timestamp, end_timestamp)
+
                 self._tasks.append(task)
 
+            start_timestamp = end_timestamp
+
         for index_name in indices_without_timestamp:
             task = Task(bq_dataset, index_name)
             self._tasks.append(task)
 
+        if num_slices_by_index:
+            self._tasks = [sliced_task for task in self._tasks for sliced_task in _split_task(task, num_slices_by_index.get(task.index_name, 1))]
+
+        for task in self._tasks:
+            task.point_in_time_id = (point_in_time_ids or {}).get(task.index_name)
+
         # Consumers will randomly pick tasks.
         self._shuffle_all_existing_tasks()
 
+        # If possible, the longest tasks are scheduled first (so that they do not delay the end of the bulk).
+        if self._tasks_history:
+            self._sort_all_existing_tasks_by_estimated_duration()
+
+        if self._journals_folder:
+            self._journal = TasksJournal(get_journal_path(self._journals_folder, bq_dataset))
+            self._previously_finished_task_keys = self._journal.load_finished_task_keys()
+            self._journal.record_plan(initial_start_timestamp, self._tasks)
+
         return end_timestamp_of_latest_interval
 
+    def has_resumable_bulk(self, bq_dataset: str, initial_start_timestamp: int) -> bool:
+        """
+        Whether a bulk starting at "initial_start_timestamp" was interrupted, after finishing some of its tasks.
+        """
+        if not self._journals_folder:
+            return False
+
+        journal = TasksJournal(get_journal_path(self._journals_folder, bq_dataset))
+        return len(journal.load_finished_task_keys(initial_start_timestamp)) > 0
+
+    def get_previously_finished_tasks(self) -> List[Task]:
+        """
+        Among the planned tasks, returns the ones which were finished by a previous (interrupted) run of the same bulk.
+        """
+        return [task for task in self._tasks if task.get_filename_friendly_description() in self._previously_finished_task_keys]
+
+    def mark_task_as_replacing_existing_data(self, task: Task) -> None:
+        """
+        The interval of the task might already hold (possibly partial) data, which should be replaced.
+        """
+        task.should_replace_existing_data = True
+
+    def restore_finished_task(self, task: Task) -> None:
+        """
+        Marks a task (finished by a previous run) as finished, so that it is not picked again.
+        """
+        now = self._get_now()
+        task.set_started(now)
+        task.set_finished(now)
+
+        if self._journal:
+            self._journal.record_finished(task)
+
     def pick_and_start_task(self) -> Optional[Task]:
         """
         This can be called concurrently with "pick_next_task" or "on_task_finished".
@@ -66,11 +150,34 @@ class TasksDashboard:
                     task.set_started(self._get_now())
                     return task
 
+    def has_pending_tasks(self) -> bool:
+        with self._lock:
+            return any(task.is_pending() for task in self._tasks)
+
     def on_task_finished(self, task: Task) -> None:
         task.set_finished(self._get_now())
+
+        if self._journal:
+            self._journal.record_finished(task)
+        if self._tasks_history:
+            self._tasks_history.record(task)
+
         logging.info(f"Task {task} finished. Took {task.get_duration()} seconds.")
         self._report_tasks_status("on_task_finished()")
-        pass
+
+    def on_task_failed(self, task: Task, error: Exception, formatted_stack_trace: str) -> None:
+        task.set_failed(error, formatted_stack_trace)
+
+        if self._journal:
+            self._journal.record_failed(task)
+
+    def wait_for_tasks_of_other_workers(self) -> bool:
+        """
+        All tasks are consumed in-process, thus there is nothing to wait for.
+
+        Returns whether there are (again) tasks to be picked.
+        """
+        return False
 
     def assert_all_existing_tasks_are_finished(self) -> None:
         """
@@ -85,6 +192,18 @@ class TasksDashboard:
     def _shuffle_all_existing_tasks(self) -> None:
         random.shuffle(self._tasks)
 
+    def _sort_all_existing_tasks_by_estimated_duration(self) -> None:
+        assert self._tasks_history
+        hour = self._get_now().hour
+
+        def get_sort_key(task: Task) -> float:
+            estimated_duration = self._tasks_history.estimate_task_duration(task, hour) if self._tasks_history else None
+            # Tasks without an estimation go first.
+            return -(estimated_duration if estimated_duration is not None else float("inf"))
+
+        # Sorting is stable, thus tasks with equal estimations remain shuffled.
+        self._tasks.sort(key=get_sort_key)
+
     def _report_tasks_status(self, message: str) -> None:
         num_pending = len([task for task in self._tasks if task.is_pending()])
         num_started = len([task for task in self._tasks if task.is_started()])
@@ -93,6 +212,39 @@ class TasksDashboard:
 
         logging.info(f"{message}: pending = {num_pending}, started = {num_started}, finished = {num_finished}, failed = {num_failed}, total = {len(self._tasks)}.")
 
+        estimated_remaining_duration = self._estimate_remaining_duration(num_started)
+        if estimated_remaining_duration is not None:
+            logging.info(f"{message}: estimated time until the bulk is done: {int(estimated_remaining_duration)} seconds.")
+
+    def _estimate_remaining_duration(self, num_started: int) -> Optional[float]:
+        if not self._tasks_history:
+            return None
+
+        now = self._get_now()
+        remaining_work = 0.0
+
+        for task in self._tasks:
+            if not task.is_pending() and not task.is_started():
+                continue
+
+            estimated_duration = self._tasks_history.estimate_task_duration(task, now.hour)
+            if estimated_duration is None:
+                return None
+
+            if task.is_started() and task.started_on:
+                estimated_duration = max(0, estimated_duration - (now - task.started_on).total_seconds())
+
+            remaining_work += estimated_duration
+
+        # We approximate the degree of parallelism by the number of running tasks.
+        return remaining_work / max(1, num_started)
+
+    def get_all_tasks(self) -> List[Task]:
+        """
+        This should not be called concurrently with other methods.
+        """
+        return list(self._tasks)
+
     def get_failed_tasks(self) -> List[Task]:
         """
         This should not be called concurrently with other methods.
@@ -110,3 +262,43 @@ class TasksDashboard:
 
         for task in self._tasks:
             logging.info(f"{task}: {task.status}")
+
+
+def get_day_partition(start_timestamp: int, end_timestamp: int) -> Optional[str]:
+    """
+    If the interval covers exactly one day (UTC), returns the partition decorator of that day (e.g. "20240131").
+    """
+    if start_timestamp % SECONDS_IN_DAY != 0 or end_timestamp - start_timestamp != SECONDS_IN_DAY:
+        return None
+
+    return datetime.datetime.fromtimestamp(start_timestamp, tz=datetime.timezone.utc).strftime("%Y%m%d")
+
+
+def _split_task(task: Task, num_slices: int) -> List[Task]:
+    if num_slices <= 1:
+        return [task]
+
+    sliced_tasks: List[Task] = []
+
+    for slice_id in range(num_slices):
+        sliced_task = Task(task.bq_dataset, task.index_name, task.start_timestamp, task.end_timestamp)
+        sliced_task.slice_id = slice_id
+        sliced_task.num_slices = num_slices
+        # A slice cannot overwrite a whole partition (it would remove the data of the other slices).
+        sliced_task.bq_partition = None
+        sliced_tasks.append(sliced_task)
+
+    return sliced_tasks
+
+
+def _get_next_day_boundary(timestamp: int) -> int:
+    return (timestamp // SECONDS_IN_DAY + 1) * SECONDS_IN_DAY
+
+
+def _get_next_boundary(boundaries: List[int], timestamp: int) -> Optional[int]:
+    position = bisect.bisect_right(boundaries, timestamp)
+    return boundaries[position] if position < len(boundaries) else None
+
+
+def get_journal_path(journals_folder: Path, bq_dataset: str) -> Path:
+    return journals_folder / f"{bq_dataset}.jsonl"
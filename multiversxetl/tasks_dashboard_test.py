@@ -0,0 +1,45 @@
+from multiversxetl.tasks_dashboard import TasksDashboard, get_day_partition
+
+DAY = 24 * 60 * 60
+
+
+def test_get_day_partition():
+    assert get_day_partition(19723 * DAY, 19724 * DAY) == "20240101"
+    assert get_day_partition(19723 * DAY, 19723 * DAY + 3600) is None
+    assert get_day_partition(19723 * DAY + 3600, 19724 * DAY + 3600) is None
+
+
+def test_plan_bulk_with_intervals_aligned_to_partitions():
+    dashboard = TasksDashboard()
+    start_timestamp = 19723 * DAY - 3600
+
+    end_timestamp = dashboard.plan_bulk("dataset", ["blocks"], [], start_timestamp, start_timestamp + 3 * DAY, 3, DAY, should_align_intervals_to_partitions=True)
+    assert end_timestamp == 19725 * DAY
+
+    tasks = sorted(dashboard.get_all_tasks(), key=lambda task: task.start_timestamp or 0)
+    assert [(task.start_timestamp, task.end_timestamp, task.bq_partition) for task in tasks] == [
+        (start_timestamp, 19723 * DAY, None),
+        (19723 * DAY, 19724 * DAY, "20240101"),
+        (19724 * DAY, 19725 * DAY, "20240102"),
+    ]
+
+
+def test_plan_bulk_with_sliced_indices():
+    dashboard = TasksDashboard()
+    dashboard.plan_bulk("dataset", ["blocks", "accountsesdt", "validators"], ["validators"], 0, 200, 2, 100, num_slices_by_index={"accountsesdt": 4, "validators": 2})
+
+    tasks = dashboard.get_all_tasks()
+    assert len([task for task in tasks if task.index_name == "blocks"]) == 2
+    assert len([task for task in tasks if task.index_name == "accountsesdt"]) == 8
+    assert len([task for task in tasks if task.index_name == "validators"]) == 2
+    assert len({task.get_filename_friendly_description() for task in tasks}) == 12
+    assert all(task.is_sliced() for task in tasks if task.index_name != "blocks")
+
+
+def test_plan_bulk_with_interval_boundaries():
+    dashboard = TasksDashboard()
+    end_timestamp = dashboard.plan_bulk("dataset", ["blocks"], [], 0, 1000, 100, 400, interval_boundaries=[150, 300, 2000])
+    assert end_timestamp == 1000
+
+    tasks = sorted(dashboard.get_all_tasks(), key=lambda task: task.start_timestamp or 0)
+    assert [(task.start_timestamp, task.end_timestamp) for task in tasks] == [(0, 150), (150, 300), (300, 700), (700, 1000)]
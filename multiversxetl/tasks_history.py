@@ -0,0 +1,113 @@
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from multiversxetl.task import Task
+
+# Weight of the latest observation, in the exponentially weighted moving averages.
+SMOOTHING_FACTOR = 0.3
+
+
+class TasksHistory:
+    """
+    Per-index throughput history (records / second, bytes / second, by hour of day), along with the density of records in time.
+    Used for estimating the duration of tasks (and of bulks).
+    """
+
+    def __init__(self, data: Dict[str, Any]) -> None:
+        self._lock = threading.Lock()
+        self.data: Dict[str, Any] = data
+
+    @classmethod
+    def load_from_file(cls, path: Path) -> "TasksHistory":
+        if not path.exists():
+            return cls({})
+
+        try:
+            data = json.loads(path.read_text())
+        except ValueError as error:
+            # E.g. a file truncated by a crash. The history is only used for estimates, thus it's simply rebuilt.
+            logging.warning(f"Could not read the tasks history ({path}): {error}. Will start with an empty history.")
+            return cls({})
+
+        return cls(data)
+
+    def save_to_file(self, path: Path) -> None:
+        with self._lock:
+            data_json = json.dumps(self.data, indent=4)
+
+        # Written atomically, so that a crash never leaves a truncated file behind.
+        temporary_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        temporary_path.write_text(data_json)
+        os.replace(temporary_path, path)
+
+    def record(self, task: Task) -> None:
+        duration = task.get_duration()
+        if not duration or not task.started_on:
+            return
+
+        hour = str(task.started_on.hour)
+
+        with self._lock:
+            index_data = self.data.setdefault(task.index_name, {})
+            throughput_by_hour = index_data.setdefault("throughput_by_hour", {})
+            throughput = throughput_by_hour.setdefault(hour, {})
+
+            _update_average(throughput, "records_per_second", task.num_records / duration)
+            _update_average(throughput, "bytes_per_second", task.num_bytes / duration)
+
+            interval_duration = _get_interval_duration(task)
+            if interval_duration:
+                _update_average(index_data, "records_per_second_of_interval", task.num_records / interval_duration)
+            else:
+                _update_average(index_data, "records_per_task_without_interval", task.num_records)
+
+    def estimate_task_duration(self, task: Task, hour: int) -> Optional[float]:
+        """
+        Returns the estimated duration (in seconds) of a task, or None if there's not enough history.
+        """
+        num_records = self.estimate_num_records(task.index_name, _get_interval_duration(task))
+        if num_records is None:
+            return None
+
+        records_per_second = self._get_records_per_second(task.index_name, hour)
+        if not records_per_second:
+            return None
+
+        return num_records / records_per_second
+
+    def estimate_num_records(self, index_name: str, interval_duration: Optional[int]) -> Optional[float]:
+        with self._lock:
+            index_data = self.data.get(index_name, {})
+
+            if interval_duration:
+                density = index_data.get("records_per_second_of_interval")
+                return density * interval_duration if density is not None else None
+
+            return index_data.get("records_per_task_without_interval")
+
+    def _get_records_per_second(self, index_name: str, hour: int) -> Optional[float]:
+        with self._lock:
+            throughput_by_hour: Dict[str, Any] = self.data.get(index_name, {}).get("throughput_by_hour", {})
+            throughput = throughput_by_hour.get(str(hour))
+
+            if throughput:
+                return throughput["records_per_second"]
+
+            # Fallback to the average over all hours.
+            all_values: List[float] = [item["records_per_second"] for item in throughput_by_hour.values()]
+            return sum(all_values) / len(all_values) if all_values else None
+
+
+def _update_average(data: Dict[str, Any], key: str, value: float) -> None:
+    previous = data.get(key)
+    data[key] = value if previous is None else SMOOTHING_FACTOR * value + (1 - SMOOTHING_FACTOR) * previous
+
+
+def _get_interval_duration(task: Task) -> Optional[int]:
+    if task.start_timestamp is None or task.end_timestamp is None:
+        return None
+    return task.end_timestamp - task.start_timestamp
@@ -0,0 +1,53 @@
+import datetime
+from pathlib import Path
+from typing import Optional
+
+from multiversxetl.task import Task
+from multiversxetl.tasks_history import TasksHistory
+
+
+def test_estimate_task_duration(tmp_path: Path):
+    history = TasksHistory({})
+    assert history.estimate_task_duration(Task("dataset", "blocks", 0, 100), 10) is None
+
+    history.record(_make_finished_task("blocks", 0, 100, num_records=1000, hour=10, duration=10))
+
+    # 10 records / second of interval, processed at 100 records / second.
+    assert history.estimate_task_duration(Task("dataset", "blocks", 0, 200), 10) == 20
+    # Hours without history fallback to the average over all hours.
+    assert history.estimate_task_duration(Task("dataset", "blocks", 0, 200), 11) == 20
+    assert history.estimate_task_duration(Task("dataset", "rounds", 0, 200), 10) is None
+
+    history.save_to_file(tmp_path / "history.json")
+    history = TasksHistory.load_from_file(tmp_path / "history.json")
+    assert history.estimate_task_duration(Task("dataset", "blocks", 0, 200), 10) == 20
+
+
+def test_load_from_corrupted_file(tmp_path: Path):
+    path = tmp_path / "history.json"
+    path.write_text('{"blocks": {"throughput_by_')
+
+    history = TasksHistory.load_from_file(path)
+    assert history.data == {}
+
+    history.record(_make_finished_task("blocks", 0, 100, num_records=1000, hour=10, duration=10))
+    history.save_to_file(path)
+    assert TasksHistory.load_from_file(path).estimate_task_duration(Task("dataset", "blocks", 0, 200), 10) == 20
+    assert [item.name for item in tmp_path.iterdir()] == ["history.json"]
+
+
+def test_estimate_task_duration_without_interval():
+    history = TasksHistory({})
+    history.record(_make_finished_task("validators", None, None, num_records=500, hour=10, duration=5))
+    assert history.estimate_task_duration(Task("dataset", "validators"), 10) == 5
+
+
+def _make_finished_task(index_name: str, start_timestamp: Optional[int], end_timestamp: Optional[int], num_records: int, hour: int, duration: int) -> Task:
+    started_on = datetime.datetime(2024, 1, 1, hour, tzinfo=datetime.timezone.utc)
+
+    task = Task("dataset", index_name, start_timestamp, end_timestamp)
+    task.set_started(started_on)
+    task.set_finished(started_on + datetime.timedelta(seconds=duration))
+    task.num_records = num_records
+    task.num_bytes = num_records * 100
+    return task
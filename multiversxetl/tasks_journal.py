@@ -0,0 +1,78 @@
+import json
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set
+
+from multiversxetl.task import Task
+
+
+class TasksJournal:
+    """
+    Append-only journal (JSON lines) of a bulk: its plan, followed by the status transitions of its tasks.
+
+    The journal is rewritten (compacted) each time a new bulk is planned, thus it only holds information about the latest bulk.
+    A restarted worker can use it to skip the tasks which were already finished (and are still verifiable).
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+
+    def record_plan(self, initial_start_timestamp: int, tasks: List[Task]) -> None:
+        entry = {
+            "event": "plan",
+            "start": initial_start_timestamp,
+            "tasks": [task.get_filename_friendly_description() for task in tasks]
+        }
+
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self.path.write_text(_to_line(entry))
+
+    def record_finished(self, task: Task) -> None:
+        self._append({"event": "finished", "task": task.get_filename_friendly_description()})
+
+    def record_failed(self, task: Task) -> None:
+        self._append({"event": "failed", "task": task.get_filename_friendly_description()})
+
+    def _append(self, entry: Dict[str, Any]) -> None:
+        with self._lock:
+            with open(self.path, "a") as file:
+                file.write(_to_line(entry))
+
+    def load_finished_task_keys(self, initial_start_timestamp: Optional[int] = None) -> Set[str]:
+        """
+        Returns the tasks recorded as finished, for the journaled bulk.
+        If "initial_start_timestamp" is provided, the journaled bulk must have started at the same time (otherwise, an empty set is returned).
+        """
+        if not self.path.exists():
+            return set()
+
+        finished: Set[str] = set()
+
+        with self._lock:
+            lines = self.path.read_text().splitlines()
+
+        for line in lines:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                # The latest line might be incomplete (e.g. the process was killed while writing it).
+                continue
+
+            event = entry.get("event")
+
+            if event == "plan":
+                if initial_start_timestamp is not None and entry.get("start") != initial_start_timestamp:
+                    return set()
+                finished.clear()
+            elif event == "finished":
+                finished.add(entry["task"])
+            elif event == "failed":
+                finished.discard(entry["task"])
+
+        return finished
+
+
+def _to_line(entry: Dict[str, Any]) -> str:
+    return json.dumps(entry, separators=(",", ":")) + "\n"
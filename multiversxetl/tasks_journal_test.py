@@ -0,0 +1,60 @@
+from pathlib import Path
+
+from multiversxetl.task import Task
+from multiversxetl.tasks_dashboard import TasksDashboard
+from multiversxetl.tasks_journal import TasksJournal
+
+
+def test_load_finished_task_keys(tmp_path: Path):
+    journal = TasksJournal(tmp_path / "journal.jsonl")
+    first = Task("dataset", "blocks", 0, 100)
+    second = Task("dataset", "blocks", 100, 200)
+
+    assert journal.load_finished_task_keys() == set()
+
+    journal.record_plan(0, [first, second])
+    journal.record_finished(first)
+    journal.record_finished(second)
+    journal.record_failed(second)
+
+    assert journal.load_finished_task_keys() == {"blocks_0_100"}
+    assert journal.load_finished_task_keys(0) == {"blocks_0_100"}
+    assert journal.load_finished_task_keys(100) == set()
+
+    # A new plan compacts the journal.
+    journal.record_plan(200, [])
+    assert journal.load_finished_task_keys() == set()
+
+
+def test_load_finished_task_keys_ignores_incomplete_line(tmp_path: Path):
+    journal = TasksJournal(tmp_path / "journal.jsonl")
+    task = Task("dataset", "blocks", 0, 100)
+
+    journal.record_plan(0, [task])
+    journal.record_finished(task)
+
+    with open(journal.path, "a") as file:
+        file.write('{"event":"fini')
+
+    assert journal.load_finished_task_keys() == {"blocks_0_100"}
+
+
+def test_dashboard_resumes_interrupted_bulk(tmp_path: Path):
+    dashboard = TasksDashboard(tmp_path)
+    dashboard.plan_bulk("dataset", ["blocks", "rounds"], [], 0, 200, 2, 100)
+
+    task = dashboard.pick_and_start_task()
+    assert task
+    dashboard.on_task_finished(task)
+
+    # Simulate a restart.
+    dashboard = TasksDashboard(tmp_path)
+    assert dashboard.has_resumable_bulk("dataset", 0)
+    assert not dashboard.has_resumable_bulk("dataset", 100)
+
+    dashboard.plan_bulk("dataset", ["blocks", "rounds"], [], 0, 200, 2, 100)
+    previously_finished_tasks = dashboard.get_previously_finished_tasks()
+    assert [item.get_filename_friendly_description() for item in previously_finished_tasks] == [task.get_filename_friendly_description()]
+
+    dashboard.restore_finished_task(previously_finished_tasks[0])
+    assert len([item for item in dashboard.get_all_tasks() if item.is_pending()]) == 3
@@ -0,0 +1,212 @@
+import logging
+import statistics
+import threading
+import time
+from typing import Dict, List, Optional, Set
+
+from multiversxetl.errors import (TaskAttemptCancelledError,
+                                  TaskDeadlineExceededError)
+from multiversxetl.task import Task
+
+# Stragglers are detected with respect to the durations of the latest finished tasks (of the same index).
+MAX_NUM_DURATIONS_PER_INDEX = 100
+
+
+class TaskAttempt:
+    def __init__(self, task: Task, is_speculative: bool, now: float) -> None:
+        self.task = task
+        self.is_speculative = is_speculative
+        self.started_on = now
+        self.stage = ""
+        self.stage_started_on = now
+        self.latest_progress_on = now
+        self.num_records_in_stage = 0
+        self.has_speculative_duplicate = False
+        self.has_claimed = False
+        # Set by the monitor, then raised within the attempt (at its next progress report).
+        self.cancellation: Optional[Exception] = None
+
+    def get_records_per_second(self, now: float) -> float:
+        elapsed = now - self.stage_started_on
+        return self.num_records_in_stage / elapsed if elapsed > 0 else 0
+
+
+class TasksMonitor:
+    """
+    Tracks the attempts of the running tasks (one attempt per consumer thread): their progress (heartbeats), their deadline,
+    and the speculative duplicates of the stragglers. When a task has several attempts, the first one to claim the load wins, while the others are cancelled.
+    """
+
+    def __init__(
+            self,
+            stall_timeout_in_seconds: int,
+            task_deadline_in_seconds: int,
+            should_speculate: bool,
+            speculation_min_elapsed_in_seconds: int,
+            speculation_slowness_factor: float
+    ) -> None:
+        self.stall_timeout_in_seconds = stall_timeout_in_seconds
+        self.task_deadline_in_seconds = task_deadline_in_seconds
+        self.should_speculate = should_speculate
+        self.speculation_min_elapsed_in_seconds = speculation_min_elapsed_in_seconds
+        self.speculation_slowness_factor = speculation_slowness_factor
+
+        self._lock = threading.Lock()
+        self._attempts_by_thread: Dict[int, TaskAttempt] = {}
+        # Tasks (by identity) whose load has been claimed by one of their attempts. Kept until all the attempts of the task have ended.
+        self._claimed_tasks: Set[int] = set()
+        self._durations_by_index: Dict[str, List[float]] = {}
+
+    def start_attempt(self, task: Task, is_speculative: bool = False) -> None:
+        now = time.monotonic()
+
+        with self._lock:
+            attempt = TaskAttempt(task, is_speculative, now)
+            self._attempts_by_thread[threading.get_ident()] = attempt
+
+            # The original attempt might have finished in the meantime (since the task has been picked as a straggler).
+            if is_speculative and (id(task) in self._claimed_tasks or len(self._get_attempts_of_task(task)) == 1):
+                attempt.cancellation = TaskAttemptCancelledError(task)
+
+    def report_progress(self, stage: str, num_records_in_stage: int) -> None:
+        """
+        Heartbeat of the current attempt. Raises if the attempt has been cancelled in the meantime.
+        """
+        now = time.monotonic()
+
+        with self._lock:
+            attempt = self._attempts_by_thread[threading.get_ident()]
+
+            if attempt.stage != stage:
+                attempt.stage = stage
+                attempt.stage_started_on = now
+
+            attempt.num_records_in_stage = num_records_in_stage
+            attempt.latest_progress_on = now
+
+            if attempt.cancellation is not None:
+                raise attempt.cancellation
+
+    def claim(self) -> None:
+        """
+        Claims the load of the task, on behalf of the current attempt. The other attempts of the task (if any) are cancelled.
+        Raises if another attempt has claimed the load first (or if the current attempt has been cancelled).
+        """
+        with self._lock:
+            attempt = self._attempts_by_thread[threading.get_ident()]
+
+            if attempt.cancellation is not None:
+                raise attempt.cancellation
+            if id(attempt.task) in self._claimed_tasks:
+                raise TaskAttemptCancelledError(attempt.task)
+
+            self._claimed_tasks.add(id(attempt.task))
+            attempt.has_claimed = True
+
+            for other in self._get_attempts_of_task(attempt.task):
+                if other is not attempt:
+                    other.cancellation = TaskAttemptCancelledError(attempt.task)
+
+    def end_attempt(self, has_succeeded: bool) -> bool:
+        """
+        Ends the attempt of the current thread. Returns whether the outcome of the attempt is the outcome of the task:
+        that is, if the attempt has claimed the load, or if there's no other attempt (still running) which could do so.
+        """
+        now = time.monotonic()
+
+        with self._lock:
+            attempt = self._attempts_by_thread.pop(threading.get_ident())
+            task = attempt.task
+            is_last = not self._get_attempts_of_task(task)
+
+            if is_last:
+                self._claimed_tasks.discard(id(task))
+            if has_succeeded and attempt.has_claimed:
+                durations = self._durations_by_index.setdefault(task.index_name, [])
+                durations.append(now - attempt.started_on)
+                del durations[:-MAX_NUM_DURATIONS_PER_INDEX]
+
+            return attempt.has_claimed or is_last
+
+    def pick_straggler(self) -> Optional[Task]:
+        """
+        Picks the slowest running task (if it's slow enough, with respect to the finished tasks of the same index) for a speculative duplicate.
+        Each task gets at most one duplicate.
+        """
+        if not self.should_speculate:
+            return None
+
+        now = time.monotonic()
+
+        with self._lock:
+            candidates: List[TaskAttempt] = []
+
+            for attempt in self._attempts_by_thread.values():
+                if not self._is_speculation_candidate(attempt):
+                    continue
+                if now - attempt.started_on >= self._get_straggling_threshold(attempt.task.index_name):
+                    candidates.append(attempt)
+
+            if not candidates:
+                return None
+
+            straggler = min(candidates, key=lambda attempt: attempt.started_on)
+            straggler.has_speculative_duplicate = True
+
+        logging.info(f"Task {straggler.task} is straggling ({now - straggler.started_on:.0f} seconds). Will run a speculative duplicate.")
+        return straggler.task
+
+    def may_pick_straggler_later(self) -> bool:
+        """
+        Whether there are running tasks which might become stragglers (thus, idle consumers should wait, instead of exiting).
+        """
+        if not self.should_speculate:
+            return False
+
+        with self._lock:
+            return any(self._is_speculation_candidate(attempt) for attempt in self._attempts_by_thread.values())
+
+    def _is_speculation_candidate(self, attempt: TaskAttempt) -> bool:
+        if attempt.is_speculative or attempt.has_speculative_duplicate or attempt.cancellation is not None:
+            return False
+        return id(attempt.task) not in self._claimed_tasks
+
+    def _get_straggling_threshold(self, index_name: str) -> float:
+        durations = self._durations_by_index.get(index_name)
+        if not durations:
+            return self.speculation_min_elapsed_in_seconds
+
+        return max(self.speculation_min_elapsed_in_seconds, self.speculation_slowness_factor * statistics.median(durations))
+
+    def check(self) -> None:
+        """
+        Called periodically (by a watchdog): reports the progress of the running attempts, warns about stalled ones,
+        and cancels the ones which have exceeded the deadline.
+        """
+        now = time.monotonic()
+
+        with self._lock:
+            attempts = list(self._attempts_by_thread.values())
+
+            for attempt in attempts:
+                # Attempts which have claimed the load are not cancelled anymore.
+                if attempt.has_claimed or attempt.cancellation is not None:
+                    continue
+
+                if self.task_deadline_in_seconds and now - attempt.started_on >= self.task_deadline_in_seconds:
+                    logging.error(f"Task {attempt.task} has exceeded its deadline. Will cancel it.")
+                    attempt.cancellation = TaskDeadlineExceededError(attempt.task, self.task_deadline_in_seconds)
+
+        for attempt in attempts:
+            kind = "speculative attempt" if attempt.is_speculative else "attempt"
+            logging.info(
+                f"Task {attempt.task} ({kind}): stage = {attempt.stage or 'starting'}, records = {attempt.num_records_in_stage}, "
+                f"{attempt.get_records_per_second(now):.0f} records / second, running for {now - attempt.started_on:.0f} seconds."
+            )
+
+            idle = now - attempt.latest_progress_on
+            if idle >= self.stall_timeout_in_seconds:
+                logging.warning(f"Task {attempt.task} has made no progress for {idle:.0f} seconds (stalled?).")
+
+    def _get_attempts_of_task(self, task: Task) -> List[TaskAttempt]:
+        return [attempt for attempt in self._attempts_by_thread.values() if attempt.task is task]
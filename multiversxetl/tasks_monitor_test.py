@@ -0,0 +1,146 @@
+import threading
+from typing import List
+
+import pytest
+
+from multiversxetl.errors import (TaskAttemptCancelledError,
+                                  TaskDeadlineExceededError)
+from multiversxetl.task import Task
+from multiversxetl.tasks_monitor import TasksMonitor
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def create_monitor(monkeypatch: pytest.MonkeyPatch, clock: Clock, task_deadline_in_seconds: int = 0) -> TasksMonitor:
+    monkeypatch.setattr("multiversxetl.tasks_monitor.time.monotonic", clock)
+
+    return TasksMonitor(
+        stall_timeout_in_seconds=60,
+        task_deadline_in_seconds=task_deadline_in_seconds,
+        should_speculate=True,
+        speculation_min_elapsed_in_seconds=10,
+        speculation_slowness_factor=2
+    )
+
+
+def test_pick_straggler(monkeypatch: pytest.MonkeyPatch):
+    clock = Clock()
+    monitor = create_monitor(monkeypatch, clock)
+
+    # A finished task of the same index (duration = 20 seconds).
+    finished_task = Task("dataset", "tags", 0, 100)
+    monitor.start_attempt(finished_task)
+    clock.now = 20
+    monitor.claim()
+    assert monitor.end_attempt(has_succeeded=True)
+
+    task = Task("dataset", "tags", 100, 200)
+    monitor.start_attempt(task)
+
+    clock.now = 50
+    assert monitor.pick_straggler() is None
+    assert monitor.may_pick_straggler_later()
+
+    clock.now = 61
+    assert monitor.pick_straggler() is task
+
+    # At most one duplicate per task.
+    assert monitor.pick_straggler() is None
+    assert not monitor.may_pick_straggler_later()
+
+
+def test_deadline(monkeypatch: pytest.MonkeyPatch):
+    clock = Clock()
+    monitor = create_monitor(monkeypatch, clock, task_deadline_in_seconds=100)
+
+    monitor.start_attempt(Task("dataset", "tags", 0, 100))
+    monitor.report_progress("extract", 1000)
+
+    clock.now = 101
+    monitor.check()
+
+    with pytest.raises(TaskDeadlineExceededError):
+        monitor.report_progress("extract", 2000)
+
+    # No other attempt of the task, thus its failure is the failure of the task.
+    assert monitor.end_attempt(has_succeeded=False)
+
+
+def test_first_attempt_to_claim_wins(monkeypatch: pytest.MonkeyPatch):
+    clock = Clock()
+    monitor = create_monitor(monkeypatch, clock)
+    task = Task("dataset", "tags", 0, 100)
+    outcomes: List[str] = []
+
+    monitor.start_attempt(task)
+    clock.now = 11
+    assert monitor.pick_straggler() is task
+
+    def run_speculative_attempt():
+        monitor.start_attempt(task, is_speculative=True)
+        monitor.claim()
+        outcomes.append(f"speculative: {monitor.end_attempt(has_succeeded=True)}")
+
+    thread = threading.Thread(target=run_speculative_attempt)
+    thread.start()
+    thread.join()
+
+    with pytest.raises(TaskAttemptCancelledError):
+        monitor.report_progress("transform", 10)
+
+    # The outcome of the cancelled attempt isn't the outcome of the task.
+    outcomes.append(f"original: {monitor.end_attempt(has_succeeded=False)}")
+    assert outcomes == ["speculative: True", "original: True"]
+
+
+def test_failure_of_an_attempt_is_ignored_while_another_one_runs(monkeypatch: pytest.MonkeyPatch):
+    clock = Clock()
+    monitor = create_monitor(monkeypatch, clock)
+    task = Task("dataset", "tags", 0, 100)
+    speculative_has_started = threading.Event()
+    original_has_ended = threading.Event()
+    outcomes: List[bool] = []
+
+    monitor.start_attempt(task)
+    clock.now = 11
+    monitor.pick_straggler()
+
+    def run_speculative_attempt():
+        monitor.start_attempt(task, is_speculative=True)
+        speculative_has_started.set()
+        original_has_ended.wait()
+        outcomes.append(monitor.end_attempt(has_succeeded=False))
+
+    thread = threading.Thread(target=run_speculative_attempt)
+    thread.start()
+    speculative_has_started.wait()
+
+    outcomes.append(monitor.end_attempt(has_succeeded=False))
+    original_has_ended.set()
+    thread.join()
+
+    # Only the last failed attempt reports the failure.
+    assert outcomes == [False, True]
+
+
+def test_speculative_attempt_is_cancelled_if_original_has_ended(monkeypatch: pytest.MonkeyPatch):
+    clock = Clock()
+    monitor = create_monitor(monkeypatch, clock)
+    task = Task("dataset", "tags", 0, 100)
+
+    monitor.start_attempt(task)
+    clock.now = 11
+    monitor.pick_straggler()
+    monitor.claim()
+    monitor.end_attempt(has_succeeded=True)
+
+    monitor.start_attempt(task, is_speculative=True)
+
+    with pytest.raises(TaskAttemptCancelledError):
+        monitor.report_progress("extract", 0)
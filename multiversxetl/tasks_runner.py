@@ -1,18 +1,44 @@
+import contextlib
+import copy
+import itertools
 import json
 import logging
+import shutil
+import threading
 from pathlib import Path
-from typing import Any, Dict, Iterable, Optional, Protocol
+from typing import (Any, Callable, ContextManager, Dict, Iterable, List,
+                    Optional, Protocol, Tuple)
 
+from multiversxetl.constants import SCAN_BATCH_SIZE
+from multiversxetl.errors import CombinedLoadError, TaskAttemptCancelledError
+from multiversxetl.external_sort import merge_sorted_files, sort_lines
+from multiversxetl.extraction_cache import ExtractionCache
+from multiversxetl.load_staging import LoadStager
+from multiversxetl.loaded_intervals import (ContentDigest,
+                                            LoadedIntervalsRegistry)
+from multiversxetl.profiler import SamplingProfiler
 from multiversxetl.task import Task
+from multiversxetl.tasks_monitor import TasksMonitor
 from multiversxetl.transformers import TransformersRegistry
 
 
 class IIndexer(Protocol):
-    def get_records(self, index_name: str, start_timestamp: Optional[int] = None, end_timestamp: Optional[int] = None) -> Iterable[Dict[str, Any]]: ...
+    def get_records_batches(
+        self,
+        index_name: str,
+        start_timestamp: Optional[int] = None,
+        end_timestamp: Optional[int] = None,
+        point_in_time_id: Optional[str] = None,
+        slice_id: Optional[int] = None,
+        num_slices: Optional[int] = None
+    ) -> Iterable[List[Dict[str, Any]]]: ...
 
 
 class IBqClient(Protocol):
-    def load_data(self, bq_dataset: str, table_name: str, schema_path: Path, data_path: Path): ...
+    def load_data(self, bq_dataset: str, table_name: str, schema_path: Path, data_path: Path, partition: Optional[str] = None): ...
+    def load_data_from_uri(self, bq_dataset: str, table_name: str, schema_path: Path, source_uri: str, partition: Optional[str] = None): ...
+    def delete_in_interval(self, bq_dataset: str, table: str, start_timestamp: int, end_timestamp: int) -> None: ...
+    def get_num_records_in_interval(self, bq_dataset: str, table: str, start_timestamp: int, end_timestamp: int) -> int: ...
 
 
 class IFileStorage(Protocol):
@@ -29,47 +55,204 @@ class TasksRunner:
             bq_client: IBqClient,
             indexer: IIndexer,
             file_storage: IFileStorage,
-            schema_folder: Path
+            schema_folder: Path,
+            loaded_intervals: Optional[LoadedIntervalsRegistry] = None,
+            max_num_records_per_coalesced_task: int = 0,
+            max_num_tasks_per_combined_load: int = 100,
+            profiler: Optional[SamplingProfiler] = None,
+            extraction_cache: Optional[ExtractionCache] = None,
+            clustering_field: str = "",
+            clustering_fields_by_table: Optional[Dict[str, str]] = None,
+            max_num_records_to_sort_in_memory: int = 500000,
+            load_stager: Optional[LoadStager] = None,
+            monitor: Optional[TasksMonitor] = None
     ) -> None:
         self.bq_client = bq_client
         self.indexer = indexer
         self.file_storage = file_storage
         self.schema_folder = schema_folder
-        self.transformers_registry = TransformersRegistry()
+        self.loaded_intervals = loaded_intervals
+        self.transformers_registry = TransformersRegistry(schema_folder)
+        self.max_num_records_per_coalesced_task = max_num_records_per_coalesced_task
+        self.max_num_tasks_per_combined_load = max_num_tasks_per_combined_load
+        self.profiler = profiler
+        self.extraction_cache = extraction_cache
+        # If set, records are extracted from the cache (when available), instead of the indexer.
+        self.should_extract_from_cache = False
+        # If set, the records of each task are sorted by this field (the clustering key of the tables), before being loaded.
+        self.clustering_field = clustering_field
+        # Overrides "clustering_field", for some tables (an empty string disables the sorting).
+        self.clustering_fields_by_table = clustering_fields_by_table or {}
+        self.max_num_records_to_sort_in_memory = max_num_records_to_sort_in_memory
+        # If set, large files are staged (uploaded in parallel shards) before being loaded.
+        self.load_stager = load_stager
+        self.monitor = monitor
 
-    def run(self, task: Task) -> None:
-        self._do_extract(task)
-        self._do_transform(task)
-        self._do_load(task)
+        self._coalescing_lock = threading.Lock()
+        # Tasks whose (transformed) data waits for a combined load, by table.
+        self._coalesced_tasks: Dict[str, List[Task]] = {}
+
+    def run(self, task: Task, is_speculative: bool = False) -> List[Task]:
+        """
+        Returns the tasks whose data has been loaded: usually, the task itself. If the load of the task is deferred (coalesced with other tasks),
+        returns an empty list - or, when a combined load is performed, all the tasks within that load.
+
+        If a monitor is set, the attempt reports its progress to it. A speculative attempt works on a duplicate of the task (with its own files).
+        Of all the attempts of a task, only the first one to claim the load actually loads the data; the others return an empty list.
+        """
+        if self.monitor is None:
+            return self._run(task)
+
+        working_task = self._create_speculative_duplicate(task) if is_speculative else task
+        self.monitor.start_attempt(task, is_speculative)
+
+        try:
+            loaded_tasks = self._run(working_task)
+        except TaskAttemptCancelledError as error:
+            self.monitor.end_attempt(has_succeeded=False)
+            self._discard_files(working_task)
+            logging.info(f"Attempt of {working_task} has been cancelled: {error}")
+            return []
+        except Exception:
+            if self.monitor.end_attempt(has_succeeded=False):
+                raise
+
+            self._discard_files(working_task)
+            logging.warning(f"Attempt of {working_task} has failed, but another attempt of the same task is still running.", exc_info=True)
+            return []
+
+        self.monitor.end_attempt(has_succeeded=True)
+
+        if working_task is task:
+            return loaded_tasks
+
+        # The speculative duplicate has won.
+        task.num_records = working_task.num_records
+        task.num_bytes = working_task.num_bytes
+        task.content_digest = working_task.content_digest
+        return [task]
+
+    def _run(self, task: Task) -> List[Task]:
+        with self._profile(task, "extract"):
+            self._do_extract(task)
+
+        if task.num_records == 0:
+            self.file_storage.remove_extracted_file(task.get_filename_friendly_description())
+            self._claim()
+            self._do_skip_empty_load(task)
+            return [task]
+
+        with self._profile(task, "transform"):
+            self._do_transform(task)
 
         self.file_storage.remove_extracted_file(task.get_filename_friendly_description())
+        self._claim()
+
+        with self._profile(task, "load"):
+            if self._should_coalesce(task):
+                return self._do_coalesce(task)
+
+            if task.should_replace_existing_data:
+                self._do_replace(task)
+            else:
+                self._do_load(task)
+
         self.file_storage.remove_transformed_file(task.get_filename_friendly_description())
+        return [task]
+
+    def _profile(self, task: Task, stage_name: str) -> ContextManager[None]:
+        if self.profiler is None:
+            return contextlib.nullcontext()
+        return self.profiler.stage(task, stage_name)
+
+    def _create_speculative_duplicate(self, task: Task) -> Task:
+        duplicate = copy.copy(task)
+        duplicate.is_speculative_duplicate = True
+        return duplicate
+
+    def _report_progress(self, stage_name: str, num_records: int) -> None:
+        if self.monitor:
+            self.monitor.report_progress(stage_name, num_records)
+
+    def _claim(self) -> None:
+        # Past this point, the attempt has effects in BigQuery.
+        if self.monitor:
+            self.monitor.claim()
+
+    def _discard_files(self, task: Task) -> None:
+        pretty_name = task.get_filename_friendly_description()
+        self.file_storage.remove_extracted_file(pretty_name)
+        self.file_storage.remove_transformed_file(pretty_name)
+        self._get_unsorted_path(task).unlink(missing_ok=True)
+
+    def flush_coalesced_loads(self) -> List[Task]:
+        """
+        Performs the combined loads of all the tasks still waiting to be loaded. Returns the tasks whose data has been loaded.
+        """
+        with self._coalescing_lock:
+            batches = list(self._coalesced_tasks.values())
+            self._coalesced_tasks.clear()
+
+        loaded_tasks: List[Task] = []
+
+        for batch in batches:
+            self._do_combined_load(batch)
+            loaded_tasks.extend(batch)
+
+        return loaded_tasks
 
     def _do_extract(self, task: Task) -> None:
         logging.debug(f"_do_extract: {task}")
 
-        records = self._extract_records_from_indexer(task)
-        self._write_extracted_records_to_file(task, records)
+        if self.should_extract_from_cache and self._restore_extracted_records_from_cache(task):
+            return
+
+        batches = self._extract_records_from_indexer(task)
+        self._write_extracted_records_to_file(task, batches)
+
+        if self.extraction_cache:
+            self.extraction_cache.store(task, self.file_storage.get_extracted_path(task.get_filename_friendly_description()))
+
+    def _restore_extracted_records_from_cache(self, task: Task) -> bool:
+        assert self.extraction_cache is not None
 
-    def _extract_records_from_indexer(self, task: Task) -> Iterable[Dict[str, Any]]:
-        return self.indexer.get_records(
+        restored = self.extraction_cache.restore(task, self.file_storage.get_extracted_path(task.get_filename_friendly_description()))
+        if restored is None:
+            logging.warning(f"Records of {task} are not cached. Will extract them from the indexer.")
+            return False
+
+        task.num_records, task.num_bytes = restored
+        return True
+
+    def _extract_records_from_indexer(self, task: Task) -> Iterable[List[Dict[str, Any]]]:
+        return self.indexer.get_records_batches(
             task.index_name,
             task.start_timestamp,
-            task.end_timestamp
+            task.end_timestamp,
+            task.point_in_time_id,
+            task.slice_id,
+            task.num_slices
         )
 
-    def _write_extracted_records_to_file(self, task: Task, records: Iterable[Dict[str, Any]]) -> None:
+    def _write_extracted_records_to_file(self, task: Task, batches: Iterable[List[Dict[str, Any]]]) -> None:
         filename = self.file_storage.get_extracted_path(task.get_filename_friendly_description())
         num_written = 0
+        num_bytes = 0
 
         with open(filename, "w") as file:
-            for record in records:
-                as_json = self._jsonify_extracted_record(record)
-                file.write(f"{as_json}\n")
+            for batch in batches:
+                lines = [f"{self._jsonify_extracted_record(record)}\n" for record in batch]
+                num_bytes += file.write("".join(lines))
+
+                num_written += len(batch)
+                logging.debug(f"Written {num_written} records to {filename}")
+                self._report_progress("extract", num_written)
 
-                num_written += 1
-                if num_written % 1000 == 0:
-                    logging.debug(f"Written {num_written} records to {filename}")
+        task.num_records = num_written
+        task.num_bytes = num_bytes
+
+        if task.is_sliced():
+            logging.info(f"Extracted {num_written} records for {task}.")
 
     def _jsonify_extracted_record(self, record: Dict[str, Any]) -> str:
         data = record["_source"]
@@ -83,22 +266,180 @@ class TasksRunner:
         transformer = self.transformers_registry.get_transformer(task.index_name)
         input_filename = self.file_storage.get_extracted_path(task.get_filename_friendly_description())
         output_filename = self.file_storage.get_transformed_path(task.get_filename_friendly_description())
+        should_sort = self._should_sort(task)
+        unsorted_filename = self._get_unsorted_path(task) if should_sort else output_filename
+
+        digest = ContentDigest()
+        num_transformed = 0
 
         with open(input_filename) as file:
-            with open(output_filename, "w") as output_file:
-                for line in file:
-                    transformed_line = transformer.transform_json(line)
-                    output_file.write(transformed_line + "\n")
+            with open(unsorted_filename, "w") as output_file:
+                while True:
+                    lines = list(itertools.islice(file, SCAN_BATCH_SIZE))
+                    if not lines:
+                        break
+
+                    transformed_lines = transformer.transform_json_batch(lines)
+                    output_file.write("".join(f"{line}\n" for line in transformed_lines))
+
+                    for line in transformed_lines:
+                        digest.add(line)
+
+                    num_transformed += len(lines)
+                    self._report_progress("transform", num_transformed)
+
+        task.content_digest = digest.hexdigest()
+
+        if should_sort:
+            sort_key = self._create_sort_key(self._get_clustering_field(task.index_name))
+            sort_lines(unsorted_filename, output_filename, sort_key, self.max_num_records_to_sort_in_memory)
+            unsorted_filename.unlink()
+
+    def _get_unsorted_path(self, task: Task) -> Path:
+        transformed_path = self.file_storage.get_transformed_path(task.get_filename_friendly_description())
+        return transformed_path.with_name(f"{transformed_path.name}.unsorted")
+
+    def _should_sort(self, task: Task) -> bool:
+        # Records of indices without timestamp are not sorted.
+        return bool(self._get_clustering_field(task.index_name)) and task.start_timestamp is not None
+
+    def _get_clustering_field(self, index_name: str) -> str:
+        return self.clustering_fields_by_table.get(index_name, self.clustering_field)
+
+    @staticmethod
+    def _create_sort_key(clustering_field: str) -> Callable[[str], Tuple[bool, Any]]:
+        def get_sort_key(line: str) -> Tuple[bool, Any]:
+            value = json.loads(line).get(clustering_field)
+            # Records without a value come last (they are only compared among themselves). Other values are compared as they are (a single type, per field).
+            return (value is None, value if value is not None else "")
+
+        return get_sort_key
 
     def _do_load(self, task: Task) -> None:
         logging.debug(f"_do_load: {task}")
 
         file_path = self.file_storage.get_load_path(task.get_filename_friendly_description())
-        schema_path = self.schema_folder / f"{task.index_name}.json"
+        self._load_file(task.bq_dataset, task.index_name, file_path, task.get_filename_friendly_description(), task.bq_partition)
+
+        if self.loaded_intervals:
+            self.loaded_intervals.record(task)
+
+    def _load_file(self, bq_dataset: str, table_name: str, file_path: Path, pretty_name: str, partition: Optional[str] = None) -> None:
+        schema_path = self.schema_folder / f"{table_name}.json"
+
+        if self.load_stager is None or not self.load_stager.should_stage(file_path):
+            self.bq_client.load_data(
+                bq_dataset=bq_dataset,
+                table_name=table_name,
+                schema_path=schema_path,
+                data_path=file_path,
+                partition=partition
+            )
+            return
 
-        self.bq_client.load_data(
-            bq_dataset=task.bq_dataset,
-            table_name=task.index_name,
+        staging_prefix = f"{bq_dataset}/{pretty_name}"
+        source_uri = self.load_stager.stage(file_path, staging_prefix)
+
+        self.bq_client.load_data_from_uri(
+            bq_dataset=bq_dataset,
+            table_name=table_name,
             schema_path=schema_path,
-            data_path=file_path
+            source_uri=source_uri,
+            partition=partition
         )
+
+        self.load_stager.unstage(staging_prefix)
+
+    def _do_skip_empty_load(self, task: Task) -> None:
+        """
+        Nothing to load. Though, eventual data previously loaded for the interval (e.g. by an interrupted run) is removed.
+        """
+        logging.debug(f"_do_skip_empty_load: {task}")
+
+        if task.should_replace_existing_data:
+            assert task.start_timestamp is not None and task.end_timestamp is not None
+            self.bq_client.delete_in_interval(task.bq_dataset, task.index_name, task.start_timestamp, task.end_timestamp)
+
+        task.content_digest = ContentDigest().hexdigest()
+
+        if self.loaded_intervals:
+            self.loaded_intervals.record(task)
+
+    def _should_coalesce(self, task: Task) -> bool:
+        # Tasks which replace data (e.g. overwrite a partition), and speculative duplicates, are loaded on their own.
+        if task.should_replace_existing_data or task.bq_partition or task.is_speculative_duplicate:
+            return False
+        return task.num_records <= self.max_num_records_per_coalesced_task
+
+    def _do_coalesce(self, task: Task) -> List[Task]:
+        table_id = f"{task.bq_dataset}.{task.index_name}"
+
+        with self._coalescing_lock:
+            batch = self._coalesced_tasks.setdefault(table_id, [])
+            batch.append(task)
+
+            if len(batch) < self.max_num_tasks_per_combined_load:
+                logging.debug(f"Load of {task} is deferred, {len(batch)} tasks are waiting for a combined load into {table_id}.")
+                return []
+
+            del self._coalesced_tasks[table_id]
+
+        self._do_combined_load(batch)
+        return batch
+
+    def _do_combined_load(self, tasks: List[Task]) -> None:
+        first_task = tasks[0]
+        logging.debug(f"_do_combined_load: {len(tasks)} tasks, starting with {first_task}")
+
+        combined_pretty_name = f"{first_task.get_filename_friendly_description()}_combined"
+        combined_path = self.file_storage.get_transformed_path(combined_pretty_name)
+
+        load_paths = [self.file_storage.get_load_path(task.get_filename_friendly_description()) for task in tasks]
+
+        try:
+            if all(self._should_sort(task) for task in tasks):
+                # Files of the tasks are already sorted, but the tasks themselves come in no particular order (see "TasksDashboard").
+                merge_sorted_files(load_paths, combined_path, self._create_sort_key(self._get_clustering_field(first_task.index_name)))
+            else:
+                with open(combined_path, "wb") as combined_file:
+                    for load_path in load_paths:
+                        with open(load_path, "rb") as file:
+                            shutil.copyfileobj(file, combined_file)
+
+            self._load_file(first_task.bq_dataset, first_task.index_name, combined_path, combined_pretty_name)
+        except Exception as error:
+            raise CombinedLoadError(tasks, error) from error
+        finally:
+            self.file_storage.remove_transformed_file(combined_pretty_name)
+
+        for task in tasks:
+            if self.loaded_intervals:
+                self.loaded_intervals.record(task)
+
+            self.file_storage.remove_transformed_file(task.get_filename_friendly_description())
+
+    def _do_replace(self, task: Task) -> None:
+        """
+        The interval of the task might hold data loaded previously (e.g. by an interrupted run).
+        If that data has the same content (and is complete in BigQuery), the load is skipped. Otherwise, the data is deleted, then loaded again.
+        """
+        assert task.start_timestamp is not None and task.end_timestamp is not None
+
+        if self._is_same_content_already_loaded(task):
+            logging.info(f"Content of {task} is unchanged and already loaded. Skipping load.")
+            return
+
+        # Loads into a partition overwrite it, thus there's nothing to delete beforehand.
+        if not task.bq_partition:
+            self.bq_client.delete_in_interval(task.bq_dataset, task.index_name, task.start_timestamp, task.end_timestamp)
+
+        self._do_load(task)
+
+    def _is_same_content_already_loaded(self, task: Task) -> bool:
+        assert task.start_timestamp is not None and task.end_timestamp is not None
+
+        if not self.loaded_intervals or not self.loaded_intervals.has_same_content(task):
+            return False
+
+        num_records_in_bq = self.bq_client.get_num_records_in_interval(task.bq_dataset, task.index_name, task.start_timestamp, task.end_timestamp)
+        return num_records_in_bq == task.num_records
@@ -0,0 +1,182 @@
+import json
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+from multiversxetl.file_storage import FileStorage
+from multiversxetl.load_staging import LoadStager, LocalStagingStorage
+from multiversxetl.task import Task
+from multiversxetl.tasks_monitor import TasksMonitor
+from multiversxetl.tasks_runner import TasksRunner
+
+
+class IndexerMock:
+    def __init__(self, num_records_by_start_timestamp: Dict[int, int]) -> None:
+        self.num_records_by_start_timestamp = num_records_by_start_timestamp
+
+    def get_records_batches(
+        self,
+        index_name: str,
+        start_timestamp: Optional[int] = None,
+        end_timestamp: Optional[int] = None,
+        point_in_time_id: Optional[str] = None,
+        slice_id: Optional[int] = None,
+        num_slices: Optional[int] = None
+    ) -> Iterable[List[Dict[str, Any]]]:
+        num_records = self.num_records_by_start_timestamp.get(start_timestamp or 0, 0)
+        yield [{"_id": f"{start_timestamp}-{i}", "_source": {"timestamp": start_timestamp}} for i in range(num_records)]
+
+
+class StragglingIndexerMock:
+    """
+    The first extraction stalls after its first batch, until released.
+    """
+
+    def __init__(self) -> None:
+        self.has_stalled = threading.Event()
+        self.release = threading.Event()
+        self.num_calls = 0
+
+    def get_records_batches(
+        self,
+        index_name: str,
+        start_timestamp: Optional[int] = None,
+        end_timestamp: Optional[int] = None,
+        point_in_time_id: Optional[str] = None,
+        slice_id: Optional[int] = None,
+        num_slices: Optional[int] = None
+    ) -> Iterable[List[Dict[str, Any]]]:
+        self.num_calls += 1
+        is_first_call = self.num_calls == 1
+
+        for batch_index in range(2):
+            if is_first_call and batch_index == 1:
+                self.has_stalled.set()
+                self.release.wait()
+
+            yield [{"_id": f"{batch_index}-{i}", "_source": {"timestamp": start_timestamp}} for i in range(10)]
+
+
+class BqClientMock:
+    def __init__(self) -> None:
+        self.loaded_lines: List[List[str]] = []
+        self.loaded_uris: List[str] = []
+
+    def load_data(self, bq_dataset: str, table_name: str, schema_path: Path, data_path: Path, partition: Optional[str] = None):
+        self.loaded_lines.append(data_path.read_text().splitlines())
+
+    def load_data_from_uri(self, bq_dataset: str, table_name: str, schema_path: Path, source_uri: str, partition: Optional[str] = None):
+        # Staged in a local folder (see "LocalStagingStorage").
+        shards = sorted(Path(source_uri).parent.glob(Path(source_uri).name))
+        self.loaded_lines.append([line for shard in shards for line in shard.read_text().splitlines()])
+        self.loaded_uris.append(source_uri)
+
+    def delete_in_interval(self, bq_dataset: str, table: str, start_timestamp: int, end_timestamp: int) -> None:
+        pass
+
+    def get_num_records_in_interval(self, bq_dataset: str, table: str, start_timestamp: int, end_timestamp: int) -> int:
+        return 0
+
+
+def test_run_skips_empty_loads_and_coalesces_small_tasks(tmp_path: Path):
+    bq_client = BqClientMock()
+    indexer = IndexerMock({0: 2, 100: 0, 200: 1, 300: 50})
+    runner = TasksRunner(bq_client, indexer, FileStorage(tmp_path), tmp_path, max_num_records_per_coalesced_task=10, max_num_tasks_per_combined_load=3)
+
+    tasks = [Task("dataset", "tags", start, start + 100) for start in [0, 100, 200, 300, 400]]
+
+    # Small tasks are deferred, empty tasks are not loaded at all.
+    assert runner.run(tasks[0]) == []
+    assert runner.run(tasks[1]) == [tasks[1]]
+    assert runner.run(tasks[2]) == []
+    assert bq_client.loaded_lines == []
+
+    # Large tasks are loaded on their own.
+    assert runner.run(tasks[3]) == [tasks[3]]
+    assert len(bq_client.loaded_lines) == 1
+    assert len(bq_client.loaded_lines[0]) == 50
+
+    assert runner.run(tasks[4]) == [tasks[4]]
+    assert runner.flush_coalesced_loads() == [tasks[0], tasks[2]]
+    assert len(bq_client.loaded_lines) == 2
+    assert len(bq_client.loaded_lines[1]) == 3
+
+    assert runner.flush_coalesced_loads() == []
+    assert list((tmp_path / "transformed").iterdir()) == []
+    assert list((tmp_path / "extracted").iterdir()) == []
+
+
+def test_combined_loads_are_sorted(tmp_path: Path):
+    bq_client = BqClientMock()
+    indexer = IndexerMock({0: 2, 100: 2, 200: 2})
+    runner = TasksRunner(bq_client, indexer, FileStorage(tmp_path), tmp_path, max_num_records_per_coalesced_task=10, clustering_field="timestamp")
+
+    # Tasks are picked in no particular order.
+    for start in [200, 0, 100]:
+        assert runner.run(Task("dataset", "tags", start, start + 100)) == []
+
+    assert len(runner.flush_coalesced_loads()) == 3
+    assert [json.loads(line)["timestamp"] for line in bq_client.loaded_lines[0]] == [0, 0, 100, 100, 200, 200]
+
+
+def test_sort_key_of_clustering_fields():
+    get_sort_key = TasksRunner._create_sort_key("receiver")
+    lines = ['{"receiver": "erd1b"}', '{"receiver": null}', '{"receiver": ""}', '{}', '{"receiver": "erd1a"}']
+
+    # Empty strings are regular values, records without a value come last.
+    assert sorted(lines, key=get_sort_key)[:3] == ['{"receiver": ""}', '{"receiver": "erd1a"}', '{"receiver": "erd1b"}']
+
+
+def test_clustering_field_by_table(tmp_path: Path):
+    runner = TasksRunner(BqClientMock(), IndexerMock({}), FileStorage(tmp_path), tmp_path, clustering_field="timestamp", clustering_fields_by_table={"tokens": "identifier", "rounds": ""})
+
+    assert runner._get_clustering_field("blocks") == "timestamp"
+    assert runner._get_clustering_field("tokens") == "identifier"
+    assert runner._should_sort(Task("dataset", "blocks", 0, 100))
+    assert not runner._should_sort(Task("dataset", "rounds", 0, 100))
+    assert not runner._should_sort(Task("dataset", "blocks"))
+
+
+def test_run_stages_large_loads(tmp_path: Path):
+    bq_client = BqClientMock()
+    indexer = IndexerMock({0: 1, 100: 500})
+    staging_folder = tmp_path / "staging"
+    load_stager = LoadStager(LocalStagingStorage(staging_folder), min_num_bytes=1024, shard_size_in_bytes=4096, num_parallel_uploads=4)
+    runner = TasksRunner(bq_client, indexer, FileStorage(tmp_path / "workspace"), tmp_path, load_stager=load_stager)
+
+    # Small files are loaded directly.
+    runner.run(Task("dataset", "tags", 0, 100))
+    assert bq_client.loaded_uris == []
+
+    runner.run(Task("dataset", "tags", 100, 200))
+    assert bq_client.loaded_uris == [str(staging_folder / "dataset" / "tags_100_200" / "*")]
+    assert len(bq_client.loaded_lines[1]) == 500
+
+    # Shards are removed after the load.
+    assert [path for path in staging_folder.rglob("*") if path.is_file()] == []
+
+
+def test_run_speculative_duplicate_of_straggler(tmp_path: Path):
+    bq_client = BqClientMock()
+    indexer = StragglingIndexerMock()
+    monitor = TasksMonitor(stall_timeout_in_seconds=60, task_deadline_in_seconds=0, should_speculate=True, speculation_min_elapsed_in_seconds=0, speculation_slowness_factor=2)
+    runner = TasksRunner(bq_client, indexer, FileStorage(tmp_path / "workspace"), tmp_path, monitor=monitor)
+    task = Task("dataset", "tags", 0, 100)
+    loaded_by_original: List[List[Task]] = []
+
+    original = threading.Thread(target=lambda: loaded_by_original.append(runner.run(task)))
+    original.start()
+    indexer.has_stalled.wait()
+
+    assert monitor.pick_straggler() is task
+    assert runner.run(task, is_speculative=True) == [task]
+    assert task.num_records == 20
+
+    # The original attempt notices that it has lost (at its next heartbeat).
+    indexer.release.set()
+    original.join()
+
+    assert loaded_by_original == [[]]
+    assert len(bq_client.loaded_lines) == 1
+    assert list((tmp_path / "workspace" / "transformed").iterdir()) == []
+    assert list((tmp_path / "workspace" / "extracted").iterdir()) == []
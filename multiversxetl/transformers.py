@@ -1,10 +1,16 @@
 
 import json
-from typing import Any, Dict
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+Converter = Callable[[Any], Any]
+Projection = Callable[[Dict[str, Any]], Dict[str, Any]]
 
 
 class TransformersRegistry:
-    def __init__(self):
+    def __init__(self, schema_folder: Optional[Path] = None):
+        self.schema_folder = schema_folder
         self.trivial_transformer = Transformer()
         self.transformers: Dict[str, Transformer] = {
             "accounts": AccountsTransformer(),
@@ -13,8 +19,29 @@ class TransformersRegistry:
             "events": EventsTransformer(),
         }
 
+        self._lock = threading.Lock()
+        self._schema_transformers: Dict[str, Transformer] = {}
+
     def get_transformer(self, index_name: str) -> 'Transformer':
-        return self.transformers.get(index_name, self.trivial_transformer)
+        transformer = self.transformers.get(index_name, self.trivial_transformer)
+
+        if self.schema_folder is None:
+            return transformer
+
+        schema_path = self.schema_folder / f"{index_name}.json"
+        if not schema_path.exists():
+            return transformer
+
+        # Projections are compiled once per index, then cached.
+        with self._lock:
+            schema_transformer = self._schema_transformers.get(index_name)
+
+            if schema_transformer is None:
+                schema = json.loads(schema_path.read_text())
+                schema_transformer = SchemaTransformer(transformer, schema)
+                self._schema_transformers[index_name] = schema_transformer
+
+            return schema_transformer
 
 
 class Transformer:
@@ -24,9 +51,20 @@ class Transformer:
         output = json.dumps(data)
         return output
 
+    def transform_json_batch(self, raw_jsons: List[str]) -> List[str]:
+        records = [json.loads(raw_json) for raw_json in raw_jsons]
+        records = self.transform_batch(records)
+        return [json.dumps(record) for record in records]
+
     def transform(self, data: Dict[str, Any]) -> Dict[str, Any]:
         return data
 
+    def transform_batch(self, records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Transformers can override this, to handle a whole batch at once (e.g. column-wise).
+        """
+        return [self.transform(data) for data in records]
+
 
 class AccountsTransformer(Transformer):
     def transform(self, data: Dict[str, Any]) -> Dict[str, Any]:
@@ -38,6 +76,9 @@ class AccountsTransformer(Transformer):
 
         return data
 
+    def transform_batch(self, records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return _drop_columns_by_prefix(records, ("api_",))
+
 
 class BlocksTransformer(Transformer):
     def transform(self, data: Dict[str, Any]) -> Dict[str, Any]:
@@ -63,6 +104,9 @@ class TokensTransformer(Transformer):
 
         return data
 
+    def transform_batch(self, records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return _drop_columns_by_prefix(records, ("nft_", "api_"))
+
 
 class EventsTransformer(Transformer):
     def transform(self, data: Dict[str, Any]) -> Dict[str, Any]:
@@ -74,3 +118,157 @@ class EventsTransformer(Transformer):
         data["additionalData"] = [data_item if data_item is not None else "" for data_item in additional_data]
 
         return data
+
+    def transform_batch(self, records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        _fill_nulls_in_column(records, "topics", "")
+        _fill_nulls_in_column(records, "additionalData", "")
+        return records
+
+
+def _drop_columns_by_prefix(records: List[Dict[str, Any]], prefixes: Tuple[str, ...]) -> List[Dict[str, Any]]:
+    # Records of a batch usually share the same columns, thus we first collect the columns to drop (for the whole batch).
+    columns = set().union(*records) if records else set()
+    columns_to_drop = [column for column in columns if column.startswith(prefixes)]
+
+    for column in columns_to_drop:
+        for data in records:
+            data.pop(column, None)
+
+    return records
+
+
+def _fill_nulls_in_column(records: List[Dict[str, Any]], column: str, replacement: Any) -> None:
+    for data in records:
+        items = data.get(column)
+
+        if not items:
+            data[column] = []
+        elif None in items:
+            data[column] = [item if item is not None else replacement for item in items]
+
+
+class SchemaTransformer(Transformer):
+    """
+    Applies an (index-specific) transformer, then projects the record onto the BigQuery schema:
+        - fields not in the schema are dropped (at any level of nesting)
+        - scalars are coerced, where BigQuery would otherwise reject them
+        - NULL values in arrays (mode = REPEATED) are replaced (strings) or removed (other types)
+    """
+
+    def __init__(self, inner: Transformer, schema: List[Dict[str, Any]]) -> None:
+        self.inner = inner
+        self.projection = compile_projection(schema)
+
+    def transform(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        data = self.inner.transform(data)
+        return self.projection(data)
+
+    def transform_batch(self, records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        records = self.inner.transform_batch(records)
+        projection = self.projection
+        return [projection(data) for data in records]
+
+
+def compile_projection(fields: List[Dict[str, Any]]) -> Projection:
+    # Fields which do not need any conversion have a "None" converter (thus, we avoid a function call per field, per record).
+    converters: List[Tuple[str, Optional[Converter]]] = [(field["name"], _compile_converter(field)) for field in fields]
+    # BigQuery matches column names case-insensitively, thus fields which differ from the schema only by case are kept (under the name from the schema).
+    converters_by_lowercase_name = {name.lower(): (name, converter) for name, converter in converters}
+
+    def project(data: Dict[str, Any]) -> Dict[str, Any]:
+        output: Dict[str, Any] = {}
+
+        for name, converter in converters:
+            if name not in data:
+                continue
+
+            value = data[name]
+            output[name] = converter(value) if converter else value
+
+        if len(output) == len(data):
+            return output
+
+        # Slow path, only for records with fields not (exactly) matching the schema.
+        for key, value in data.items():
+            if key in output:
+                continue
+
+            match = converters_by_lowercase_name.get(key.lower())
+            if match is None or match[0] in output:
+                continue
+
+            name, converter = match
+            output[name] = converter(value) if converter else value
+
+        return output
+
+    return project
+
+
+def _compile_converter(field: Dict[str, Any]) -> Optional[Converter]:
+    field_type = field.get("type", "STRING")
+    is_repeated = field.get("mode") == "REPEATED"
+
+    if field_type == "RECORD":
+        item_converter = _compile_record_converter(field.get("fields", []))
+    else:
+        item_converter = _SCALAR_CONVERTERS.get(field_type)
+
+    if not is_repeated:
+        return item_converter
+
+    # BigQuery does not support NULL values in arrays (mode = REPEATED).
+    null_replacement = "" if field_type == "STRING" else None
+    return _compile_repeated_converter(item_converter, null_replacement)
+
+
+def _compile_record_converter(fields: List[Dict[str, Any]]) -> Converter:
+    projection = compile_projection(fields)
+
+    def convert(value: Any) -> Any:
+        return projection(value) if isinstance(value, dict) else None
+
+    return convert
+
+
+def _compile_repeated_converter(item_converter: Optional[Converter], null_replacement: Optional[str]) -> Converter:
+    def convert(value: Any) -> Any:
+        if value is None:
+            return []
+
+        items = value if isinstance(value, list) else [value]
+        converted: List[Any] = []
+
+        for item in items:
+            converted_item = item_converter(item) if item_converter and item is not None else item
+
+            # E.g. a NULL item, or a non-object item of a RECORD field.
+            if converted_item is None:
+                if null_replacement is not None:
+                    converted.append(null_replacement)
+                continue
+
+            converted.append(converted_item)
+
+        return converted
+
+    return convert
+
+
+def _convert_to_string(value: Any) -> Any:
+    return value if isinstance(value, str) or value is None else json.dumps(value)
+
+
+def _convert_to_integer(value: Any) -> Any:
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+# Other types (e.g. NUMERIC, FLOAT, TIMESTAMP, BOOLEAN) are parsed by BigQuery, as they come from Elasticsearch.
+_SCALAR_CONVERTERS: Dict[str, Converter] = {
+    "STRING": _convert_to_string,
+    "INTEGER": _convert_to_integer,
+}
@@ -1,4 +1,9 @@
-from multiversxetl.transformers import AccountsTransformer, EventsTransformer
+import copy
+from pathlib import Path
+
+from multiversxetl.transformers import (AccountsTransformer, EventsTransformer,
+                                        SchemaTransformer, TokensTransformer,
+                                        Transformer, TransformersRegistry)
 
 
 def test_accounts_transformer():
@@ -32,3 +37,102 @@ def test_events_transformer():
         "topics": ["foo", "", "bar"],
         "additionalData": ["bar", "", "foo"]
     }
+
+
+def test_schema_transformer():
+    schema = [
+        {"name": "_id", "type": "STRING"},
+        {"name": "nonce", "type": "INTEGER"},
+        {"name": "topics", "type": "STRING", "mode": "REPEATED"},
+        {"name": "values", "type": "NUMERIC", "mode": "REPEATED"},
+        {"name": "shards", "type": "RECORD", "mode": "REPEATED", "fields": [
+            {"name": "shardID", "type": "INTEGER"}
+        ]},
+        {"name": "owner", "type": "RECORD", "fields": [
+            {"name": "address", "type": "STRING"}
+        ]},
+    ]
+
+    transformer = SchemaTransformer(EventsTransformer(), schema)
+
+    transformed = transformer.transform({
+        "_id": "abba",
+        "nonce": 42.0,
+        "topics": ["foo", None],
+        "additionalData": ["bar"],
+        "values": [None, "1"],
+        "shards": [{"shardID": 1, "reserved": "foo"}, None],
+        "owner": {"address": 1, "reserved": "foo"},
+        "api_test": "foobar"
+    })
+
+    assert transformed == {
+        "_id": "abba",
+        "nonce": 42,
+        "topics": ["foo", ""],
+        "values": ["1"],
+        "shards": [{"shardID": 1}],
+        "owner": {"address": "1"},
+    }
+
+
+def test_schema_transformer_skips_non_object_items_of_repeated_records():
+    schema = [
+        {"name": "_id", "type": "STRING"},
+        {"name": "shards", "type": "RECORD", "mode": "REPEATED", "fields": [
+            {"name": "shardID", "type": "INTEGER"}
+        ]},
+    ]
+
+    transformer = SchemaTransformer(Transformer(), schema)
+
+    # BigQuery rejects NULL items in arrays.
+    assert transformer.transform({"_id": "abba", "shards": [{"shardID": 1}, "foo", 42, [], {"shardID": 2}]}) == {"_id": "abba", "shards": [{"shardID": 1}, {"shardID": 2}]}
+    assert transformer.transform({"_id": "abba", "shards": "foo"}) == {"_id": "abba", "shards": []}
+
+
+def test_schema_transformer_matches_field_names_case_insensitively():
+    schema = [
+        {"name": "_id", "type": "STRING"},
+        {"name": "shardId", "type": "INTEGER"},
+        {"name": "owner", "type": "RECORD", "fields": [
+            {"name": "address", "type": "STRING"}
+        ]},
+    ]
+
+    transformer = SchemaTransformer(Transformer(), schema)
+
+    transformed = transformer.transform({
+        "_id": "abba",
+        "shardID": 1.0,
+        "Owner": {"Address": "erd1", "reserved": "foo"},
+        "foo": "bar"
+    })
+
+    assert transformed == {"_id": "abba", "shardId": 1, "owner": {"address": "erd1"}}
+
+    # An exact match has precedence.
+    assert transformer.transform({"_id": "abba", "shardId": 1, "SHARDID": 2}) == {"_id": "abba", "shardId": 1}
+
+
+def test_transformers_registry_uses_schema():
+    registry = TransformersRegistry(Path(__file__).parent.parent / "schema")
+
+    transformer = registry.get_transformer("rating")
+    assert isinstance(transformer, SchemaTransformer)
+    assert registry.get_transformer("rating") is transformer
+    assert transformer.transform({"_id": "abba", "rating": 42, "foo": "bar"}) == {"_id": "abba", "rating": 42}
+
+    assert not isinstance(TransformersRegistry().get_transformer("rating"), SchemaTransformer)
+
+
+def test_transform_batch_is_equivalent_to_transform():
+    records = [
+        {"_id": "a", "topics": ["foo", None], "additionalData": None, "api_test": 1, "nft_test": 2},
+        {"_id": "b", "topics": [], "api_other": 3},
+        {"_id": "c"},
+    ]
+
+    for transformer in [AccountsTransformer(), TokensTransformer(), EventsTransformer()]:
+        expected = [transformer.transform(copy.deepcopy(data)) for data in records]
+        assert transformer.transform_batch(copy.deepcopy(records)) == expected
@@ -13,7 +13,13 @@ class WorkerConfig:
             indexer_password: str,
             genesis_timestamp: int,
             append_only_indices: 'IndicesConfig',
-            mutable_indices: 'IndicesConfig'
+            mutable_indices: 'IndicesConfig',
+            tasks_coordination: 'TasksCoordinationConfig',
+            loads_coalescing: 'LoadsCoalescingConfig',
+            extraction_cache: 'ExtractionCacheConfig',
+            load_output_sorting: 'LoadOutputSortingConfig',
+            load_staging: 'LoadStagingConfig',
+            tasks_monitoring: 'TasksMonitoringConfig'
     ) -> None:
         self.gcp_project_id = gcp_project_id
         self.schema_folder = schema_folder
@@ -23,6 +29,12 @@ class WorkerConfig:
         self.genesis_timestamp = genesis_timestamp
         self.append_only_indices = append_only_indices
         self.mutable_indices = mutable_indices
+        self.tasks_coordination = tasks_coordination
+        self.loads_coalescing = loads_coalescing
+        self.extraction_cache = extraction_cache
+        self.load_output_sorting = load_output_sorting
+        self.load_staging = load_staging
+        self.tasks_monitoring = tasks_monitoring
 
     @classmethod
     def load_from_file(cls, path: Path) -> "WorkerConfig":
@@ -39,7 +51,13 @@ class WorkerConfig:
             indexer_password=data.get("indexer_password", ""),
             genesis_timestamp=data["genesis_timestamp"],
             append_only_indices=IndicesConfig.load_from_dict(data["append_only_indices"]),
-            mutable_indices=IndicesConfig.load_from_dict(data["mutable_indices"])
+            mutable_indices=IndicesConfig.load_from_dict(data["mutable_indices"]),
+            tasks_coordination=TasksCoordinationConfig.load_from_dict(data.get("tasks_coordination", {})),
+            loads_coalescing=LoadsCoalescingConfig.load_from_dict(data.get("loads_coalescing", {})),
+            extraction_cache=ExtractionCacheConfig.load_from_dict(data.get("extraction_cache", {})),
+            load_output_sorting=LoadOutputSortingConfig.load_from_dict(data.get("load_output_sorting", {})),
+            load_staging=LoadStagingConfig.load_from_dict(data.get("load_staging", {})),
+            tasks_monitoring=TasksMonitoringConfig.load_from_dict(data.get("tasks_monitoring", {}))
         )
 
 
@@ -48,6 +66,7 @@ class IndicesConfig:
             self,
             bq_dataset: str,
             bq_data_transfer_name: str,
+            bq_main_dataset: str,
             indices: List[str],
             indices_without_timestamp: List[str],
             time_partition_start: int,
@@ -55,12 +74,22 @@ class IndicesConfig:
             interval_size_in_seconds: int,
             num_intervals_in_bulk: int,
             num_threads: int,
+            target_bulk_duration_in_seconds: int,
+            adaptive_concurrency: "AdaptiveConcurrencyConfig",
+            use_point_in_time: bool,
+            should_align_intervals_to_partitions: bool,
+            num_slices_by_index: Dict[str, int],
             should_fail_on_counts_mismatch: bool,
+            should_deduplicate_on_counts_mismatch: bool,
+            should_repair_on_counts_mismatch: bool,
             skip_counts_check_for_indices: List[str],
-            counts_checks_errata: "CountChecksErrata"
+            counts_checks_errata: "CountChecksErrata",
+            bq_aggregates_dataset: str,
+            daily_aggregates: List["DailyAggregateConfig"]
     ) -> None:
         self.bq_dataset = bq_dataset
         self.bq_data_transfer_name = bq_data_transfer_name
+        self.bq_main_dataset = bq_main_dataset
         self.indices = indices
         self.indices_without_timestamp = indices_without_timestamp
         self.time_partition_start = time_partition_start
@@ -68,15 +97,25 @@ class IndicesConfig:
         self.interval_size_in_seconds = interval_size_in_seconds
         self.num_intervals_in_bulk = num_intervals_in_bulk
         self.num_threads = num_threads
+        self.target_bulk_duration_in_seconds = target_bulk_duration_in_seconds
+        self.adaptive_concurrency = adaptive_concurrency
+        self.use_point_in_time = use_point_in_time
+        self.should_align_intervals_to_partitions = should_align_intervals_to_partitions
+        self.num_slices_by_index = num_slices_by_index
         self.should_fail_on_counts_mismatch = should_fail_on_counts_mismatch
+        self.should_deduplicate_on_counts_mismatch = should_deduplicate_on_counts_mismatch
+        self.should_repair_on_counts_mismatch = should_repair_on_counts_mismatch
         self.skip_counts_check_for_indices = skip_counts_check_for_indices
         self.counts_checks_errata = counts_checks_errata
+        self.bq_aggregates_dataset = bq_aggregates_dataset
+        self.daily_aggregates = daily_aggregates
 
     @classmethod
     def load_from_dict(cls, data: Dict[str, Any]) -> "IndicesConfig":
         return cls(
             bq_dataset=data["bq_dataset"],
             bq_data_transfer_name=data.get("bq_data_transfer_name", ""),
+            bq_main_dataset=data.get("bq_main_dataset", ""),
             indices=data["indices"],
             indices_without_timestamp=data.get("indices_without_timestamp", []),
             time_partition_start=data["time_partition_start"],
@@ -84,9 +123,264 @@ class IndicesConfig:
             interval_size_in_seconds=data["interval_size_in_seconds"],
             num_intervals_in_bulk=data["num_intervals_in_bulk"],
             num_threads=data["num_threads"],
+            target_bulk_duration_in_seconds=data.get("target_bulk_duration_in_seconds", 0),
+            adaptive_concurrency=AdaptiveConcurrencyConfig.load_from_dict(data.get("adaptive_concurrency", {})),
+            use_point_in_time=data.get("use_point_in_time", False),
+            should_align_intervals_to_partitions=data.get("should_align_intervals_to_partitions", False),
+            num_slices_by_index=data.get("num_slices_by_index", {}),
             should_fail_on_counts_mismatch=data["should_fail_on_counts_mismatch"],
+            should_deduplicate_on_counts_mismatch=data.get("should_deduplicate_on_counts_mismatch", False),
+            should_repair_on_counts_mismatch=data.get("should_repair_on_counts_mismatch", False),
             skip_counts_check_for_indices=data.get("skip_counts_check_for_indices", []),
-            counts_checks_errata=CountChecksErrata.load_from_dict(data.get("counts_checks_errata", {}))
+            counts_checks_errata=CountChecksErrata.load_from_dict(data.get("counts_checks_errata", {})),
+            bq_aggregates_dataset=data.get("bq_aggregates_dataset", data["bq_dataset"]),
+            daily_aggregates=[DailyAggregateConfig.load_from_dict(item) for item in data.get("daily_aggregates", [])]
+        )
+
+
+class DailyAggregateConfig:
+    """
+    Declares a table "name" (in the aggregates dataset), holding daily aggregates of an index ("table").
+    Rows are grouped by day and by the "dimensions" (columns), and hold the "measures" (e.g. "COUNT(*) AS `num_transactions`").
+    Only the records satisfying the (optional) "where" condition are aggregated.
+    """
+
+    def __init__(
+            self,
+            name: str,
+            table: str,
+            measures: str,
+            dimensions: List[str],
+            where: str
+    ) -> None:
+        self.name = name
+        self.table = table
+        self.measures = measures
+        self.dimensions = dimensions
+        self.where = where
+
+    @classmethod
+    def load_from_dict(cls, data: Dict[str, Any]) -> "DailyAggregateConfig":
+        return cls(
+            name=data["name"],
+            table=data["table"],
+            measures=data["measures"],
+            dimensions=data.get("dimensions", []),
+            where=data.get("where", "")
+        )
+
+
+class AdaptiveConcurrencyConfig:
+    """
+    When enabled, the number of active consumers varies between "min_num_threads" and "num_threads" (of the indices config),
+    depending on the latency and the throttling signals observed by the clients.
+
+    The latency thresholds are distinct: "latency_threshold_in_seconds" applies to the requests against Elasticsearch,
+    while "bq_latency_threshold_in_seconds" applies to the BigQuery load jobs.
+    """
+
+    def __init__(
+            self,
+            enabled: bool,
+            min_num_threads: int,
+            latency_threshold_in_seconds: float,
+            bq_latency_threshold_in_seconds: float,
+            adjustment_interval_in_seconds: float
+    ) -> None:
+        self.enabled = enabled
+        self.min_num_threads = min_num_threads
+        self.latency_threshold_in_seconds = latency_threshold_in_seconds
+        self.bq_latency_threshold_in_seconds = bq_latency_threshold_in_seconds
+        self.adjustment_interval_in_seconds = adjustment_interval_in_seconds
+
+    @classmethod
+    def load_from_dict(cls, data: Dict[str, Any]) -> "AdaptiveConcurrencyConfig":
+        return cls(
+            enabled=data.get("enabled", False),
+            min_num_threads=data.get("min_num_threads", 1),
+            latency_threshold_in_seconds=data.get("latency_threshold_in_seconds", 30),
+            bq_latency_threshold_in_seconds=data.get("bq_latency_threshold_in_seconds", 300),
+            adjustment_interval_in_seconds=data.get("adjustment_interval_in_seconds", 30)
+        )
+
+
+class TasksCoordinationConfig:
+    """
+    Selects the backend used for coordinating tasks:
+        - "local": tasks are planned and consumed in-process (by a single worker)
+        - "sqlite": tasks are planned in a SQLite database (e.g. on a shared volume) and leased by several workers
+    """
+
+    def __init__(
+            self,
+            backend: str,
+            database_path: Path,
+            lease_duration_in_seconds: int,
+            poll_interval_in_seconds: int
+    ) -> None:
+        self.backend = backend
+        self.database_path = database_path
+        self.lease_duration_in_seconds = lease_duration_in_seconds
+        self.poll_interval_in_seconds = poll_interval_in_seconds
+
+    @classmethod
+    def load_from_dict(cls, data: Dict[str, Any]) -> "TasksCoordinationConfig":
+        return cls(
+            backend=data.get("backend", "local"),
+            database_path=Path(data.get("database_path", "")),
+            lease_duration_in_seconds=data.get("lease_duration_in_seconds", 600),
+            poll_interval_in_seconds=data.get("poll_interval_in_seconds", 10)
+        )
+
+    def is_shared(self) -> bool:
+        return self.backend != "local"
+
+    def get_backfill_database_path(self) -> Path:
+        """
+        Backfills are planned in a separate database (next to the main one), so that they don't replace the plans of the continuous flow (same BigQuery dataset).
+        """
+        return self.database_path.with_name(f"{self.database_path.stem}_backfill{self.database_path.suffix}")
+
+
+class LoadsCoalescingConfig:
+    """
+    Tasks with at most "max_num_records_per_task" records (e.g. of sparse indices) are not loaded one by one.
+    Instead, their data is merged into combined loads (one per table), of at most "max_num_tasks_per_load" tasks.
+    A "max_num_records_per_task" of 0 disables the coalescing.
+    """
+
+    def __init__(
+            self,
+            max_num_records_per_task: int,
+            max_num_tasks_per_load: int
+    ) -> None:
+        self.max_num_records_per_task = max_num_records_per_task
+        self.max_num_tasks_per_load = max_num_tasks_per_load
+
+    @classmethod
+    def load_from_dict(cls, data: Dict[str, Any]) -> "LoadsCoalescingConfig":
+        return cls(
+            max_num_records_per_task=data.get("max_num_records_per_task", 0),
+            max_num_tasks_per_load=data.get("max_num_tasks_per_load", 100)
+        )
+
+
+class ExtractionCacheConfig:
+    """
+    When enabled, extracted records are kept (compressed) in the workspace, up to "max_size_in_bytes",
+    so that they can be reprocessed (transformed and loaded again) without querying the indexer.
+
+    By default, only the records of append-only indices are cached (the full reloads of mutable indices would evict them, otherwise).
+    """
+
+    def __init__(
+            self,
+            enabled: bool,
+            max_size_in_bytes: int,
+            should_cache_mutable_indices: bool
+    ) -> None:
+        self.enabled = enabled
+        self.max_size_in_bytes = max_size_in_bytes
+        self.should_cache_mutable_indices = should_cache_mutable_indices
+
+    @classmethod
+    def load_from_dict(cls, data: Dict[str, Any]) -> "ExtractionCacheConfig":
+        return cls(
+            enabled=data.get("enabled", False),
+            max_size_in_bytes=data.get("max_size_in_bytes", 50 * 1024 ** 3),
+            should_cache_mutable_indices=data.get("should_cache_mutable_indices", False)
+        )
+
+
+class LoadOutputSortingConfig:
+    """
+    If "clustering_field" is set, the records of each task are sorted by it before being loaded, so that they land (mostly) clustered.
+    Tables clustered by another field are listed in "clustering_fields_by_table" (an empty string disables the sorting for a table).
+    The values of a clustering field are expected to be of a single type (e.g. all numbers, or all strings).
+    Tasks with more than "max_num_records_in_memory" records are sorted using an external merge sort.
+    """
+
+    def __init__(
+            self,
+            clustering_field: str,
+            clustering_fields_by_table: Dict[str, str],
+            max_num_records_in_memory: int
+    ) -> None:
+        self.clustering_field = clustering_field
+        self.clustering_fields_by_table = clustering_fields_by_table
+        self.max_num_records_in_memory = max_num_records_in_memory
+
+    @classmethod
+    def load_from_dict(cls, data: Dict[str, Any]) -> "LoadOutputSortingConfig":
+        return cls(
+            clustering_field=data.get("clustering_field", ""),
+            clustering_fields_by_table=data.get("clustering_fields_by_table", {}),
+            max_num_records_in_memory=data.get("max_num_records_in_memory", 500000)
+        )
+
+
+class LoadStagingConfig:
+    """
+    If "bucket" is set, files of at least "min_num_bytes" are not uploaded to BigQuery directly. Instead, they are split into shards
+    (of about "shard_size_in_bytes"), which are uploaded to the (GCS) bucket in parallel, then loaded by a single load job (wildcard URI).
+    """
+
+    def __init__(
+            self,
+            bucket: str,
+            min_num_bytes: int,
+            shard_size_in_bytes: int,
+            num_parallel_uploads: int
+    ) -> None:
+        self.bucket = bucket
+        self.min_num_bytes = min_num_bytes
+        self.shard_size_in_bytes = shard_size_in_bytes
+        self.num_parallel_uploads = num_parallel_uploads
+
+    @classmethod
+    def load_from_dict(cls, data: Dict[str, Any]) -> "LoadStagingConfig":
+        return cls(
+            bucket=data.get("bucket", ""),
+            min_num_bytes=data.get("min_num_bytes", 1024 ** 3),
+            shard_size_in_bytes=data.get("shard_size_in_bytes", 128 * 1024 ** 2),
+            num_parallel_uploads=data.get("num_parallel_uploads", 8)
+        )
+
+
+class TasksMonitoringConfig:
+    """
+    The progress of the running tasks is reported every "heartbeat_interval_in_seconds"; tasks without progress for "stall_timeout_in_seconds" are reported as stalled.
+    Tasks running for more than "task_deadline_in_seconds" are cancelled (0 means no deadline).
+
+    If "should_speculate" is set, idle consumers (e.g. near the end of a bulk) run speculative duplicates of the straggling tasks: tasks running for at least
+    "speculation_min_elapsed_in_seconds", and for more than "speculation_slowness_factor" times the median duration of the finished tasks (of the same index).
+    """
+
+    def __init__(
+            self,
+            heartbeat_interval_in_seconds: int,
+            stall_timeout_in_seconds: int,
+            task_deadline_in_seconds: int,
+            should_speculate: bool,
+            speculation_min_elapsed_in_seconds: int,
+            speculation_slowness_factor: float
+    ) -> None:
+        self.heartbeat_interval_in_seconds = heartbeat_interval_in_seconds
+        self.stall_timeout_in_seconds = stall_timeout_in_seconds
+        self.task_deadline_in_seconds = task_deadline_in_seconds
+        self.should_speculate = should_speculate
+        self.speculation_min_elapsed_in_seconds = speculation_min_elapsed_in_seconds
+        self.speculation_slowness_factor = speculation_slowness_factor
+
+    @classmethod
+    def load_from_dict(cls, data: Dict[str, Any]) -> "TasksMonitoringConfig":
+        return cls(
+            heartbeat_interval_in_seconds=data.get("heartbeat_interval_in_seconds", 60),
+            stall_timeout_in_seconds=data.get("stall_timeout_in_seconds", 300),
+            task_deadline_in_seconds=data.get("task_deadline_in_seconds", 0),
+            should_speculate=data.get("should_speculate", False),
+            speculation_min_elapsed_in_seconds=data.get("speculation_min_elapsed_in_seconds", 120),
+            speculation_slowness_factor=data.get("speculation_slowness_factor", 2.0)
         )
 
 
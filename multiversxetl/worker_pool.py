@@ -0,0 +1,55 @@
+import contextlib
+import heapq
+import itertools
+import threading
+from typing import Iterator, List, Tuple
+
+# Lower values are served first.
+PRIORITY_APPEND_ONLY_INDICES = 0
+PRIORITY_MUTABLE_INDICES = 1
+
+
+class PrioritizedWorkerPool:
+    """
+    A fixed number of worker slots, shared by several flows (each with its own consumer threads). A consumer holds a slot while running a task.
+    When the slots are contended, waiting consumers are served by priority (lower values first), then in order of arrival.
+    """
+
+    def __init__(self, num_workers: int) -> None:
+        self.num_workers = num_workers
+
+        self._condition = threading.Condition()
+        self._num_busy_workers = 0
+        self._waiting: List[Tuple[int, int]] = []
+        self._sequence = itertools.count()
+
+    @contextlib.contextmanager
+    def slot(self, priority: int) -> Iterator[None]:
+        self._acquire(priority)
+
+        try:
+            yield
+        finally:
+            self._release()
+
+    def _acquire(self, priority: int) -> None:
+        with self._condition:
+            ticket = (priority, next(self._sequence))
+            heapq.heappush(self._waiting, ticket)
+
+            while self._waiting[0] != ticket or self._num_busy_workers >= self.num_workers:
+                self._condition.wait()
+
+            heapq.heappop(self._waiting)
+            self._num_busy_workers += 1
+            # The next waiting consumer might be served, as well (if there are free slots).
+            self._condition.notify_all()
+
+    def _release(self) -> None:
+        with self._condition:
+            self._num_busy_workers -= 1
+            self._condition.notify_all()
+
+    def get_num_busy_workers(self) -> int:
+        with self._condition:
+            return self._num_busy_workers
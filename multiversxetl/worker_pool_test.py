@@ -0,0 +1,70 @@
+import threading
+import time
+from typing import List
+
+from multiversxetl.worker_pool import (PRIORITY_APPEND_ONLY_INDICES,
+                                       PRIORITY_MUTABLE_INDICES,
+                                       PrioritizedWorkerPool)
+
+
+def test_slots_are_bounded():
+    pool = PrioritizedWorkerPool(num_workers=2)
+    max_num_busy_workers = 0
+    lock = threading.Lock()
+
+    def work():
+        nonlocal max_num_busy_workers
+
+        with pool.slot(PRIORITY_MUTABLE_INDICES):
+            with lock:
+                max_num_busy_workers = max(max_num_busy_workers, pool.get_num_busy_workers())
+            time.sleep(0.01)
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert max_num_busy_workers == 2
+    assert pool.get_num_busy_workers() == 0
+
+
+def test_waiting_consumers_are_served_by_priority():
+    pool = PrioritizedWorkerPool(num_workers=1)
+    served: List[str] = []
+    release = threading.Event()
+
+    def work(name: str, priority: int):
+        with pool.slot(priority):
+            served.append(name)
+
+    def hold():
+        with pool.slot(PRIORITY_MUTABLE_INDICES):
+            release.wait()
+
+    holder = threading.Thread(target=hold)
+    holder.start()
+
+    while pool.get_num_busy_workers() == 0:
+        time.sleep(0.001)
+
+    waiters = [
+        threading.Thread(target=work, args=["mutable", PRIORITY_MUTABLE_INDICES]),
+        threading.Thread(target=work, args=["append-only (first)", PRIORITY_APPEND_ONLY_INDICES]),
+        threading.Thread(target=work, args=["append-only (second)", PRIORITY_APPEND_ONLY_INDICES]),
+    ]
+
+    # Arrivals are ordered.
+    for waiter in waiters:
+        waiter.start()
+        time.sleep(0.05)
+
+    release.set()
+    holder.join()
+
+    for waiter in waiters:
+        waiter.join()
+
+    assert served == ["append-only (first)", "append-only (second)", "mutable"]
@@ -1,15 +1,22 @@
 import datetime
 import json
+import uuid
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Dict, Iterable, Optional
 
 
 class WorkerState:
     def __init__(
         self,
-        latest_checkpoint_timestamp: int
+        latest_checkpoint_timestamp: int,
+        latest_promoted_timestamp: int = 0,
+        latest_aggregated_timestamps: Optional[Dict[str, int]] = None
     ) -> None:
         self.latest_checkpoint_timestamp = latest_checkpoint_timestamp
+        # Data (of append-only indices) before this timestamp has been promoted from the staging dataset to the main dataset.
+        self.latest_promoted_timestamp = latest_promoted_timestamp
+        # Daily aggregates (by name) are up to date with the data before these timestamps.
+        self.latest_aggregated_timestamps = latest_aggregated_timestamps or {}
 
     def get_latest_checkpoint_datetime(self) -> datetime.datetime:
         return datetime.datetime.fromtimestamp(self.latest_checkpoint_timestamp, tz=datetime.timezone.utc)
@@ -23,7 +30,9 @@ class WorkerState:
     @classmethod
     def load_from_dict(cls, data: Dict[str, Any]) -> "WorkerState":
         return cls(
-            latest_checkpoint_timestamp=data.get("latest_checkpoint_timestamp", 0)
+            latest_checkpoint_timestamp=data.get("latest_checkpoint_timestamp", 0),
+            latest_promoted_timestamp=data.get("latest_promoted_timestamp", 0),
+            latest_aggregated_timestamps=data.get("latest_aggregated_timestamps", {})
         )
 
     def save_to_file(self, path: Path) -> None:
@@ -33,5 +42,34 @@ class WorkerState:
 
     def to_plain_dictionary(self) -> Dict[str, Any]:
         return {
-            "latest_checkpoint_timestamp": self.latest_checkpoint_timestamp
+            "latest_checkpoint_timestamp": self.latest_checkpoint_timestamp,
+            "latest_promoted_timestamp": self.latest_promoted_timestamp,
+            "latest_aggregated_timestamps": self.latest_aggregated_timestamps
         }
+
+
+class PromotionInvalidations:
+    """
+    Records that data of the staging dataset (on or after a timestamp) has changed (e.g. after a backfill), thus it has to be promoted again.
+
+    Each invalidation is a separate (empty) file, named after its timestamp, kept apart from the worker state. Thus, invalidations recorded by a process
+    (e.g. a backfill) are not lost when another process (e.g. the continuous flow) saves its own worker state. Also, consuming the invalidations
+    does not race with adding new ones.
+    """
+
+    def __init__(self, folder: Path) -> None:
+        self.folder = folder
+
+    def add(self, timestamp: int) -> None:
+        self.folder.mkdir(parents=True, exist_ok=True)
+        (self.folder / f"{timestamp}_{uuid.uuid4().hex}").touch()
+
+    def load(self) -> Dict[Path, int]:
+        if not self.folder.exists():
+            return {}
+
+        return {path: int(path.name.split("_")[0]) for path in self.folder.iterdir()}
+
+    def remove(self, paths: Iterable[Path]) -> None:
+        for path in paths:
+            path.unlink(missing_ok=True)
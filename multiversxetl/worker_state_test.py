@@ -0,0 +1,35 @@
+from pathlib import Path
+
+from multiversxetl.worker_state import PromotionInvalidations, WorkerState
+
+
+def test_promotion_invalidations(tmp_path: Path):
+    invalidations = PromotionInvalidations(tmp_path / "promotion_invalidations")
+    assert invalidations.load() == {}
+
+    invalidations.add(1700000000)
+    invalidations.add(1600000000)
+    loaded = invalidations.load()
+    assert sorted(loaded.values()) == [1600000000, 1700000000]
+
+    # Invalidations added in the meantime (e.g. by another process) are not lost, when consuming the loaded ones.
+    invalidations.add(1650000000)
+    invalidations.remove(loaded)
+    assert list(invalidations.load().values()) == [1650000000]
+
+    # Already removed (e.g. concurrently).
+    invalidations.remove(loaded)
+
+
+def test_worker_state_save_and_load(tmp_path: Path):
+    path = tmp_path / "worker_state.json"
+
+    WorkerState(1700000000, 1600000000, {"transactions_by_day": 1650000000}).save_to_file(path)
+    state = WorkerState.load_from_file(path)
+    assert state.latest_checkpoint_timestamp == 1700000000
+    assert state.latest_promoted_timestamp == 1600000000
+    assert state.latest_aggregated_timestamps == {"transactions_by_day": 1650000000}
+
+    # States saved by previous versions.
+    path.write_text('{"latest_checkpoint_timestamp": 1700000000}')
+    assert WorkerState.load_from_file(path).latest_aggregated_timestamps == {}